@@ -0,0 +1,24 @@
+import { useEffect, useState } from 'react';
+import { getSearchSuggestions } from '../services/api/search';
+
+// Autocomplete suggestions for the text currently in a search box.
+// Responses to earlier keystrokes that arrive late are ignored.
+export const useSearchSuggestions = (query) => {
+    const [suggestions, setSuggestions] = useState([]);
+
+    useEffect(() => {
+        let stale = false;
+        getSearchSuggestions(query)
+            .then((results) => {
+                if (!stale) setSuggestions(results);
+            })
+            .catch(() => {
+                if (!stale) setSuggestions([]);
+            });
+        return () => {
+            stale = true;
+        };
+    }, [query]);
+
+    return suggestions;
+};
@@ -0,0 +1,41 @@
+import apiClient from './axios';
+
+// Matches POST /api/books/access
+// Checks a whole shelf in one request; returns one entry per id, in order:
+// { id, accessible, title, author, genre, is_public, uploader } or { id, accessible: false }
+export const checkBooksAccess = async (bookIds) => {
+    if (!bookIds || bookIds.length === 0) {
+        return [];
+    }
+    const response = await apiClient.post('/books/access', { book_ids: bookIds });
+    return response.data.books;
+};
+
+const sha256Hex = async (file) => {
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+};
+
+// Matches POST /api/books/uploads and POST /api/books/uploads/complete
+// Uploads the file straight to storage with a presigned PUT, then asks the
+// server to verify it and create the book; resolves to the new book
+export const uploadBookDirect = async (file, { title, author, genre, isPublic }) => {
+    const intent = await apiClient.post('/books/uploads', {
+        filename: file.name,
+        size: file.size,
+        sha256: await sha256Hex(file),
+        title,
+        author,
+        genre,
+        is_public: isPublic,
+    });
+    const { url, headers, upload_token: uploadToken } = intent.data;
+    // The browser sets Content-Length itself
+    const { 'Content-Length': _contentLength, ...putHeaders } = headers;
+    const upload = await fetch(url, { method: 'PUT', headers: putHeaders, body: file });
+    if (!upload.ok) {
+        throw new Error(`Upload to storage failed with status ${upload.status}`);
+    }
+    const response = await apiClient.post('/books/uploads/complete', { upload_token: uploadToken });
+    return response.data;
+};
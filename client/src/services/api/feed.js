@@ -0,0 +1,8 @@
+import apiClient from './axios';
+
+// Matches GET /api/feed
+// Pass the previous response's pagination.next_cursor to get older entries
+export const fetchFeed = async ({ cursor, limit } = {}) => {
+    const response = await apiClient.get('/feed', { params: { cursor, limit } });
+    return response.data;
+};
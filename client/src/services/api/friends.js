@@ -28,6 +28,17 @@ export const respondToFriendRequest = async (requestId, status) => {
     return response.data;
 };
 
+// Matches POST /api/friends/requests/batch
+// action is 'accept' or 'reject'; resolves to one result per request id and the
+// processed_ids actually changed (rejects with 404/409 when none were)
+export const respondToFriendRequests = async (requestIds, action) => {
+    if (action !== 'accept' && action !== 'reject') {
+         return Promise.reject(new Error("Invalid action provided. Must be 'accept' or 'reject'."));
+    }
+    const response = await apiClient.post('/friends/requests/batch', { request_ids: requestIds, action });
+    return response.data;
+};
+
 // Matches DELETE /api/users/friends/<int:friendship_id>
 export const removeFriend = async (friendshipId) => {
     const response = await apiClient.delete(`/users/friends/${friendshipId}`);
@@ -0,0 +1,23 @@
+import apiClient from './axios';
+
+// Matches GET /api/jobs/:id
+// { id, book_id, status, stage, progress, done, error, result, ... }
+export const fetchJob = async (jobId) => {
+    const response = await apiClient.get(`/jobs/${jobId}`);
+    return response.data;
+};
+
+// Polls an ingestion job (e.g. a new book's ingestion_job.id) until it
+// succeeds or fails; onProgress receives every intermediate status
+export const waitForJob = async (jobId, { intervalMs = 1000, onProgress } = {}) => {
+    for (;;) {
+        const job = await fetchJob(jobId);
+        if (onProgress) {
+            onProgress(job);
+        }
+        if (job.done) {
+            return job;
+        }
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+};
@@ -10,4 +10,15 @@ export const searchUsers = async (query) => {
         params: { q: query }
     });
     return response.data;
-};
\ No newline at end of file
+};
+// Matches GET /api/search/suggest?q=<prefix>
+// Cheap enough to call on every keystroke; returns [{ type, text }]
+export const getSearchSuggestions = async (prefix, limit = 10) => {
+    if (!prefix || !prefix.trim()) {
+        return [];
+    }
+    const response = await apiClient.get('/search/suggest', {
+        params: { q: prefix, limit }
+    });
+    return response.data.suggestions;
+};
@@ -2,6 +2,7 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
+from flask_jwt_extended import JWTManager
 from flask_restful import Api # Keep if used by register_routes or other parts
 from flask_cors import CORS
 from .config import Config
@@ -13,6 +14,7 @@ load_dotenv()
 db = SQLAlchemy()
 migrate = Migrate()
 bcrypt = Bcrypt()
+jwt = JWTManager()
 api = Api() # Keep if needed
 
 def create_app(testing=False):
@@ -32,12 +34,15 @@ def create_app(testing=False):
         app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
         app.config["WTF_CSRF_ENABLED"] = False
         app.config["SECRET_KEY"] = 'test-secret'
+        # Background tasks (ingestion, feed fan-out) run before the request returns
+        app.config["TASKS_EAGER"] = True
 
 
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
     bcrypt.init_app(app)
+    jwt.init_app(app)
     api.init_app(app) 
 
 
@@ -54,6 +59,18 @@ def create_app(testing=False):
 
     register_routes(app)
 
+    from .services.auth_service import passwords_cli
+    from .services.feed import feed_cli
+    from .services.ingestion import ingestion_cli, init_celery
+    from .services.recommendations import recommendations_cli
+    app.cli.add_command(passwords_cli)
+    app.cli.add_command(feed_cli)
+    app.cli.add_command(ingestion_cli)
+    app.cli.add_command(recommendations_cli)
+
+    if app.config.get('INGESTION_QUEUE') == 'celery':
+        init_celery(app)
+
     return app
 
 app = create_app()
\ No newline at end of file
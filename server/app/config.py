@@ -1,18 +1,72 @@
 import os
+from datetime import timedelta
 
 class Config:
     # Generate a random secret key for development or use environment variable
     SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "default_secret_key")
     
-    # # JWT settings
-    # JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "default_jwt_secret_key")
-    # JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 hour
-    # JWT_REFRESH_TOKEN_EXPIRES = 2592000  # 30 days
+    # JWT settings: stateless bearer tokens accepted alongside sessions.
+    # Access tokens are verified from their signature alone, so keep them
+    # short-lived; refresh tokens are checked against users.token_revision
+    JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "default_jwt_secret_key")
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.getenv("JWT_ACCESS_TOKEN_MINUTES", 15)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    JWT_TOKEN_LOCATION = ["headers"]
     
     # Database settings
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///e_reader.db")
     
+    # Search settings: 'auto' uses the database's full-text index when its
+    # migration has been applied, or one of 'memory', 'sqlite_fts5', 'postgres_tsvector'
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+    USER_SEARCH_MAX_RESULTS = 50  # top-k cutoff for fuzzy username matches
+    SUGGEST_MAX_RESULTS = 10  # autocomplete suggestions cached per trie node
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 1024))  # cached search responses per process
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 60))  # seconds
+    
+    # Per-user friendship adjacency cached in each process
+    FRIEND_GRAPH_CACHE_SIZE = 10000
+    FRIEND_GRAPH_CACHE_TTL = 300  # seconds
+
+    # Password hashing (bcrypt on a process pool; see app.services.auth_service)
+    # Cost factor, or "auto" to benchmark against PASSWORD_HASH_TARGET_MS at
+    # startup; `flask passwords benchmark` suggests a value
+    PASSWORD_HASH_ROUNDS = os.getenv("PASSWORD_HASH_ROUNDS", "12")
+    PASSWORD_HASH_TARGET_MS = int(os.getenv("PASSWORD_HASH_TARGET_MS", 250))
+    # Worker processes; unset means min(cpu count, 4), 0 hashes inline
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS")) if os.getenv("PASSWORD_HASH_WORKERS") else None
+    PASSWORD_HASH_MAX_PENDING = 64  # queued + running hashes before answering 503
+    PASSWORD_HASH_TIMEOUT = 10  # seconds
+
+    # Login throttle: token buckets checked before any password hashing
+    LOGIN_THROTTLE_BACKEND = os.getenv("LOGIN_THROTTLE_BACKEND", "memory")  # or "redis" across workers
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    LOGIN_THROTTLE_CAPACITY = 5  # burst of attempts per username/email
+    LOGIN_THROTTLE_ADDRESS_CAPACITY = 50  # burst of attempts per client address
+    LOGIN_THROTTLE_REFILL_SECONDS = 12  # one attempt per username/email regained this often
+    LOGIN_THROTTLE_ADDRESS_REFILL_SECONDS = 1  # one attempt per client address regained this often
+
+    # Authenticated-identity cache used by auth_required
+    AUTH_IDENTITY_CACHE_SIZE = 4096
+    AUTH_IDENTITY_CACHE_TTL = 30  # seconds; bounds staleness in other workers
+
+    # Friend recommendations ("people you may know")
+    FRIEND_RECOMMENDATION_LIMIT = 20  # candidates stored per user
+
+    # Friends activity feed (fan-out on write)
+    FEED_MAX_LENGTH = 500  # newest entries kept per user
+    FEED_PAGE_SIZE = 20
+
+    # Background tasks run on a thread pool; eager mode runs them inline
+    TASKS_EAGER = os.getenv("TASKS_EAGER", "false").lower() == "true"
+    TASK_WORKERS = int(os.getenv("TASK_WORKERS", 2))
+
+    # Book ingestion jobs: "threads" runs them on the task pool above,
+    # "celery" sends them to celery_worker.py through CELERY_BROKER_URL
+    INGESTION_QUEUE = os.getenv("INGESTION_QUEUE", "threads")
+    CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")  # defaults to REDIS_URL
+
     # File upload settings
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.abspath(os.path.dirname(__file__)), '../uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
@@ -24,8 +78,24 @@ class Config:
     # Frontend URL for redirects
     FRONTEND_URL = os.environ.get('FRONTEND_URL') or 'http://localhost:5173'
     
+    # Uploads stream to S3 in parts of this size (minimum 5 MiB); it bounds
+    # the memory one upload can hold
+    S3_UPLOAD_PART_SIZE = int(os.getenv("S3_UPLOAD_PART_SIZE", 8 * 1024 * 1024))
+
+    # Direct-to-storage uploads (presigned PUT + finalize)
+    DIRECT_UPLOAD_MAX_SIZE = 100 * 1024 * 1024  # matches FileMetadata's limit
+    DIRECT_UPLOAD_EXPIRES = 900  # seconds a presigned URL stays valid
+
     # AWS settings
     AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
     AWS_REGION = os.getenv("AWS_REGION")
-    S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
\ No newline at end of file
+    S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
+    # Set to a local S3 stand-in (e.g. http://localhost:9000 for MinIO) in development
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+    # Connections the shared S3 client keeps open; size to the worker's thread count
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "20"))
+
+    # File storage: 's3', or 'local' to keep files under LOCAL_STORAGE_ROOT
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3")
+    LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", "instance/storage")
@@ -3,5 +3,10 @@ from .file_metadata import FileMetadata
 from .user import User
 from .note import Note
 from .friendship import Friendship
+from .book_page import BookPage, PagePosting
+from .friend_recommendation import FriendRecommendation
+from .feed_entry import FeedEntry
+from .blob import Blob
+from .ingestion_job import IngestionJob
 
-__all__ = ['Book', 'FileMetadata', 'User', 'Note', 'Friendship']
\ No newline at end of file
+__all__ = ['Book', 'FileMetadata', 'User', 'Note', 'Friendship', 'BookPage', 'PagePosting', 'FriendRecommendation', 'FeedEntry', 'Blob', 'IngestionJob']
\ No newline at end of file
@@ -0,0 +1,41 @@
+import uuid
+
+from app import db
+from datetime import datetime
+
+
+class Blob(db.Model):
+    """
+    Stored file content, looked up by its SHA-256. Books with identical
+    files share one Blob and one stored object; ref_count is the number of
+    books pointing at it (see app.services.blobs), and the object is
+    removed when it drops to zero.
+
+    The object's key is random rather than derived from the hash: book
+    URLs reach clients, and a hash is all it takes to claim content.
+    """
+    __tablename__ = 'blobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(255), nullable=True)
+    key = db.Column(db.String(255), nullable=False, unique=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<Blob {self.sha256[:12]}: {self.ref_count} refs>'
+
+
+def new_blob_key():
+    """Unused storage key for a new blob"""
+    return f"blobs/{uuid.uuid4().hex}"
+
+
+def derived_key(sha256):
+    """
+    Storage key of what ingestion extracted from this content (pages and
+    metadata). Only the server reads it, so it can be keyed by hash.
+    """
+    return f"derived/{sha256[:2]}/{sha256}.json"
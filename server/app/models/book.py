@@ -9,7 +9,7 @@ class Book(db.Model, SerializerMixin):
     __tablename__ = 'books'
 
     # Fields to include in serialization
-    serialize_rules = ('-notes', '-uploader.books', '-file_metadata.book')
+    serialize_rules = ('-notes', '-uploader.books', '-file_metadata.book', '-blob', '-blob_id')
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
@@ -19,13 +19,19 @@ class Book(db.Model, SerializerMixin):
     s3_url = db.Column(db.String(255), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)
     file_type = db.Column(db.String(50), nullable=False)
-    uploaded_by_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete="CASCADE"), nullable=True)
+    uploaded_by_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete="CASCADE"), nullable=True, index=True)
+    # Shared, reference-counted content; None for files stored before deduplication
+    blob_id = db.Column(db.Integer, db.ForeignKey('blobs.id'), nullable=True, index=True)
+    # False until ingestion has validated the stored file; until then only
+    # the uploader can see the book (see app.services.access_control)
+    is_ready = db.Column(db.Boolean, default=True, server_default=db.true(), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     # Relationships
     notes = db.relationship('Note', back_populates='book', lazy='dynamic', cascade='all, delete-orphan')
     uploader = db.relationship('User', back_populates='books', lazy=True)
     file_metadata = db.relationship('FileMetadata', backref='book', lazy=True, uselist=False, cascade='all, delete-orphan')
+    blob = db.relationship('Blob', lazy=True)
 
     @validates('title')
     def validate_title(self, key, title):
@@ -55,4 +61,9 @@ class Book(db.Model, SerializerMixin):
         # Original check for non-None IDs remains
         if User.query.get(user_id) is None:
             raise ValueError('Uploaded by user does not exist')
-        return user_id
\ No newline at end of file
+        return user_id
+
+
+# Serves the case-insensitive author self-join behind shared-upload friend
+# recommendations (see app.services.recommendations)
+db.Index('ix_books_lower_author', db.func.lower(Book.author))
\ No newline at end of file
@@ -0,0 +1,39 @@
+from app import db
+from sqlalchemy import UniqueConstraint
+from sqlalchemy_serializer import SerializerMixin
+
+
+class BookPage(db.Model, SerializerMixin):
+    __tablename__ = 'book_pages'
+
+    __table_args__ = (
+        UniqueConstraint('book_id', 'page_number', name='_unique_book_page'),
+    )
+
+    serialize_only = ('id', 'book_id', 'page_number', 'token_count')
+
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), nullable=False)
+    page_number = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    token_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<BookPage {self.book_id}:{self.page_number}>'
+
+
+class PagePosting(db.Model):
+    """One row per (term, page): how often a term occurs on a book page"""
+    __tablename__ = 'page_postings'
+
+    __table_args__ = (
+        db.Index('ix_page_postings_book_id', 'book_id'),
+    )
+
+    term = db.Column(db.String(64), primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True)
+    page_number = db.Column(db.Integer, primary_key=True)
+    term_frequency = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<PagePosting {self.term!r} {self.book_id}:{self.page_number}>'
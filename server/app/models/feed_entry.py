@@ -0,0 +1,45 @@
+from app import db
+from datetime import datetime
+from sqlalchemy import Index
+
+
+class FeedEntry(db.Model):
+    """
+    One item of a user's activity feed: something a friend did, copied
+    into the owner's timeline when it happened (see app.services.feed).
+    Rows carry everything needed to render them, so a feed page is a single
+    range scan of (owner_id, id) without joins.
+    """
+    __tablename__ = 'feed_entries'
+    __table_args__ = (
+        Index('ix_feed_entries_owner_id_id', 'owner_id', 'id'),
+    )
+
+    # Kinds of activity that are fanned out
+    kind_choices = ['book_uploaded', 'note_created']
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    actor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(32), nullable=False)
+    # The book the activity is about, and the note for note_created; kept
+    # so entries can be retracted when either is deleted
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), nullable=False, index=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('notes.id', ondelete='CASCADE'), nullable=True, index=True)
+    # Denormalized display data (actor username, book title, note excerpt...)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'actor_id': self.actor_id,
+            'book_id': self.book_id,
+            'note_id': self.note_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            **self.payload
+        }
+
+    def __repr__(self):
+        return f'<FeedEntry {self.id}: {self.kind} by {self.actor_id} for {self.owner_id}>'
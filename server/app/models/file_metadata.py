@@ -19,6 +19,10 @@ class FileMetadata(db.Model, SerializerMixin):  # Add SerializerMixin
     file_name = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.Enum('txt', 'html', 'docx', 'pdf', name='file_type_enum'), nullable=False)
     size = db.Column(db.Float, nullable=False)
+    # SHA-256 hex digest of the stored bytes, computed while streaming
+    sha256 = db.Column(db.String(64), nullable=True)
+    # Direct upload this file came from, so finalizing it twice is harmless
+    upload_id = db.Column(db.String(32), nullable=True, unique=True)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False, unique=True)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
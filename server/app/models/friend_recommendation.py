@@ -0,0 +1,19 @@
+from app import db
+from datetime import datetime
+
+
+class FriendRecommendation(db.Model):
+    """
+    Precomputed "people you may know" list for one user, stored as a single
+    row so serving it is one primary-key read. Rebuilt by
+    app.services.recommendations.
+    """
+    __tablename__ = 'friend_recommendations'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    # Ranked list of {id, username, mutual_friends, shared_uploads}
+    candidates = db.Column(db.JSON, nullable=False, default=list)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<FriendRecommendation {self.user_id}: {len(self.candidates or [])} candidates>'
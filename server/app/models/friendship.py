@@ -1,6 +1,6 @@
 from app import db
 from datetime import datetime
-from sqlalchemy import CheckConstraint, UniqueConstraint
+from sqlalchemy import CheckConstraint, Index, UniqueConstraint, event
 from sqlalchemy_serializer import SerializerMixin
 # from sqlalchemy.orm import relationship
 # from .user import User
@@ -10,15 +10,24 @@ from sqlalchemy_serializer import SerializerMixin
 class Friendship(db.Model, SerializerMixin):
     __tablename__ = 'friendships'
     
+    # Each pair is stored once, keyed by its canonical (low_id, high_id)
+    # order, so a pair lookup is a single probe of _unique_friendship_pair.
+    # user_id/friend_id still record who sent the request to whom.
     __table_args__ = (
-        UniqueConstraint('user_id', 'friend_id', name='_unique_friendship'),
+        UniqueConstraint('low_id', 'high_id', name='_unique_friendship_pair'),
         CheckConstraint('user_id != friend_id', name='_prevent_self_friendship'),
+        CheckConstraint('low_id < high_id', name='_canonical_friendship_pair'),
+        Index('ix_friendships_user_id_status', 'user_id', 'status'),
+        Index('ix_friendships_friend_id_status', 'friend_id', 'status'),
         {'extend_existing': True}
     )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     friend_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Set from user_id/friend_id before every insert and update
+    low_id = db.Column(db.Integer, nullable=False)
+    high_id = db.Column(db.Integer, nullable=False)
     
     # Friendship status options
     status_choices = ['pending', 'accepted', 'blocked']
@@ -46,6 +55,27 @@ class Friendship(db.Model, SerializerMixin):
     def __repr__(self):
         return f'<Friendship {self.user_id} - {self.friend_id}: {self.status}>'
 
+    @staticmethod
+    def ordered_pair(user_id, target_id):
+        """Canonical (low_id, high_id) order of two user ids"""
+        user_id, target_id = int(user_id), int(target_id)
+        return (user_id, target_id) if user_id < target_id else (target_id, user_id)
+
+    @classmethod
+    def between(cls, user_id, target_id):
+        """
+        Query for the friendship between two users, whoever sent it
+        
+        Args:
+            user_id (int): ID of first user
+            target_id (int): ID of second user
+        
+        Returns:
+            Query: Matches at most one row
+        """
+        low_id, high_id = cls.ordered_pair(user_id, target_id)
+        return cls.query.filter(cls.low_id == low_id, cls.high_id == high_id)
+
     @classmethod
     def are_friends(cls, user_id, target_id):
         """
@@ -58,14 +88,10 @@ class Friendship(db.Model, SerializerMixin):
         Returns:
             bool: Whether users are friends
         """
+        from app.services.friend_graph import get_friend_graph
         try:
-            # Check for accepted friendship in either direction
-            friendship = cls.query.filter(
-                ((cls.user_id == user_id) & (cls.friend_id == target_id) | 
-                 (cls.user_id == target_id) & (cls.friend_id == user_id)) & 
-                (cls.status == 'accepted')
-            ).first()
-            return friendship is not None
+            # Served from the cached adjacency of user_id
+            return get_friend_graph().are_friends(user_id, target_id)
         except Exception as e:
             # Log or handle the exception as needed
             print(f"Error checking friendship: {e}")
@@ -83,13 +109,17 @@ class Friendship(db.Model, SerializerMixin):
         Returns:
             str: Friendship status ('pending', 'accepted', 'blocked', or None)
         """
+        from app.services.friend_graph import get_friend_graph
         try:
-            friendship = cls.query.filter(
-                ((cls.user_id == user_id) & (cls.friend_id == target_id) | 
-                 (cls.user_id == target_id) & (cls.friend_id == user_id))
-            ).first()
-            return friendship.status if friendship else None
+            return get_friend_graph().status(user_id, target_id)
         except Exception as e:
             # Log or handle the exception as needed
             print(f"Error retrieving friendship status: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+
+@event.listens_for(Friendship, 'before_insert')
+@event.listens_for(Friendship, 'before_update')
+def _set_canonical_pair(mapper, connection, friendship):
+    friendship.low_id, friendship.high_id = Friendship.ordered_pair(friendship.user_id, friendship.friend_id)
@@ -0,0 +1,51 @@
+from app import db
+from datetime import datetime
+
+
+class IngestionJob(db.Model):
+    """
+    Background processing of one uploaded book file (see
+    app.services.ingestion): validation, metadata extraction, content
+    indexing and derived artifacts. Requests create the row and enqueue
+    it; workers update status, stage and progress as they go.
+    """
+    __tablename__ = 'ingestion_jobs'
+
+    status_choices = ['queued', 'running', 'succeeded', 'failed']
+    stage_choices = ['validating', 'extracting', 'indexing', 'artifacts']
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Kept when the book is deleted, so its job can still be looked up
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='SET NULL'), nullable=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    stage = db.Column(db.String(32), nullable=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)  # percent
+    error = db.Column(db.Text, nullable=True)
+    # Extracted metadata and artifact keys, filled in as stages finish
+    result = db.Column(db.JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'book_id': self.book_id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'done': self.done,
+            'error': self.error,
+            'result': self.result or {},
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f'<IngestionJob {self.id}: book {self.book_id} {self.status}>'
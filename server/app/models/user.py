@@ -15,7 +15,7 @@ class User(db.Model, SerializerMixin):  # Add SerializerMixin
     __table_args__ = {'extend_existing': True}
 
     # SerializerMixin configuration
-    serialize_rules = ('-books', '-notes','friends', '-friends.sent_friendships', '-friends.received_friendships')  # Specify fields to serialize
+    serialize_rules = ('-books', '-notes', '-token_revision','friends', '-friends.sent_friendships', '-friends.received_friendships')  # Specify fields to serialize
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), nullable=False, unique=True)
@@ -23,6 +23,8 @@ class User(db.Model, SerializerMixin):  # Add SerializerMixin
     password_hash = db.Column(db.String(128), nullable=False)
     oauth_provider = db.Column(db.String(50), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Bumped to revoke every refresh token issued so far (see app.services.tokens)
+    token_revision = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # # Relationships
     books = db.relationship('Book', back_populates='uploader', lazy=True, cascade="all, delete-orphan", foreign_keys=[Book.uploaded_by_id])
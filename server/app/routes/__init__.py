@@ -14,17 +14,26 @@ def register_routes(app):
     from .upload import upload_bp
     from .user import user_bp
     from .friends import friends_bp
+    from .feed import feed_bp
+    from .storage import storage_bp
+    from .jobs import jobs_bp
     
     # # Register blueprints with the main API blueprint
     # api_bp.register_blueprint(auth_bp)
     # api_bp.register_blueprint(oauth_bp)
-    api_bp.register_blueprint(books_bp)
-    api_bp.register_blueprint(notes_bp)
-    api_bp.register_blueprint(search_bp)
-    api_bp.register_blueprint(upload_bp)
-    api_bp.register_blueprint(user_bp)
-    api_bp.register_blueprint(friends_bp)
-    
+    # Nested blueprints stay recorded on api_bp, so apps created after the
+    # first one (e.g. by the tests) only need api_bp itself
+    if not api_bp._got_registered_once:
+        api_bp.register_blueprint(books_bp)
+        api_bp.register_blueprint(notes_bp)
+        api_bp.register_blueprint(search_bp)
+        api_bp.register_blueprint(upload_bp)
+        api_bp.register_blueprint(user_bp)
+        api_bp.register_blueprint(friends_bp)
+        api_bp.register_blueprint(feed_bp)
+        api_bp.register_blueprint(storage_bp)
+        api_bp.register_blueprint(jobs_bp)
+
     # Register the main API blueprint with the app
     app.register_blueprint(api_bp)
     
@@ -1,37 +1,73 @@
 from flask import request, jsonify, g, current_app, Blueprint, session
 from functools import wraps
 from datetime import datetime, timedelta
-from app.models.user import User  # Changed to absolute import
-from sqlalchemy.orm.exc import NoResultFound
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from app import jwt
+from app.services.identity import load_identity
+from app.services.tokens import identity_from_claims, session_is_current
 from ipdb import set_trace
 
 auth_bp = Blueprint('auth', __name__)
 
 
 def auth_required(f):
-    """Decorator to require authentication for routes"""
+    """
+    Decorator to require authentication for routes.
+
+    Accepts either a bearer access token, verified from its signature and
+    claims alone with no database read, or a session cookie, resolved
+    through the cached identity and rejected once the user has revoked
+    their tokens since it was issued. Sets g.user to the caller's Identity (id,
+    username, email); use app.services.identity.load_current_user() for
+    the full ORM User.
+    """
     @wraps(f)
     def decorated(*args, **kwargs):
         try:
-            print(f"Session data in auth_required: {session.get('user_id')}") #Debug session
+            try:
+                token = verify_jwt_in_request(optional=True)
+            except (JWTExtendedException, PyJWTError) as e:
+                return jsonify({'error': f'Login Required: {str(e)}'}), 401
+            if token:
+                g.user = identity_from_claims(get_jwt())
+                return f(*args, **kwargs)
+
             user_id = session.get('user_id')
 
             if user_id is None:
                 current_app.logger.debug("auth_required: No user_id in session")
                 return jsonify({'error': 'Login Required: No session'}), 401
 
-            try:
-                user = User.query.filter_by(id=user_id).one() #Use filter_by and one() to catch user not found
-            except NoResultFound:
+            identity = load_identity(user_id)
+            if identity is None:
                 current_app.logger.warning(f"auth_required: User with id {user_id} not found")
                 session.pop('user_id', None)  # Clear potentially invalid session
                 return jsonify({'error': 'Login Required: Invalid user'}), 401
 
-            g.user = user
+            if not session_is_current(identity):
+                # Signed out everywhere (token revoke or password change) since
+                session.pop('user_id', None)
+                session.pop('token_revision', None)
+                return jsonify({'error': 'Login Required: Session has been revoked'}), 401
+
+            g.user = identity
             return f(*args, **kwargs)
 
         except Exception as e:
             current_app.logger.error(f"auth_required: Exception during authentication: {type(e).__name__}: {str(e)}") # log exception
             return jsonify({'error': f'Authentication Error: {str(e)}'}), 500
 
-    return decorated
\ No newline at end of file
+    return decorated
+
+
+@jwt.unauthorized_loader
+@jwt.invalid_token_loader
+def _token_missing_or_invalid(reason):
+    return jsonify({'error': f'Login Required: {reason}'}), 401
+
+
+@jwt.expired_token_loader
+def _token_expired(jwt_header, jwt_payload):
+    return jsonify({'error': 'Login Required: Token has expired'}), 401
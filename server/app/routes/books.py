@@ -1,40 +1,34 @@
+import mimetypes
+
 from flask import Blueprint, request, jsonify, g, current_app
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
-import os
-import boto3
-from botocore.exceptions import ClientError
-import uuid
-from app.models import Book, FileMetadata, User
+from app.models import Book, FileMetadata, IngestionJob, User
 from app import db
+from app.services.access_control import can_view, visibility_clause
+from app.services.blobs import abandon_blob, purge_blobs, release_blobs, store_blob
+from app.services.content_search import remove_book_content
+from app.services.direct_upload import CONTENT_TYPES, UploadError, create_upload_intent, finalize_upload
+from app.services.feed import retract_book
+from app.services.ingestion import enqueue_ingestion, latest_job
+from app.services.search_backends import get_search_backend
+from app.services.search_cache import catalog_changed
+from app.services.storage import StorageError, get_storage
 from .auth import auth_required
 from ipdb import set_trace
 
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-    region_name=os.getenv('AWS_REGION', 'us-east-1')
-)
-S3_BUCKET = os.getenv('S3_BUCKET_NAME')
-
 books_bp = Blueprint('books', __name__, url_prefix='/api/books')
 
+# Upper bound on ids accepted by the bulk access check
+MAX_ACCESS_CHECK_BOOKS = 100
 
-def validate_book_access(book, user_id):
-    return book.is_public or book.uploaded_by_id == user_id
-
-def generate_s3_file_key(book_id, filename):
-    safe_filename = secure_filename(filename)
-    unique_id = uuid.uuid4().hex
-    file_ext = os.path.splitext(safe_filename)[1]
-    return f"books/{book_id}/{unique_id}{file_ext}"
 
 @books_bp.route('', methods=['GET'])
 def get_books():
     try:
         books = Book.query.filter(
-            (Book.is_public == True)
+            (Book.is_public == True),
+            (Book.is_ready == True)
         ).all()
         result = [book.to_dict() for book in books]
         return jsonify(result), 200
@@ -45,7 +39,7 @@ def get_books():
 def get_book(book_id):
     try:
         book = Book.query.get_or_404(book_id)
-        if not validate_book_access(book, g.user.id):
+        if not can_view(g.user.id, book):
             return jsonify({'error': 'You do not have access to this book'}), 403
         book_data = book.to_dict()
         return jsonify(book_data), 200
@@ -53,9 +47,61 @@ def get_book(book_id):
         current_app.logger.error(f"Error fetching book: {str(e)}")
         return jsonify({'error': 'Failed to fetch book'}), 500
 
+@books_bp.route('/access', methods=['POST'])
+@auth_required
+def check_books_access():
+    """
+    Check access to many books at once, e.g. a whole shelf of cards.
+
+    Expects {"book_ids": [...]} and answers with one entry per id, in
+    order: minimal metadata for books the user may see, and only
+    {"id", "accessible": false} for the rest, whether hidden or missing.
+    Resolved with a constant number of queries however many ids are sent.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        book_ids = data.get('book_ids')
+
+        if not isinstance(book_ids, list) or not all(isinstance(book_id, int) for book_id in book_ids):
+            return jsonify({'error': 'book_ids must be a list of integers'}), 400
+        if len(book_ids) > MAX_ACCESS_CHECK_BOOKS:
+            return jsonify({'error': f'At most {MAX_ACCESS_CHECK_BOOKS} books can be checked at once'}), 400
+
+        book_ids = list(dict.fromkeys(book_ids))
+        rows = (
+            db.session.query(Book.id, Book.title, Book.author, Book.genre, Book.is_public,
+                             Book.uploaded_by_id, User.username)
+            .outerjoin(User, User.id == Book.uploaded_by_id)
+            .filter(Book.id.in_(book_ids), visibility_clause(g.user.id))
+            .all()
+        ) if book_ids else []
+        books_by_id = {row.id: row for row in rows}
+
+        results = []
+        for book_id in book_ids:
+            book = books_by_id.get(book_id)
+            if book is None:
+                results.append({'id': book_id, 'accessible': False})
+                continue
+            results.append({
+                'id': book.id,
+                'accessible': True,
+                'title': book.title,
+                'author': book.author,
+                'genre': book.genre,
+                'is_public': book.is_public,
+                'uploader': {'id': book.uploaded_by_id, 'username': book.username}
+            })
+
+        return jsonify({'books': results}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error checking book access: {str(e)}")
+        return jsonify({'error': 'Failed to check book access'}), 500
+
 @books_bp.route('', methods=['POST'])
 @auth_required
 def create_book():
+    stored = None
     try:
         title = request.form.get('title')
         author = request.form.get('author')
@@ -70,26 +116,24 @@ def create_book():
             return jsonify({'error': 'File with a filename is required'}), 400
 
         filename = secure_filename(file.filename)
-        file_key = f"books/{filename}"
         file_url = None
         file_size = None
         file_type = None
+        file_sha256 = None
 
         try:
-            file_content = file.read()
-            file_size = len(file_content)
-            file.seek(0)
-            s3_client.upload_fileobj(
-                file,
-                S3_BUCKET,
-                file_key,
-                ExtraArgs={'ContentType': file.content_type}
-            )
-            file_url = f"https://{S3_BUCKET}.s3.amazonaws.com/{file_key}"
-            file_type = file.content_type.replace('application/', '')
-        except Exception as e:
-            current_app.logger.error(f"Error uploading file to S3: {str(e)}", exc_info=True)
-            return jsonify({'error': 'Failed to upload file to S3'}), 500
+            # Stored by content: a file another book already has is not uploaded again
+            blob = store_blob(file.stream, file.content_type)
+            stored = (blob.sha256, blob.key)
+            file_size = blob.size
+            file_sha256 = blob.sha256
+            file_url = get_storage().url(blob.key)
+            # 'application/pdf' -> 'pdf', 'text/plain' -> 'txt'
+            file_type = (mimetypes.guess_extension(file.content_type or '') or '').lstrip('.')
+        except StorageError as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error storing uploaded file: {str(e)}", exc_info=True)
+            return jsonify({'error': 'Failed to store uploaded file'}), 500
 
         uploader_id = g.user.id if hasattr(g, 'user') and g.user else None
 
@@ -100,8 +144,10 @@ def create_book():
             is_public=is_public,
             uploaded_by_id=uploader_id,
             s3_url=file_url,
+            blob_id=blob.id,
             file_size=file_size,
-            file_type=file_type
+            file_type=file_type,
+            is_ready=False
         )
 
         db.session.add(new_book)
@@ -111,15 +157,22 @@ def create_book():
             file_name=filename,
             file_type=file_type,
             size=file_size,
+            sha256=file_sha256,
             book_id=new_book.id
         )
 
         db.session.add(new_book_data)
         db.session.commit()
 
-        return jsonify(new_book.to_dict()), 201
+        # Validation, text extraction and content indexing run in the
+        # background; the book is listed and announced once they succeed
+        job = enqueue_ingestion(new_book)
+
+        return jsonify({**new_book.to_dict(), 'ingestion_job': job.to_dict()}), 201
     except Exception as e:
         db.session.rollback()
+        if stored:
+            abandon_blob(*stored)
         current_app.logger.error(f"Error creating book: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
@@ -132,38 +185,33 @@ def delete_book(book_id):
             current_app.logger.warning(f"User {g.user.id} attempted to delete book {book_id} owned by user {book.uploaded_by_id}")
             return jsonify({'error': 'Forbidden: You do not own this book'}), 403
 
-        s3_url_to_delete = book.s3_url
-        s3_key_to_delete = None
-        bucket_name = current_app.config.get('S3_BUCKET')
-
-        if s3_url_to_delete:
-            try:
-                if f"/{bucket_name}/" in s3_url_to_delete:
-                    s3_key_to_delete = s3_url_to_delete.split(f"/{bucket_name}/", 1)[1]
-                elif f"//{bucket_name}." in s3_url_to_delete:
-                    s3_key_to_delete = s3_url_to_delete.split(f"{bucket_name}.s3.{current_app.config.get('S3_REGION')}.amazonaws.com/", 1)[1]
-                if not s3_key_to_delete:
-                    current_app.logger.error(f"Could not extract S3 key from URL: {s3_url_to_delete}")
-            except Exception as parse_error:
-                current_app.logger.error(f"Error parsing S3 URL {s3_url_to_delete}: {parse_error}")
-                s3_key_to_delete = None
-
+        # Shared content is only deleted with its last reference; files from
+        # before deduplication belong to this book alone
+        storage = get_storage()
+        key_to_delete = None if book.blob_id else storage.key_for_url(book.s3_url)
+        if book.s3_url and not book.blob_id and not key_to_delete:
+            current_app.logger.error(f"Could not extract storage key from URL: {book.s3_url}")
+
+        remove_book_content(book_id)
+        retract_book(book_id)
+        # Keep the book's jobs readable, without an id a new book may reuse
+        IngestionJob.query.filter_by(book_id=book_id).update(
+            {IngestionJob.book_id: None}, synchronize_session=False
+        )
+        released = release_blobs([book.blob_id])
         db.session.delete(book)
         db.session.commit()
 
-        if s3_key_to_delete and bucket_name:
+        get_search_backend().remove_book(book_id)
+        catalog_changed()
+        purge_blobs(released)
+
+        if key_to_delete:
             try:
-                s3 = boto3.client(
-                    's3',
-                    aws_access_key_id=current_app.config.get('S3_KEY'),
-                    aws_secret_access_key=current_app.config.get('S3_SECRET')
-                )
-                s3.delete_object(Bucket=bucket_name, Key=s3_key_to_delete)
-                current_app.logger.info(f"Successfully deleted S3 object: s3://{bucket_name}/{s3_key_to_delete}")
-            except Exception as s3_e:
-                current_app.logger.error(f"Error deleting S3 object s3://{bucket_name}/{s3_key_to_delete} after deleting DB record for book {book_id}: {str(s3_e)}")
-        elif not bucket_name:
-            current_app.logger.error(f"S3_BUCKET config missing, cannot delete S3 object for book {book_id}")
+                storage.delete(key_to_delete)
+                current_app.logger.info(f"Successfully deleted stored file: {key_to_delete}")
+            except StorageError as storage_error:
+                current_app.logger.error(f"Error deleting stored file {key_to_delete} after deleting DB record for book {book_id}: {str(storage_error)}")
 
         current_app.logger.info(f"User {g.user.id} successfully deleted book {book_id}")
         return '', 204
@@ -172,8 +220,73 @@ def delete_book(book_id):
         current_app.logger.error(f"Error deleting book {book_id} for user {g.user.id}: {str(e)}")
         return jsonify({'error': 'Failed to delete book', 'details': str(e)}), 500
 
+@books_bp.route('/uploads', methods=['POST'])
+@auth_required
+def create_direct_upload():
+    """
+    Start a direct-to-storage upload.
+
+    Expects JSON {filename, size, sha256, title, author, genre, is_public}
+    and answers with an upload_token and a presigned PUT (url plus the
+    headers to send). The client uploads the bytes straight to storage,
+    then calls /api/books/uploads/complete with the token.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        intent = create_upload_intent(
+            g.user.id,
+            data.get('filename'),
+            data.get('size'),
+            data.get('sha256'),
+            data
+        )
+        return jsonify(intent), 201
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        current_app.logger.error(f"Error creating upload intent: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to start upload'}), 500
+
+@books_bp.route('/uploads/complete', methods=['POST'])
+@auth_required
+def complete_direct_upload():
+    """
+    Finish a direct upload: verify the stored object's size, content type
+    and checksum, then create the book and queue its ingestion job. Safe
+    to retry.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if not data.get('upload_token'):
+            return jsonify({'error': 'upload_token is required'}), 400
+
+        book, created = finalize_upload(g.user.id, data['upload_token'])
+        if created:
+            job = enqueue_ingestion(book)
+        else:
+            job = latest_job(book.id)
+
+        return jsonify({**book.to_dict(), 'ingestion_job': job.to_dict() if job else None}), 201 if created else 200
+    except UploadError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error completing upload: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to complete upload'}), 500
+
 @books_bp.route('/<int:book_id>/upload', methods=['POST'])
+@auth_required
 def upload_book_file(book_id):
+    """
+    Replace a book's file and re-run its ingestion. If anything fails
+    after the file was stored, the transaction is rolled back and a newly
+    stored object is deleted again.
+    """
+    stored = None
     try:
         book = Book.query.get_or_404(book_id)
         if book.uploaded_by_id != g.user.id:
@@ -186,55 +299,51 @@ def upload_book_file(book_id):
         if file.filename == '':
             return jsonify({'error': 'No selected file'}), 400
 
-        valid_extensions = {'txt', 'pdf', 'epub', 'mobi', 'docx'}
+        # The types FileMetadata.file_type accepts
+        valid_extensions = set(CONTENT_TYPES)
         file_ext = file.filename.rsplit('.', 1)[-1].lower()
 
         if file_ext not in valid_extensions:
             return jsonify({'error': f'Invalid file type. Allowed: {", ".join(valid_extensions)}'}), 400
 
-        s3_key = generate_s3_file_key(book_id, file.filename)
-
         try:
-            s3_client.upload_fileobj(
-                file,
-                S3_BUCKET,
-                s3_key,
-                ExtraArgs={
-                    'ContentType': file.content_type,
-                    'ACL': 'private'
-                }
-            )
-        except ClientError as s3_error:
-            current_app.logger.error(f"S3 Upload Error: {str(s3_error)}")
-            return jsonify({'error': 'Failed to upload file to S3'}), 500
-
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
+            blob = store_blob(file.stream, file.content_type)
+            stored = (blob.sha256, blob.key)
+        except StorageError as storage_error:
+            db.session.rollback()
+            current_app.logger.error(f"Storage Upload Error: {str(storage_error)}")
+            return jsonify({'error': 'Failed to store uploaded file'}), 500
 
         file_metadata = book.file_metadata or FileMetadata(book_id=book.id)
         file_metadata.file_name = secure_filename(file.filename)
         file_metadata.file_type = file_ext
-        file_metadata.size = file_size
+        file_metadata.size = blob.size
+        file_metadata.sha256 = blob.sha256
 
-        book.s3_url = f"https://{S3_BUCKET}.s3.amazonaws.com/{s3_key}"
+        # The previous file stays stored while other books still share it
+        released = release_blobs([book.blob_id])
+        book.blob_id = blob.id
+        book.s3_url = get_storage().url(blob.key)
 
         db.session.add(file_metadata)
         db.session.commit()
+        purge_blobs(released)
+
+        # Re-indexes only this book's pages for the new file
+        job = enqueue_ingestion(book)
 
         return jsonify({
             'message': 'File uploaded successfully',
             's3_url': book.s3_url,
             'file_name': file_metadata.file_name,
             'file_type': file_metadata.file_type,
-            'size': file_metadata.size
+            'size': file_metadata.size,
+            'ingestion_job': job.to_dict()
         }), 201
-    except ClientError as s3_error:
-        db.session.rollback()
-        current_app.logger.error(f"S3 Upload Error: {str(s3_error)}")
-        return jsonify({'error': 'Failed to upload file to S3'}), 500
     except Exception as e:
         db.session.rollback()
+        if stored:
+            abandon_blob(*stored)
         current_app.logger.error(f"File upload error: {str(e)}")
         return jsonify({'error': 'Failed to process file upload'}), 500
 
@@ -242,36 +351,26 @@ def upload_book_file(book_id):
 def generate_download_url(book_id):
     try:
         book = Book.query.get_or_404(book_id)
-        if not validate_book_access(book, g.user.id):
+        if not can_view(g.user.id, book):
             return jsonify({'error': 'Unauthorized to download this book'}), 403
 
         if not book.file_metadata or not book.s3_url:
             return jsonify({'error': 'No file available for download'}), 404
 
-        s3_key = book.s3_url.split('.com/')[-1]
+        storage = get_storage()
+        key = storage.key_for_url(book.s3_url)
+        if not key:
+            return jsonify({'error': 'File not found in storage'}), 404
 
-        try:
-            download_url = s3_client.generate_presigned_url(
-                'get_object',
-                Params={
-                    'Bucket': S3_BUCKET,
-                    'Key': s3_key,
-                    'ResponseContentDisposition': f'attachment; filename="{book.file_metadata.file_name}"'
-                },
-                ExpiresIn=3600
-            )
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'NoSuchKey':
-                return jsonify({'error': 'File not found on S3'}), 404
-            raise e
+        download_url = storage.download_url(key, book.file_metadata.file_name, expires_in=3600)
 
         return jsonify({
             'download_url': download_url,
             'file_name': book.file_metadata.file_name,
             'expires_in': '1 hour'
         }), 200
-    except ClientError as s3_error:
-        current_app.logger.error(f"Download URL error: {str(s3_error)}")
+    except StorageError as storage_error:
+        current_app.logger.error(f"Download URL error: {str(storage_error)}")
         return jsonify({'error': 'Failed to generate download link'}), 500
     except Exception as e:
         current_app.logger.error(f"Download error: {str(e)}")
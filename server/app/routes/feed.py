@@ -0,0 +1,47 @@
+from flask import Blueprint, request, jsonify, g, current_app
+from app.services.feed import feed_page
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, query_fingerprint
+from .auth import auth_required
+
+feed_bp = Blueprint('feed', __name__, url_prefix='/api/feed')
+
+MAX_FEED_PAGE_SIZE = 100
+
+
+@feed_bp.route('', methods=['GET'])
+@auth_required
+def get_feed():
+    """
+    Recent uploads and notes from the current user's friends, newest first.
+
+    Pass next_cursor from one response as ?cursor= to get older entries. A
+    page may hold fewer than limit entries when some belong to former
+    friends; keep following next_cursor while has_next is true.
+    """
+    try:
+        user_id = g.user.id
+        limit = min(max(int(request.args.get('limit', current_app.config.get('FEED_PAGE_SIZE', 20))), 1), MAX_FEED_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        fingerprint = query_fingerprint('feed', user_id)
+
+        try:
+            before_id = decode_cursor(cursor, fingerprint) if cursor else None
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+
+        entries, last_id, has_next = feed_page(user_id, before_id, limit)
+
+        return jsonify({
+            'entries': [entry.to_dict() for entry in entries],
+            'count': len(entries),
+            'pagination': {
+                'limit': limit,
+                'has_next': has_next,
+                'next_cursor': encode_cursor(last_id, fingerprint) if has_next else None
+            }
+        }), 200
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error fetching feed: {str(e)}")
+        return jsonify({'error': 'Failed to fetch feed'}), 500
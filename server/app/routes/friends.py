@@ -1,48 +1,118 @@
-from flask import Blueprint, request, jsonify
-from sqlalchemy import or_, and_
+from flask import Blueprint, request, jsonify, g
+from sqlalchemy import or_, and_, delete, select, union_all, update
+from app import db
 from app.models import User, Friendship, Book
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.services.friend_graph import friendships_changed
+from app.services.loaders import get_loader
+from app.services.recommendations import get_recommendations
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, query_fingerprint
+from .auth import auth_required
 from datetime import datetime
 
 friends_bp = Blueprint('friends', __name__)
 
+FRIENDS_PAGE_SIZE = 50
+MAX_FRIENDS_PAGE_SIZE = 200
+MAX_BATCH_FRIEND_REQUESTS = 100
+
+def friends_page_query(user_id, after_id, limit):
+    """
+    One statement listing a page of user_id's accepted friends, projected
+    to the friend's id/username and the friendship's metadata. Each side
+    of the UNION ALL is a range scan of a (user_id|friend_id, status) index.
+    """
+    def side(own_column, friend_column):
+        return (
+            select(
+                Friendship.id.label('friendship_id'),
+                Friendship.created_at.label('created_at'),
+                User.id.label('id'),
+                User.username.label('username')
+            )
+            .join(User, User.id == friend_column)
+            .where(own_column == user_id, Friendship.status == 'accepted', Friendship.id > after_id)
+        )
+    
+    return (
+        union_all(side(Friendship.user_id, Friendship.friend_id), side(Friendship.friend_id, Friendship.user_id))
+        .order_by('friendship_id')
+        .limit(limit)
+    )
+
 @friends_bp.route('/api/friends', methods=['GET'])
-@jwt_required()
+@auth_required
 def get_friends():
-    """Get the current user's friends"""
+    """
+    Get the current user's friends, a page at a time.
+
+    Pages are keyset-paginated on the friendship id: pass next_cursor from
+    one response as ?cursor= to get the next. limit defaults to 50.
+    """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = g.user.id
+        limit = min(max(int(request.args.get('limit', FRIENDS_PAGE_SIZE)), 1), MAX_FRIENDS_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        fingerprint = query_fingerprint('friends', current_user_id)
         
-        # Find all accepted friendships where the current user is involved
-        friendships = Friendship.query.filter(
-            or_(
-                and_(Friendship.user_id == current_user_id, Friendship.status == 'accepted'),
-                and_(Friendship.friend_id == current_user_id, Friendship.status == 'accepted')
-            )
-        ).all()
+        try:
+            after_id = decode_cursor(cursor, fingerprint) if cursor else 0
+        except InvalidCursor as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Fetch one extra row to learn whether another page follows
+        rows = db.session.execute(friends_page_query(current_user_id, after_id, limit + 1)).all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
         
         friends_list = [
             {
-                **User.query.get(friendship.friend_id if friendship.user_id == current_user_id else friendship.user_id).to_dict(),
-                "friendship_id": friendship.id,
-                "created_at": friendship.created_at.isoformat() if hasattr(friendship, 'created_at') else None
+                "id": row.id,
+                "username": row.username,
+                "friendship_id": row.friendship_id,
+                "created_at": row.created_at.isoformat() if row.created_at else None
             }
-            for friendship in friendships if User.query.get(friendship.friend_id if friendship.user_id == current_user_id else friendship.user_id)
+            for row in rows
         ]
         
         return jsonify({
             "friends": friends_list,
-            "count": len(friends_list)
+            "count": len(friends_list),
+            "pagination": {
+                "limit": limit,
+                "has_next": has_next,
+                "next_cursor": encode_cursor(rows[-1].friendship_id, fingerprint) if has_next else None
+            }
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@friends_bp.route('/api/friends/recommendations', methods=['GET'])
+@auth_required
+def get_friend_recommendations():
+    """
+    People the current user may know, ranked by mutual friends and then by
+    shared uploads. Served from a precomputed row; computed: false means it
+    is still being built.
+    """
+    try:
+        current_user_id = g.user.id
+        
+        recommendation = get_recommendations(current_user_id)
+        
+        return jsonify({
+            "recommendations": recommendation.candidates if recommendation else [],
+            "computed": recommendation is not None,
+            "computed_at": recommendation.computed_at.isoformat() if recommendation else None
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @friends_bp.route('/api/friends/requests', methods=['GET'])
-@jwt_required()
+@auth_required
 def get_friend_requests():
     """Get pending friend requests for the current user"""
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = g.user.id
         
         # Find all pending friendships where the current user is the recipient
         pending_requests = Friendship.query.filter(
@@ -50,13 +120,15 @@ def get_friend_requests():
             Friendship.status == 'pending'
         ).all()
         
+        senders = get_loader('profiles').load_many(request.user_id for request in pending_requests)
+        
         requests_list = [
             {
                 "id": request.id,
-                "user": User.query.get(request.user_id).to_dict(),
+                "user": sender.to_dict(),
                 "created_at": request.created_at.isoformat() if hasattr(request, 'created_at') else None
             }
-            for request in pending_requests if User.query.get(request.user_id)
+            for request, sender in zip(pending_requests, senders) if sender
         ]
         
         return jsonify({
@@ -67,11 +139,11 @@ def get_friend_requests():
         return jsonify({"error": str(e)}), 500
 
 @friends_bp.route('/api/friends/add/<int:user_id>', methods=['POST'])
-@jwt_required()
+@auth_required
 def send_friend_request(user_id):
     """Send a friend request to another user"""
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = g.user.id
         
         # Check if the user exists
         target_user = User.query.get(user_id)
@@ -83,12 +155,7 @@ def send_friend_request(user_id):
             return jsonify({"error": "You cannot send a friend request to yourself"}), 400
         
         # Check if a friendship already exists
-        existing_friendship = Friendship.query.filter(
-            or_(
-                and_(Friendship.user_id == current_user_id, Friendship.friend_id == user_id),
-                and_(Friendship.user_id == user_id, Friendship.friend_id == current_user_id)
-            )
-        ).first()
+        existing_friendship = Friendship.between(current_user_id, user_id).first()
         
         if existing_friendship:
             if existing_friendship.status == 'accepted':
@@ -98,7 +165,7 @@ def send_friend_request(user_id):
                 if existing_friendship.user_id == user_id:
                     existing_friendship.status = 'accepted'
                     existing_friendship.updated_at = datetime.utcnow()
-                    existing_friendship.save()
+                    db.session.commit()
                     return jsonify({"message": "Friend request accepted"}), 200
                 # If current user already sent the request
                 else:
@@ -113,7 +180,8 @@ def send_friend_request(user_id):
             updated_at=datetime.utcnow()
         )
         
-        new_friendship.save()
+        db.session.add(new_friendship)
+        db.session.commit()
         
         return jsonify({
             "message": "Friend request sent successfully",
@@ -123,11 +191,11 @@ def send_friend_request(user_id):
         return jsonify({"error": str(e)}), 500
 
 @friends_bp.route('/api/friends/requests/<int:request_id>/accept', methods=['POST'])
-@jwt_required()
+@auth_required
 def accept_friend_request(request_id):
     """Accept a pending friend request"""
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = g.user.id
         
         # Find the friendship request
         friendship = Friendship.query.get(request_id)
@@ -146,7 +214,7 @@ def accept_friend_request(request_id):
         # Accept the request
         friendship.status = 'accepted'
         friendship.updated_at = datetime.utcnow()
-        friendship.save()
+        db.session.commit()
         
         # Get the requestor's info
         requestor = User.query.get(friendship.user_id)
@@ -166,11 +234,11 @@ def accept_friend_request(request_id):
         return jsonify({"error": str(e)}), 500
 
 @friends_bp.route('/api/friends/requests/<int:request_id>/reject', methods=['POST'])
-@jwt_required()
+@auth_required
 def reject_friend_request(request_id):
     """Reject a pending friend request"""
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = g.user.id
         
         # Find the friendship request
         friendship = Friendship.query.get(request_id)
@@ -187,7 +255,8 @@ def reject_friend_request(request_id):
             return jsonify({"error": "This request has already been processed"}), 400
         
         # Delete the request
-        friendship.delete()
+        db.session.delete(friendship)
+        db.session.commit()
         
         return jsonify({
             "message": "Friend request rejected"
@@ -195,12 +264,104 @@ def reject_friend_request(request_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@friends_bp.route('/api/friends/requests/batch', methods=['POST'])
+@auth_required
+def respond_to_friend_requests():
+    """
+    Accept or reject many pending friend requests at once.
+
+    Expects {"request_ids": [...], "action": "accept" | "reject"} and answers
+    with one result per id, in order, plus processed_ids: the requests this
+    call actually changed. Ownership and state are checked with one query,
+    every valid request is changed by a single UPDATE (accept) or DELETE
+    (reject), and everything is committed once. A request another call
+    processed in between is reported as already_processed.
+
+    Answers 200 when at least one request was processed; otherwise 409 if
+    some were already processed, else 404.
+    """
+    try:
+        current_user_id = g.user.id
+        data = request.get_json(silent=True) or {}
+        request_ids = data.get('request_ids')
+        action = data.get('action')
+
+        if action not in ('accept', 'reject'):
+            return jsonify({"error": 'action must be "accept" or "reject"'}), 400
+        if not isinstance(request_ids, list) or not all(isinstance(request_id, int) for request_id in request_ids):
+            return jsonify({"error": "request_ids must be a list of integers"}), 400
+        if len(request_ids) > MAX_BATCH_FRIEND_REQUESTS:
+            return jsonify({"error": f"At most {MAX_BATCH_FRIEND_REQUESTS} requests can be processed at once"}), 400
+
+        request_ids = list(dict.fromkeys(request_ids))
+        rows = db.session.execute(
+            select(Friendship.id, Friendship.user_id, Friendship.friend_id, Friendship.status)
+            .where(Friendship.id.in_(request_ids))
+        ).all() if request_ids else []
+        requests_by_id = {row.id: row for row in rows}
+
+        statuses = {}
+        valid = []
+        for request_id in request_ids:
+            friendship = requests_by_id.get(request_id)
+            if friendship is None:
+                statuses[request_id] = "not_found"
+            elif friendship.friend_id != current_user_id:
+                statuses[request_id] = "forbidden"
+            elif friendship.status != 'pending':
+                statuses[request_id] = "already_processed"
+            else:
+                valid.append(request_id)
+
+        changed = {}
+        if valid:
+            # Re-check recipient and state in the statement itself, and take
+            # the rows it really changed, so a request processed concurrently
+            # is neither changed twice nor reported as done by this call
+            pending = (
+                Friendship.id.in_(valid),
+                Friendship.friend_id == current_user_id,
+                Friendship.status == 'pending'
+            )
+            if action == 'accept':
+                statement = update(Friendship).where(*pending).values(status='accepted', updated_at=datetime.utcnow())
+            else:
+                statement = delete(Friendship).where(*pending)
+            changed = dict(db.session.execute(
+                statement.returning(Friendship.id, Friendship.user_id),
+                execution_options={"synchronize_session": False}
+            ).all())
+            db.session.commit()
+            if changed:
+                # Bulk statements bypass the session's friendship tracking
+                friendships_changed(current_user_id, *changed.values())
+
+        done = "accepted" if action == 'accept' else "rejected"
+        for request_id in valid:
+            statuses[request_id] = done if request_id in changed else "already_processed"
+
+        if changed or not request_ids:
+            status_code = 200
+        elif "already_processed" in statuses.values():
+            status_code = 409
+        else:
+            status_code = 404
+        return jsonify({
+            "action": action,
+            "processed": len(changed),
+            "processed_ids": [request_id for request_id in request_ids if request_id in changed],
+            "results": [{"id": request_id, "status": statuses[request_id]} for request_id in request_ids]
+        }), status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
 @friends_bp.route('/api/friends/<int:friendship_id>', methods=['DELETE'])
-@jwt_required()
+@auth_required
 def remove_friend(friendship_id):
     """Remove a friend"""
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = g.user.id
         
         # Find the friendship
         friendship = Friendship.query.get(friendship_id)
@@ -213,7 +374,8 @@ def remove_friend(friendship_id):
             return jsonify({"error": "You are not authorized to remove this friendship"}), 403
         
         # Delete the friendship
-        friendship.delete()
+        db.session.delete(friendship)
+        db.session.commit()
         
         return jsonify({
             "message": "Friend removed successfully"
@@ -222,19 +384,14 @@ def remove_friend(friendship_id):
         return jsonify({"error": str(e)}), 500
 
 @friends_bp.route('/api/friends/<int:friend_id>/books', methods=['GET'])
-@jwt_required()
+@auth_required
 def get_friend_books(friend_id):
     """Get books shared by a friend"""
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = g.user.id
         
         # Check if they are friends
-        friendship = Friendship.query.filter(
-            or_(
-                and_(Friendship.user_id == current_user_id, Friendship.friend_id == friend_id, Friendship.status == 'accepted'),
-                and_(Friendship.user_id == friend_id, Friendship.friend_id == current_user_id, Friendship.status == 'accepted')
-            )
-        ).first()
+        friendship = Friendship.between(current_user_id, friend_id).filter(Friendship.status == 'accepted').first()
         
         if not friendship:
             return jsonify({"error": "You are not friends with this user"}), 403
@@ -242,6 +399,7 @@ def get_friend_books(friend_id):
         # Get the friend's books that are either public or shared
         books = Book.query.filter(
             Book.uploaded_by_id == friend_id,
+            Book.is_ready == True,
             or_(
                 Book.is_public == True,
                 # Add additional sharing criteria here if needed
@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify, g, current_app
+from app import db
+from app.models import IngestionJob
+from .auth import auth_required
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@auth_required
+def get_job(job_id):
+    """
+    Status of a background ingestion job: status (queued, running,
+    succeeded, failed), the current stage, progress in percent, and the
+    error or extracted metadata once it is done. Poll until done is true.
+    """
+    try:
+        job = db.session.get(IngestionJob, job_id)
+        # Other users' jobs are reported as missing rather than forbidden
+        if job is None or job.user_id != g.user.id:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict()), 200
+    except Exception as e:
+        current_app.logger.error(f"Error fetching job {job_id}: {str(e)}")
+        return jsonify({'error': 'Failed to fetch job'}), 500
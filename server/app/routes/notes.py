@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, g, current_app
 from app import db
 from app.models import Note, Book
+from app.services.feed import publish_note, retract_note
 from .auth import auth_required
 
 notes_bp = Blueprint('note', __name__, url_prefix='/api/notes')
@@ -81,6 +82,7 @@ def create_note():
         
         db.session.add(new_note)
         db.session.commit()
+        publish_note(new_note, book)
         
         return jsonify(new_note.to_dict()), 201
     except ValueError as e:
@@ -153,6 +155,7 @@ def delete_note(note_id):
         if note.user_id != user_id:
             return jsonify({'error': 'You do not have access to this note'}), 403
         
+        retract_note(note_id)
         db.session.delete(note)
         db.session.commit()
         
@@ -1,70 +1,140 @@
-from flask import Blueprint, request, jsonify
-from sqlalchemy import or_, and_
-from app.models import Book, User, Friendship
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import math
+from functools import partial
+from flask import Blueprint, request, jsonify, g
+from app.models import Book, User
+from app.services.access_control import can_view, visibility_clause
+from app.services.content_search import search_pages
+from app.services.friend_graph import get_friend_graph
+from app.services.loaders import get_loader
+from app.services.search import get_suggestion_index, tokenize
+from app.services.search_cache import get_search_cache
+from app.services.search_backends import get_search_backend
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, is_row_id, query_fingerprint
+from .auth import auth_required
 
 search_bp = Blueprint('search', __name__)
 
+
+def page_info(total, page, per_page):
+    """Offset pagination metadata for a result set of known size"""
+    return {
+        "has_next": page * per_page < total,
+        "has_prev": page > 1,
+        "pages": math.ceil(total / per_page) if per_page else 0
+    }
+
+
+def keyset_page(search, position, per_page):
+    """
+    Fetch the page after a keyset position from a ranked search function
+
+    Args:
+        search: Callable taking limit and after, returning (id, score) tuples
+        position: [score, id] of the last row already returned, None for the
+            first page, or False once the results are exhausted
+        per_page (int): Page size
+
+    Returns:
+        tuple: (ids, next_position)
+    """
+    if position is False:
+        return [], False
+    ranked = search(limit=per_page + 1, after=tuple(position) if position else None)
+    if len(ranked) <= per_page:
+        return [row_id for row_id, _ in ranked], False
+    ranked = ranked[:per_page]
+    last_id, last_score = ranked[-1]
+    return [row_id for row_id, _ in ranked], [last_score, last_id]
+
+
+def valid_positions(state):
+    """Cursor state check: {'books'|'users': [score, id] or False}"""
+    if not isinstance(state, dict) or not set(state) <= {'books', 'users'}:
+        return False
+    for position in state.values():
+        if position is False:
+            continue
+        if not (isinstance(position, list) and len(position) == 2):
+            return False
+        score, row_id = position
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not is_row_id(row_id):
+            return False
+    return True
+
+
 @search_bp.route('/api/search', methods=['GET'])
-@jwt_required()
+@auth_required
 def search():
-    """Search for books and users"""
+    """
+    Search for books and users.
+
+    Pages are numbered (page/per_page) by default. Passing paginate=cursor,
+    or a cursor from a previous response, switches to keyset pagination:
+    no total is counted unless include_total=true, in which case an
+    approximate (pre-visibility) total is returned.
+    
+    Responses are cached per user; see app.services.search_cache for how
+    writes invalidate them.
+    """
     try:
         # Get the current user ID
-        current_user_id = get_jwt_identity()
+        current_user_id = g.user.id
         
         # Get search parameters
         query = request.args.get('q', '')
         search_type = request.args.get('type', 'all')  # 'all', 'books', 'users'
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 10))
+        cursor = request.args.get('cursor')
+        use_cursor = cursor is not None or request.args.get('paginate') == 'cursor'
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
         # Validate the search term
         if not query or len(query) < 2:
             return jsonify({"error": "Search query must be at least 2 characters"}), 400
         
-        results = {"books": [], "users": [], "total_count": 0}
+        normalized_query = ' '.join(tokenize(query))
+        
+        # Serve repeated searches from the cache without touching the database
+        cache = get_search_cache()
+        cache_key = cache.key(current_user_id, search_type, normalized_query, page, per_page,
+                              use_cursor, cursor, include_total)
+        cached = cache.entries.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
+        
+        fingerprint = query_fingerprint(search_type, normalized_query)
+        try:
+            positions = decode_cursor(cursor, fingerprint, valid_positions) if cursor else {}
+        except InvalidCursor as e:
+            return jsonify({"error": str(e)}), 400
+        
+        results = {"books": [], "users": []}
+        backend = get_search_backend()
         
         # Search books
         if search_type in ['all', 'books']:
-            # Get user friends to determine which books they can see
-            friends_query = Friendship.query.filter(
-                or_(
-                    Friendship.user_id == current_user_id,
-                    Friendship.friend_id == current_user_id
-                ),
-                Friendship.status == 'accepted'
-            )
+            visibility = visibility_clause(current_user_id)
+            search_books = partial(backend.search_books, query, filters=(visibility,))
             
-            friend_ids = []
-            for friendship in friends_query.all():
-                if friendship.user_id == current_user_id:
-                    friend_ids.append(friendship.friend_id)
-                else:
-                    friend_ids.append(friendship.user_id)
+            # Fetch one ranked page from the search backend
+            if use_cursor:
+                page_ids, positions['books'] = keyset_page(search_books, positions.get('books'), per_page)
+            else:
+                ranked = search_books(limit=per_page, offset=(page - 1) * per_page)
+                page_ids = [book_id for book_id, _ in ranked]
+                books_total = backend.count_books(query, filters=(visibility,))
+                books_pagination = page_info(books_total, page, per_page)
             
-            # Books query - include public books or books owned by the user or their friends
-            books_query = Book.query.filter(
-                and_(
-                    or_(
-                        Book.is_public == True,
-                        Book.uploaded_by_id == current_user_id,
-                        Book.uploaded_by_id.in_(friend_ids)
-                    ),
-                    or_(
-                        Book.title.ilike(f'%{query}%'),
-                        Book.author.ilike(f'%{query}%'),
-                        Book.genre.ilike(f'%{query}%')
-                    )
-                )
-            )
-            
-            # Paginate books results
-            books_pagination = books_query.paginate(page=page, per_page=per_page, error_out=False)
+            # Load the page's books, then all their uploaders in one batch.
+            # Rankings can come from a cache or an in-memory index, so a
+            # book deleted since then is skipped rather than failing the page
+            books = [book for book in get_loader('books').load_many(page_ids) if book is not None]
+            uploaders = get_loader('users').prime(book.uploaded_by_id for book in books)
             
             # Format books for response
-            for book in books_pagination.items:
-                uploader = User.query.get(book.uploaded_by_id)
+            for book in books:
+                uploader = uploaders.load(book.uploaded_by_id)
                 book_data = {
                     "id": book.id,
                     "title": book.title,
@@ -74,34 +144,31 @@ def search():
                     "uploader": {
                         "id": uploader.id,
                         "username": uploader.username
-                    }
+                    } if uploader else None
                 }
                 results["books"].append(book_data)
         
         # Search users
         if search_type in ['all', 'users']:
-            # Users query - search by username
-            users_query = User.query.filter(
-                User.username.ilike(f'%{query}%'),
-                User.id != current_user_id  # Exclude current user
-            )
+            # Rank usernames through the search backend, excluding the current user
+            user_filters = (User.id != current_user_id,)
+            search_users = partial(backend.search_users, query, filters=user_filters)
+            
+            if use_cursor:
+                page_ids, positions['users'] = keyset_page(search_users, positions.get('users'), per_page)
+            else:
+                ranked = search_users(limit=per_page, offset=(page - 1) * per_page)
+                page_ids = [user_id for user_id, _ in ranked]
+                users_total = backend.count_users(query, filters=user_filters)
+                users_pagination = page_info(users_total, page, per_page)
             
-            # Paginate users results
-            users_pagination = users_query.paginate(page=page, per_page=per_page, error_out=False)
+            users = [user for user in get_loader('users').load_many(page_ids) if user is not None]
+            neighbors = get_friend_graph().neighbors(current_user_id)
             
             # Format users for response
-            for user in users_pagination.items:
+            for user in users:
                 # Check if they're friends
-                friendship = Friendship.query.filter(
-                    or_(
-                        and_(Friendship.user_id == current_user_id, Friendship.friend_id == user.id),
-                        and_(Friendship.user_id == user.id, Friendship.friend_id == current_user_id)
-                    )
-                ).first()
-                
-                friendship_status = None
-                if friendship:
-                    friendship_status = friendship.status
+                friendship_status = neighbors.get(user.id)
                 
                 user_data = {
                     "id": user.id,
@@ -110,33 +177,102 @@ def search():
                 }
                 results["users"].append(user_data)
         
+        if use_cursor:
+            has_next = any(position is not False for position in positions.values())
+            results["pagination"] = {
+                "per_page": per_page,
+                "has_next": has_next,
+                "next_cursor": encode_cursor(positions, fingerprint) if has_next else None
+            }
+            if include_total:
+                results["approximate_total_count"] = (
+                    (backend.estimate_books(query) if search_type in ['all', 'books'] else 0) +
+                    (backend.estimate_users(query) if search_type in ['all', 'users'] else 0)
+                )
+            cache.entries.set(cache_key, results)
+            return jsonify(results)
+        
         # Calculate total count
         if search_type == 'books':
-            results["total_count"] = books_query.count()
+            results["total_count"] = books_total
         elif search_type == 'users':
-            results["total_count"] = users_query.count()
+            results["total_count"] = users_total
         else:
-            results["total_count"] = (books_query.count() if 'books_query' in locals() else 0) + (users_query.count() if 'users_query' in locals() else 0)
+            results["total_count"] = books_total + users_total
         
         # Add pagination info
         results["pagination"] = {
             "page": page,
             "per_page": per_page,
-            "has_next": books_pagination.has_next if search_type in ['books', 'all'] else users_pagination.has_next,
-            "has_prev": books_pagination.has_prev if search_type in ['books', 'all'] else users_pagination.has_prev,
-            "total_pages": books_pagination.pages if search_type in ['books', 'all'] else users_pagination.pages
+            "has_next": books_pagination["has_next"] if search_type in ['books', 'all'] else users_pagination["has_next"],
+            "has_prev": books_pagination["has_prev"] if search_type in ['books', 'all'] else users_pagination["has_prev"],
+            "total_pages": books_pagination["pages"] if search_type in ['books', 'all'] else users_pagination["pages"]
         }
         
+        cache.entries.set(cache_key, results)
         return jsonify(results)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@search_bp.route('/api/search/suggest', methods=['GET'])
+@auth_required
+def suggest():
+    """
+    Autocomplete a partially typed query with book titles, authors and
+    usernames. Served entirely from memory, so it is cheap enough to call
+    on every keystroke.
+    """
+    try:
+        query = request.args.get('q', '')
+        limit = int(request.args.get('limit', 10))
+        
+        suggestions = get_suggestion_index().search(query, limit=max(limit, 1))
+        
+        return jsonify({
+            "suggestions": [{"type": kind, "text": text} for kind, text in suggestions]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@search_bp.route('/api/search/content', methods=['GET'])
+@auth_required
+def search_content():
+    """Search inside the text of the books the user can see"""
+    try:
+        current_user_id = g.user.id
+        
+        query = request.args.get('q', '')
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 10))
+        
+        if not query or len(query) < 2:
+            return jsonify({"error": "Search query must be at least 2 characters"}), 400
+        
+        hits, total = search_pages(
+            query,
+            filters=(visibility_clause(current_user_id),),
+            limit=per_page,
+            offset=(page - 1) * per_page
+        )
+        
+        return jsonify({
+            "results": hits,
+            "total_count": total,
+            "pagination": {
+                "page": page,
+                "per_page": per_page,
+                **page_info(total, page, per_page)
+            }
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @search_bp.route('/api/books/<int:book_id>', methods=['GET'])
-@jwt_required()
+@auth_required
 def get_book_details(book_id):
     """Get detailed information about a specific book"""
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = g.user.id
         
         book = Book.query.get(book_id)
         
@@ -144,17 +280,8 @@ def get_book_details(book_id):
             return jsonify({"error": "Book not found"}), 404
         
         # Check if user has access to view this book
-        if not book.is_public and book.uploaded_by_id != current_user_id:
-            # Check if they're friends
-            friendship = Friendship.query.filter(
-                or_(
-                    and_(Friendship.user_id == current_user_id, Friendship.friend_id == book.uploaded_by_id, Friendship.status == 'accepted'),
-                    and_(Friendship.user_id == book.uploaded_by_id, Friendship.friend_id == current_user_id, Friendship.status == 'accepted')
-                )
-            ).first()
-            
-            if not friendship:
-                return jsonify({"error": "You don't have permission to view this book"}), 403
+        if not can_view(current_user_id, book):
+            return jsonify({"error": "You don't have permission to view this book"}), 403
         
         uploader = User.query.get(book.uploaded_by_id)
         
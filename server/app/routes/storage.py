@@ -0,0 +1,51 @@
+from flask import Blueprint, request, jsonify, current_app, send_file
+from app.services.storage import ChecksumMismatch, LocalBackend, ObjectNotFound, StorageError, get_storage
+
+storage_bp = Blueprint('storage', __name__, url_prefix='/api/storage')
+
+
+def _local_storage():
+    storage = get_storage()
+    return storage if isinstance(storage, LocalBackend) else None
+
+
+@storage_bp.route('/files/<token>', methods=['GET', 'PUT'])
+def local_file(token):
+    """
+    Serve or accept one file of the local storage backend. The token comes
+    from LocalBackend.download_url or presign_upload and is the only
+    authorization, as with an S3 presigned URL.
+    """
+    storage = _local_storage()
+    if storage is None:
+        return jsonify({'error': 'Not found'}), 404
+    try:
+        claims = storage.read_token(token, 'get' if request.method == 'GET' else 'put')
+    except StorageError as e:
+        return jsonify({'error': str(e)}), 403
+
+    if request.method == 'GET':
+        try:
+            stored = storage.open(claims['key'])
+        except ObjectNotFound:
+            return jsonify({'error': 'File not found in storage'}), 404
+        filename = claims.get('filename')
+        content_type = storage.stat(claims['key']).content_type
+        return send_file(
+            stored,
+            # Without either, send_file cannot pick a type
+            mimetype=content_type or (None if filename else 'application/octet-stream'),
+            as_attachment=bool(filename),
+            download_name=filename,
+        )
+
+    if request.content_type != claims['content_type'] or request.content_length != claims['size']:
+        return jsonify({'error': 'Content-Type and Content-Length must match the signed upload'}), 400
+    try:
+        storage.save(request.stream, claims['key'], claims['content_type'], expected_sha256=claims['sha256'])
+    except ChecksumMismatch:
+        return jsonify({'error': 'Body does not match the signed checksum'}), 400
+    except StorageError as e:
+        current_app.logger.error(f"Local storage upload error: {str(e)}")
+        return jsonify({'error': 'Failed to store file'}), 500
+    return '', 200
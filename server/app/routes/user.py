@@ -1,8 +1,18 @@
 from flask import Blueprint, request, jsonify, g, current_app, session
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
-from app.models import User, Friendship
+from app.models import Book, User, Friendship, FeedEntry, IngestionJob
+from app.services.blobs import purge_blobs, release_blobs
+from app.services.content_search import remove_book_content
+from app.services.loaders import get_loader
+from app.services.search_backends import get_search_backend
+from app.services.auth_service import HasherBusy, hash_password, password_needs_rehash, verify_password
+from app.services.friend_graph import friendships_changed, get_friend_graph
+from app.services.identity import forget_identity, load_current_user
+from app.services.search_cache import catalog_changed
+from app.services.tokens import issue_tokens, refresh_access_token, revoke_tokens, start_session
+from app.services.throttle import get_login_throttle, retry_after_header
 from sqlalchemy.orm import joinedload
+from flask_jwt_extended import get_jwt, jwt_required
 from sqlalchemy.exc import IntegrityError
 from .auth import auth_required
 from ipdb import set_trace
@@ -12,6 +22,13 @@ user_bp = Blueprint('user', __name__, url_prefix='/api/users')
 
 #error handler global for 404s
 
+def busy_response():
+    """503 for when the password hashing pool is saturated"""
+    response = jsonify({'error': 'Server busy, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 @user_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -33,20 +50,26 @@ def register():
         new_user = User(
             username=data['username'],
             email=data['email'],
-            password_hash=generate_password_hash(password),
+            password_hash=hash_password(password),
             oauth_provider=data.get('oauth_provider')
         )
         
         db.session.add(new_user)
         db.session.commit()
 
-        session['user_id'] = new_user.id
+        get_search_backend().index_user(new_user)
+        catalog_changed()
+
+        start_session(new_user)
         
         return jsonify({
             'message': 'User registered successfully',
-            'user': new_user.to_dict()  # Use SerializerMixin
+            'user': new_user.to_dict(),  # Use SerializerMixin
+            'tokens': issue_tokens(new_user)
         }), 201
         
+    except HasherBusy:
+        return busy_response()
     except (ValueError, TypeError, AttributeError, IntegrityError) as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 422
@@ -68,6 +91,15 @@ def login():
             return jsonify({'error': 'Password is required'}), 400
         
 
+        # Reject throttled attempts before the lookup and the hash check
+        identifier = data.get('username') or data.get('email')
+        throttle = get_login_throttle()
+        retry_after = throttle.check(identifier, request.remote_addr)
+        if retry_after:
+            response = jsonify({'error': 'Too many login attempts, please try again later'})
+            response.headers['Retry-After'] = retry_after_header(retry_after)
+            return response, 429
+
         #data.get('username') or data.get('email')   .first()
         # Find user by username or email
         if data.get('username'):
@@ -76,15 +108,25 @@ def login():
             user = User.query.filter_by(email=data['email']).first()
         
         # Check if user exists and password is correct
-        if not user or not check_password_hash(user.password_hash, data['password']):
+        if not user or not verify_password(data['password'], user.password_hash):
             return jsonify({'error': 'Invalid credentials'}), 401
 
-        session['user_id'] = user.id
+        # Upgrade hashes from an older cost or from werkzeug while the
+        # plaintext is at hand
+        if password_needs_rehash(user.password_hash):
+            user.password_hash = hash_password(data['password'])
+            db.session.commit()
+
+        throttle.succeeded(identifier, request.remote_addr)
+        start_session(user)
         
         return jsonify({
             'message': 'Login successful',
-            'user': user.to_dict()  # Use SerializerMixin
+            'user': user.to_dict(),  # Use SerializerMixin
+            'tokens': issue_tokens(user)
         }), 200
+    except HasherBusy:
+        return busy_response()
     except Exception as e:
         current_app.logger.error(f"Error during login: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -95,16 +137,54 @@ def login():
 def logout():
     try:
         session.pop('user_id', None)
+        session.pop('token_revision', None)
         return jsonify(''), 204
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@user_bp.route('/token/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_token():
+    """Exchange a refresh token (as the bearer token) for a new access token"""
+    try:
+        access_token = refresh_access_token(get_jwt())
+        if access_token is None:
+            return jsonify({'error': 'Login Required: Token has been revoked'}), 401
+        return jsonify({'access_token': access_token, 'token_type': 'Bearer'}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error refreshing token: {str(e)}")
+        return jsonify({'error': 'Failed to refresh token'}), 500
+
+
+@user_bp.route('/token/revoke', methods=['POST'])
+@auth_required
+def revoke_all_tokens():
+    """Sign out everywhere: revoke every refresh token and session of the current user"""
+    try:
+        user = load_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        revoke_tokens(user)
+        db.session.commit()
+        forget_identity(user.id)
+        session.pop('user_id', None)
+        session.pop('token_revision', None)
+        return jsonify({'message': 'All tokens revoked'}), 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error revoking tokens: {str(e)}")
+        return jsonify({'error': 'Failed to revoke tokens'}), 500
+
+
 @user_bp.route('/me', methods=['GET'])
 @auth_required
 def get_current_user():
     try:
-        return jsonify(g.user.to_dict()), 200
+        user = load_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        return jsonify(user.to_dict()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -113,7 +193,9 @@ def get_current_user():
 @auth_required
 def get_profile():
     try:
-        user = g.user
+        user = load_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
         return jsonify(user.to_dict()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -123,7 +205,9 @@ def get_profile():
 def update_profile():
     """Update current user's profile"""
     try:
-        user = g.user
+        user = load_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
         data = request.json
 
         #let database check uniqueness of username and email
@@ -145,14 +229,26 @@ def update_profile():
             #validate password complexity
             if len(data['password']) < 8:
                 return jsonify({'error': 'Password must be at least 8 characters long'}), 400
-            user.password_hash = generate_password_hash(data['password'])
+            user.password_hash = hash_password(data['password'])
+            # A new password signs out every other token holder and session
+            revoke_tokens(user)
         db.session.commit()
+        if 'password' in data:
+            # ...but keeps this one signed in
+            start_session(user)
+
+        forget_identity(user.id)
+        get_search_backend().index_user(user)
+        catalog_changed()
         
         return jsonify({
             'message': 'Profile updated successfully',
             'user': user.to_dict()  # Use SerializerMixin
         }), 200
         
+    except HasherBusy:
+        db.session.rollback()
+        return busy_response()
     except ValueError as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
@@ -168,19 +264,44 @@ def update_profile():
 def delete_user():
     """Delete the current user's account using SQLAlchemy ORM."""
     try:
-        user = g.user  # Get the authenticated user from g
+        user = load_current_user()
 
         if not user:
             return jsonify({'error': 'No user found in session'}), 401
 
+        # Bulk deletes bypass the session, so the ex-friends' cached graph
+        # entries are invalidated explicitly after the commit
+        friend_ids = list(get_friend_graph().neighbors(user.id))
+
         # Delete friendships associated with the user (Crucial!)
         Friendship.query.filter(
             (Friendship.user_id == user.id) | (Friendship.friend_id == user.id)
         ).delete(synchronize_session=False)  # Added cascade delete in Friendship model is better
+        FeedEntry.query.filter(
+            (FeedEntry.owner_id == user.id) | (FeedEntry.actor_id == user.id)
+        ).delete(synchronize_session=False)
+        IngestionJob.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+        # The user's books go with the account; files they share stay stored
+        books = Book.query.filter_by(uploaded_by_id=user.id).with_entities(Book.id, Book.blob_id).all()
+        released = release_blobs(blob_id for _, blob_id in books)
+        # SQLite does not enforce the page tables' ON DELETE CASCADE
+        for book_id, _ in books:
+            remove_book_content(book_id)
         db.session.flush()  # Flush the session to execute the delete queries
 
+        user_id = user.id
         db.session.delete(user)
         db.session.commit()
+        purge_blobs(released)
+
+        forget_identity(user_id)
+        search_backend = get_search_backend()
+        search_backend.remove_user(user_id)
+        # The ORM cascade deleted the books; drop them from the in-memory indexes too
+        for book_id, _ in books:
+            search_backend.remove_book(book_id)
+        catalog_changed()
+        friendships_changed(user_id, *friend_ids)
 
         session.pop('user_id', None) # Remove the user from the session
         return jsonify({'message': 'Account deleted successfully'}), 200
@@ -223,10 +344,7 @@ def send_friend_request():
         if not friend:
             return jsonify({'error': 'User not found'}), 404
 
-        existing_friendship = Friendship.query.filter(
-            ((Friendship.user_id == user_id) & (Friendship.friend_id == friend_id)) |
-            ((Friendship.user_id == friend_id) & (Friendship.friend_id == user_id))
-        ).first()
+        existing_friendship = Friendship.between(user_id, friend_id).first()
 
         if existing_friendship:
             if existing_friendship.status == 'accepted':
@@ -307,24 +425,21 @@ def get_friends():
         if not user:
             return jsonify({'error': 'User not found'}), 404
 
+        friend_ids = [
+            friendship.friend_id for friendship in user.sent_friend_requests if friendship.status == 'accepted'
+        ] + [
+            friendship.user_id for friendship in user.received_friend_requests if friendship.status == 'accepted'
+        ]
+        users = get_loader('users').prime(friend_ids)
+
         friends = []
-        for friendship in user.sent_friend_requests:
-            if friendship.status == 'accepted':
-                friend = User.query.get(friendship.friend_id)
-                friends.append({
-                    'id': friend.id,
-                    'username': friend.username,
-                    'email': friend.email
-                })
-
-        for friendship in user.received_friend_requests:
-            if friendship.status == 'accepted':
-                friend = User.query.get(friendship.user_id)
-                friends.append({
-                    'id': friend.id,
-                    'username': friend.username,
-                    'email': friend.email
-                })
+        for friend_id in friend_ids:
+            friend = users.load(friend_id)
+            friends.append({
+                'id': friend.id,
+                'username': friend.username,
+                'email': friend.email
+            })
 
         return jsonify(friends), 200
     except Exception as e:
@@ -342,26 +457,30 @@ def get_friend_requests():
         if not user:
             return jsonify({'error': 'User not found'}), 404
 
+        sent = [friendship for friendship in user.sent_friend_requests if friendship.status == 'pending']
+        received = [friendship for friendship in user.received_friend_requests if friendship.status == 'pending']
+        users = get_loader('users').prime(
+            [friendship.friend_id for friendship in sent] + [friendship.user_id for friendship in received]
+        )
+
         sent_requests = []
         received_requests = []
 
-        for friendship in user.sent_friend_requests:
-            if friendship.status == 'pending':
-                friend = User.query.get(friendship.friend_id)
-                sent_requests.append({
-                    'id': friendship.id,
-                    'friend_id': friend.id,
-                    'friend_username': friend.username
-                })
-
-        for friendship in user.received_friend_requests:
-            if friendship.status == 'pending':
-                sender = User.query.get(friendship.user_id)
-                received_requests.append({
-                    'id': friendship.id,
-                    'sender_id': sender.id,
-                    'sender_username': sender.username
-                })
+        for friendship in sent:
+            friend = users.load(friendship.friend_id)
+            sent_requests.append({
+                'id': friendship.id,
+                'friend_id': friend.id,
+                'friend_username': friend.username
+            })
+
+        for friendship in received:
+            sender = users.load(friendship.user_id)
+            received_requests.append({
+                'id': friendship.id,
+                'sender_id': sender.id,
+                'sender_username': sender.username
+            })
 
         return jsonify({'sent': sent_requests, 'received': received_requests}), 200
     except Exception as e:
@@ -378,11 +497,12 @@ def search_users():
         if not query:
             return jsonify({'error': 'Query parameter is required'}), 400
 
-        users = User.query.filter(
-            (User.username.ilike(f'%{query}%'))
-        ).all()
+        ranked = get_search_backend().search_users(query)
+        user_ids = [user_id for user_id, _ in ranked]
+        users_by_id = {user.id: user for user in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
 
-        user_list = [user.to_dict() for user in users]
+        # Keep the backend's relevance order, skipping users deleted since indexing
+        user_list = [users_by_id[user_id].to_dict() for user_id in user_ids if user_id in users_by_id]
         return jsonify(user_list), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
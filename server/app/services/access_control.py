@@ -0,0 +1,71 @@
+from flask import g
+from sqlalchemy import and_, or_
+
+from app.models import Book
+from app.services.friend_graph import get_friend_graph
+
+
+def visible_uploader_ids(user_id):
+    """
+    Users whose private books user_id may see: themselves and their accepted
+    friends. Computed at most once per request from the friend graph cache.
+
+    Args:
+        user_id (int): Viewing user
+
+    Returns:
+        frozenset: Uploader ids
+    """
+    user_id = int(user_id)
+    per_request = g.setdefault('visible_uploaders', {})
+    if user_id not in per_request:
+        per_request[user_id] = get_friend_graph().friends(user_id) | {user_id}
+    return per_request[user_id]
+
+
+def can_view(user_id, book):
+    """
+    Whether user_id may see book: it is public, theirs, or a friend's.
+    Until ingestion has validated its file, only the uploader may.
+
+    Args:
+        user_id (int): Viewing user
+        book (Book): Book to check
+
+    Returns:
+        bool: Whether access is allowed
+    """
+    if not book.is_ready:
+        return book.uploaded_by_id == int(user_id)
+    if book.is_public:
+        return True
+    return book.uploaded_by_id in visible_uploader_ids(user_id)
+
+
+def visibility_clause(user_id):
+    """SQL condition on Book matching the books user_id may see"""
+    return and_(
+        or_(Book.is_ready == True, Book.uploaded_by_id == int(user_id)),
+        or_(Book.is_public == True, Book.uploaded_by_id.in_(visible_uploader_ids(user_id))),
+    )
+
+
+def filter_visible(user_id, book_ids):
+    """
+    Keep the books user_id may see, with a single indexed query
+
+    Args:
+        user_id (int): Viewing user
+        book_ids (list): Candidate book ids
+
+    Returns:
+        list: The visible ids, in their original order
+    """
+    book_ids = list(book_ids)
+    if not book_ids:
+        return []
+    visible = {
+        book_id for (book_id,) in
+        Book.query.with_entities(Book.id).filter(Book.id.in_(book_ids), visibility_clause(user_id))
+    }
+    return [book_id for book_id in book_ids if book_id in visible]
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from werkzeug.security import check_password_hash
+
+# bcrypt's accepted cost range
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+_BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashes are already queued; answer with 503"""
+    pass
+
+
+# Worker functions run in the pool's processes, so they only touch bcrypt
+# and werkzeug and must stay importable at module level.
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(password, password_hash):
+    if password_hash.startswith(_BCRYPT_PREFIXES):
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+        except ValueError:
+            return False
+    # Hashes written by werkzeug's generate_password_hash (pbkdf2/scrypt)
+    return check_password_hash(password_hash, password)
+
+
+def bcrypt_rounds(password_hash):
+    """Cost factor of a bcrypt hash, or None for any other format"""
+    if not password_hash or not password_hash.startswith(_BCRYPT_PREFIXES):
+        return None
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def benchmark_rounds(target_ms=250, password='benchmark-password'):
+    """
+    Highest bcrypt cost whose hash takes at most target_ms on this machine
+    (never below MIN_ROUNDS)
+
+    Args:
+        target_ms (int): Time budget for one hash, in milliseconds
+        password (str): Password to time
+
+    Returns:
+        int: Recommended cost factor
+    """
+    rounds = MIN_ROUNDS
+    while rounds < MAX_ROUNDS:
+        started = time.perf_counter()
+        _hash(password, rounds + 1)
+        if (time.perf_counter() - started) * 1000 > target_ms:
+            break
+        rounds += 1
+    return rounds
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords on a bounded pool of worker processes, so
+    a burst of logins saturates at most `workers` cores while request
+    threads for other endpoints keep running.
+
+    At most max_pending operations are queued or running; beyond that
+    HasherBusy is raised immediately rather than letting requests pile up.
+    With workers=0 hashing runs inline in the calling thread.
+    """
+
+    def __init__(self, rounds, workers, max_pending, timeout):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('Too many password operations in progress')
+        try:
+            return self._get_executor().submit(fn, *args).result(timeout=self.timeout)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Hash password with bcrypt at the configured cost"""
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        """Check password against a bcrypt or werkzeug hash"""
+        if not password_hash:
+            return False
+        return self._run(_verify, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        """Whether a hash uses another algorithm or cost than the configured one"""
+        return bcrypt_rounds(password_hash) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def get_password_hasher():
+    """Get the password hasher for the current app"""
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        config = current_app.config
+        rounds = config.get('PASSWORD_HASH_ROUNDS', 12)
+        if rounds == 'auto':
+            rounds = benchmark_rounds(config.get('PASSWORD_HASH_TARGET_MS', 250))
+            current_app.logger.info(f"Benchmarked bcrypt cost factor: {rounds}")
+        workers = config.get('PASSWORD_HASH_WORKERS')
+        if workers is None:
+            workers = 0 if config.get('TESTING') else min(os.cpu_count() or 1, 4)
+        hasher = current_app.extensions.setdefault('password_hasher', PasswordHasher(
+            rounds=min(max(int(rounds), MIN_ROUNDS), MAX_ROUNDS),
+            workers=workers,
+            max_pending=config.get('PASSWORD_HASH_MAX_PENDING', 64),
+            timeout=config.get('PASSWORD_HASH_TIMEOUT', 10),
+        ))
+    return hasher
+
+
+def hash_password(password):
+    return get_password_hasher().hash(password)
+
+
+def verify_password(password, password_hash):
+    return get_password_hasher().verify(password, password_hash)
+
+
+def password_needs_rehash(password_hash):
+    return get_password_hasher().needs_rehash(password_hash)
+
+
+passwords_cli = AppGroup('passwords', help='Password hashing utilities')
+
+
+@passwords_cli.command('benchmark')
+@click.option('--target-ms', type=int, default=250, show_default=True, help='Time budget for one hash')
+def benchmark_command(target_ms):
+    """Suggest PASSWORD_HASH_ROUNDS for this machine"""
+    rounds = benchmark_rounds(target_ms)
+    click.echo(f'PASSWORD_HASH_ROUNDS={rounds}  # about {target_ms} ms per hash or less')
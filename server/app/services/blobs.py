@@ -0,0 +1,170 @@
+import hashlib
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Blob
+from app.models.blob import derived_key, new_blob_key
+from app.services.storage import StorageError, get_storage
+
+# Read size when hashing an upload before storing it
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_stream(stream):
+    """
+    SHA-256 and size of a seekable stream, which is rewound afterwards
+
+    Returns:
+        tuple: (hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+def find_blob(sha256):
+    return Blob.query.filter_by(sha256=sha256).first()
+
+
+def acquire_blob(sha256, size, content_type, key):
+    """
+    Add a reference to the blob with this content, creating its row if it
+    is new. Runs in the caller's transaction, so a rollback undoes it.
+    When the row already exists, the object the caller stored at key is
+    not needed and is theirs to delete.
+
+    The count is incremented in SQL rather than read and written back, so
+    concurrent uploads of the same file cannot lose references.
+
+    Args:
+        sha256 (str): Hex SHA-256 of the content
+        size (int): Size in bytes
+        content_type (str): Content-Type the object was stored with
+        key (str): Storage key of a new blob (from new_blob_key)
+
+    Returns:
+        tuple: (Blob, whether its row was created by this call)
+    """
+    for _ in range(2):
+        updated = Blob.query.filter_by(sha256=sha256).update(
+            {Blob.ref_count: Blob.ref_count + 1}, synchronize_session=False
+        )
+        if updated:
+            blob = find_blob(sha256)
+            db.session.refresh(blob)
+            return blob, False
+        try:
+            with db.session.begin_nested():
+                blob = Blob(sha256=sha256, size=size, content_type=content_type, key=key, ref_count=1)
+                db.session.add(blob)
+            return blob, True
+        except IntegrityError:
+            # Another upload of the same content inserted it first
+            continue
+    raise RuntimeError(f'Could not reference blob {sha256}')
+
+
+def store_blob(stream, content_type):
+    """
+    Store an uploaded file by content and take a reference to it. The bytes
+    are only written when no book already has the same content, so a
+    duplicate costs one local hashing pass instead of an upload.
+
+    Args:
+        stream: Seekable binary stream (werkzeug spools uploads to disk)
+        content_type (str): Content-Type to store a new object with
+
+    Returns:
+        Blob: The referenced blob; blob.key is its storage key
+    """
+    sha256, size = hash_stream(stream)
+    storage = get_storage()
+    key = new_blob_key()
+    uploaded = False
+    if find_blob(sha256) is None:
+        storage.save(stream, key, content_type)
+        uploaded = True
+    blob, created = acquire_blob(sha256, size, content_type, key)
+    if created and not uploaded:
+        # The last reference went away between the lookup and the insert
+        stream.seek(0)
+        storage.save(stream, key, content_type)
+    elif uploaded and not created:
+        # A concurrent upload of the same content stored it first
+        discard_object(key)
+    return blob
+
+
+def discard_object(key):
+    """Delete an object no blob refers to; failures are logged only"""
+    try:
+        get_storage().delete(key)
+    except StorageError as e:
+        current_app.logger.error(f"Error deleting unused object {key}: {str(e)}")
+
+
+def abandon_blob(sha256, key):
+    """
+    Undo store_blob after the caller's transaction was rolled back: its
+    object is deleted unless a committed blob row still refers to it.
+
+    Args:
+        sha256 (str): blob.sha256, read before rolling back
+        key (str): blob.key, read before rolling back
+    """
+    blob = find_blob(sha256)
+    if blob is None or blob.key != key:
+        discard_object(key)
+
+
+def release_blobs(blob_ids):
+    """
+    Drop one reference per id (ids may repeat) and delete the rows of blobs
+    nobody references any more, in the caller's transaction. Pass the
+    result to purge_blobs after committing.
+
+    Args:
+        blob_ids (iterable): Blob ids of the books being deleted or replaced
+
+    Returns:
+        list: (sha256, key) of the blobs whose objects may now be deleted
+    """
+    counts = Counter(blob_id for blob_id in blob_ids if blob_id is not None)
+    if not counts:
+        return []
+    by_count = {}
+    for blob_id, count in counts.items():
+        by_count.setdefault(count, []).append(blob_id)
+    for count, ids in by_count.items():
+        Blob.query.filter(Blob.id.in_(ids)).update(
+            {Blob.ref_count: Blob.ref_count - count}, synchronize_session=False
+        )
+    orphans = Blob.query.filter(Blob.id.in_(list(counts)), Blob.ref_count <= 0)
+    released = [tuple(row) for row in orphans.with_entities(Blob.sha256, Blob.key)]
+    orphans.delete(synchronize_session=False)
+    return released
+
+
+def purge_blobs(released):
+    """
+    Delete the stored objects of released blobs, and what ingestion derived
+    from them unless a new upload of the same content has claimed it again
+    since (a new blob gets its own key, so the old object always goes).
+    Failures are logged only: an orphaned object wastes space but breaks
+    nothing.
+    """
+    storage = get_storage()
+    for sha256, key in released:
+        try:
+            storage.delete(key)
+            if find_blob(sha256) is None:
+                storage.delete(derived_key(sha256))
+        except StorageError as e:
+            current_app.logger.error(f"Error deleting unreferenced blob {sha256}: {str(e)}")
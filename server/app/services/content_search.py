@@ -0,0 +1,200 @@
+import math
+import re
+from collections import Counter
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import Book, BookPage, PagePosting
+from app.services.search import tokenize
+
+# Longer tokens are almost always noise (URLs, hashes) and are not indexed
+MAX_TERM_LENGTH = 64
+
+# Characters of context shown on each side of the first match in a snippet
+SNIPPET_RADIUS = 80
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _terms(text):
+    return [token for token in tokenize(text) if len(token) <= MAX_TERM_LENGTH]
+
+
+def remove_book_content(book_id):
+    """Delete the indexed pages of a book. The caller commits."""
+    PagePosting.query.filter_by(book_id=book_id).delete(synchronize_session=False)
+    BookPage.query.filter_by(book_id=book_id).delete(synchronize_session=False)
+
+
+def index_book_content(book_id, pages):
+    """
+    Replace the indexed pages of a single book. Other books' postings are
+    untouched, so re-indexing one book never rebuilds the whole index.
+    The caller commits.
+
+    Args:
+        book_id (int): Book the pages belong to
+        pages (list): Page texts; page n is at index n - 1
+
+    Returns:
+        int: Number of pages indexed
+    """
+    remove_book_content(book_id)
+
+    page_rows = []
+    posting_rows = []
+    for page_number, text in enumerate(pages, start=1):
+        terms = _terms(text)
+        if not terms:
+            continue
+        page_rows.append({
+            'book_id': book_id,
+            'page_number': page_number,
+            'content': text,
+            'token_count': len(terms),
+        })
+        posting_rows.extend(
+            {'term': term, 'book_id': book_id, 'page_number': page_number, 'term_frequency': count}
+            for term, count in Counter(terms).items()
+        )
+
+    if page_rows:
+        db.session.execute(sa.insert(BookPage), page_rows)
+        db.session.execute(sa.insert(PagePosting), posting_rows)
+    return len(page_rows)
+
+
+def _prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _snippet(content, pattern):
+    match = pattern.search(content)
+    if not match:
+        return content[:2 * SNIPPET_RADIUS].replace('\n', ' ')
+    start = max(match.start() - SNIPPET_RADIUS, 0)
+    end = min(match.end() + SNIPPET_RADIUS, len(content))
+    snippet = content[start:end].replace('\n', ' ')
+    return f"{'...' if start else ''}{snippet}{'...' if end < len(content) else ''}"
+
+
+def _term_pages(term_matches, filters=()):
+    """
+    Subquery of (term_index, book_id, page_number, frequency): how often
+    each query term occurs on each page, summed over every token a prefix
+    term matches. Only pages of books passing filters are included.
+    """
+    branches = []
+    for index, match in enumerate(term_matches):
+        branch = sa.select(
+            sa.literal(index).label('term_index'),
+            PagePosting.book_id, PagePosting.page_number, PagePosting.term_frequency
+        ).where(match)
+        if filters:
+            branch = branch.join(Book, Book.id == PagePosting.book_id).where(*filters)
+        branches.append(branch)
+    matches = sa.union_all(*branches).subquery()
+    return (
+        sa.select(matches.c.term_index, matches.c.book_id, matches.c.page_number,
+                  sa.func.sum(matches.c.term_frequency).label('frequency'))
+        .group_by(matches.c.term_index, matches.c.book_id, matches.c.page_number)
+        .subquery()
+    )
+
+
+def search_pages(query, filters=(), limit=10, offset=0):
+    """
+    Find book pages containing every term of the query, ranked with BM25.
+    The last term matches as a prefix so partially typed words still hit.
+
+    Matching, the every-term check, scoring and paging all run in the
+    database; only the returned page of hits is loaded.
+
+    Args:
+        query (str): Free-text query
+        filters (tuple): SQLAlchemy conditions on Book, e.g. visibility rules
+        limit (int): Maximum number of hits to return
+        offset (int): Number of ranked hits to skip
+
+    Returns:
+        tuple: (hits, total) where hits is a list of dicts with book_id,
+            page_number, score and snippet
+    """
+    terms = list(dict.fromkeys(_terms(query)))
+    if not terms:
+        return [], 0
+    exact_terms, prefix_term = terms[:-1], terms[-1]
+    term_matches = [PagePosting.term == term for term in exact_terms]
+    term_matches.append(
+        sa.and_(PagePosting.term >= prefix_term, PagePosting.term < _prefix_upper_bound(prefix_term))
+    )
+
+    # Corpus statistics for idf and length normalisation
+    page_count, average_length = db.session.query(
+        sa.func.count(BookPage.id), sa.func.avg(BookPage.token_count)
+    ).one()
+    if not page_count:
+        return [], 0
+    corpus = _term_pages(term_matches)
+    document_frequency = dict(db.session.execute(
+        sa.select(corpus.c.term_index, sa.func.count()).group_by(corpus.c.term_index)
+    ).all())
+    if len(document_frequency) < len(terms):
+        return [], 0
+
+    # One row per visible page that has every term
+    visible = _term_pages(term_matches, filters)
+    frequency = visible.c.frequency
+    length_norm = (1 - BM25_B) + (BM25_B / float(average_length)) * BookPage.token_count
+    idf = sa.case(
+        {
+            index: math.log(1 + (page_count - df + 0.5) / (df + 0.5))
+            for index, df in document_frequency.items()
+        },
+        value=visible.c.term_index
+    )
+    score = sa.func.sum(idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm))
+    ranked = (
+        sa.select(visible.c.book_id, visible.c.page_number, score.label('score'))
+        .select_from(visible)
+        .join(BookPage, sa.and_(BookPage.book_id == visible.c.book_id,
+                                BookPage.page_number == visible.c.page_number))
+        .group_by(visible.c.book_id, visible.c.page_number)
+        .having(sa.func.count() == len(terms))
+    )
+
+    total = db.session.execute(sa.select(sa.func.count()).select_from(ranked.subquery())).scalar()
+    page_hits = [
+        ((row.book_id, row.page_number), float(row.score))
+        for row in db.session.execute(
+            ranked.order_by(sa.desc('score'), visible.c.book_id, visible.c.page_number)
+            .limit(limit).offset(offset)
+        )
+    ]
+    if not page_hits:
+        return [], total
+
+    contents = {
+        (page.book_id, page.page_number): page.content
+        for page in BookPage.query.filter(
+            sa.tuple_(BookPage.book_id, BookPage.page_number).in_([page for page, _ in page_hits])
+        )
+    }
+    pattern = re.compile(
+        r'\b(?:' + '|'.join([*(re.escape(term) for term in exact_terms), re.escape(prefix_term) + r'\w*']) + r')',
+        re.IGNORECASE
+    )
+    hits = [
+        {
+            'book_id': book_id,
+            'page_number': page_number,
+            'score': round(score, 4),
+            'snippet': _snippet(contents.get((book_id, page_number), ''), pattern),
+        }
+        for (book_id, page_number), score in page_hits
+    ]
+    return hits, total
@@ -0,0 +1,198 @@
+import base64
+import binascii
+import hashlib
+import re
+import uuid
+
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models import Book, FileMetadata
+from app.models.blob import new_blob_key
+from app.services.blobs import acquire_blob, discard_object
+from app.services.storage import get_storage
+
+# File types accepted for direct uploads and the Content-Type each must be
+# stored with (FileMetadata.file_type is limited to these)
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'txt': 'text/plain',
+    'html': 'text/html',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+_TOKEN_SALT = 'direct-upload'
+
+
+class UploadError(ValueError):
+    """An upload intent or finalize request that cannot be honoured"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=_TOKEN_SALT)
+
+
+def create_upload_intent(user_id, filename, size, sha256, book):
+    """
+    Presign a PUT the client uploads the new book's file to directly, so
+    the bytes never pass through a Flask worker.
+
+    The file is always uploaded, even when the same content is already
+    stored: a declared SHA-256 proves nothing about having the bytes, so
+    content is only shared (see app.services.blobs) once finalize_upload
+    has checked what arrived. The PUT targets a fresh key, and its
+    signature covers Content-Type, Content-Length and the SHA-256
+    checksum, so the storage backend itself rejects a body that does not
+    match what was declared here.
+
+    Args:
+        user_id (int): Uploading user
+        filename (str): Original file name; its extension picks the type
+        size (int): Exact size in bytes
+        sha256 (str): Hex SHA-256 of the file
+        book (dict): title, author, genre and is_public for the new Book
+
+    Returns:
+        dict: upload_token, expires_in, method, url and headers
+
+    Raises:
+        UploadError: If the declared file is not acceptable
+    """
+    config = current_app.config
+    filename = secure_filename(filename or '')
+    file_type = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if file_type not in CONTENT_TYPES:
+        raise UploadError(f"File type not allowed. Allowed types: {', '.join(CONTENT_TYPES)}")
+    max_size = config.get('DIRECT_UPLOAD_MAX_SIZE', 100 * 1024 * 1024)
+    if not isinstance(size, int) or isinstance(size, bool) or not 0 < size <= max_size:
+        raise UploadError(f'size must be between 1 and {max_size} bytes')
+    sha256 = (sha256 or '').lower()
+    if not SHA256_PATTERN.match(sha256):
+        raise UploadError('sha256 must be the hex SHA-256 digest of the file')
+    if not book.get('title') or not book.get('author'):
+        raise UploadError('Missing required fields: title and author')
+
+    content_type = CONTENT_TYPES[file_type]
+    expires_in = config.get('DIRECT_UPLOAD_EXPIRES', 900)
+
+    key = new_blob_key()
+    token = _serializer().dumps({
+        'upload_id': uuid.uuid4().hex,
+        'key': key,
+        'user_id': user_id,
+        'filename': filename,
+        'file_type': file_type,
+        'size': size,
+        'sha256': sha256,
+        'book': {
+            'title': book['title'],
+            'author': book['author'],
+            'genre': book.get('genre') or 'Unknown',
+            'is_public': bool(book.get('is_public', True)),
+        },
+    })
+    checksum = base64.b64encode(binascii.unhexlify(sha256)).decode('ascii')
+    upload = get_storage().presign_upload(key, content_type, size, checksum, expires_in)
+    return {'upload_token': token, 'expires_in': expires_in, **upload}
+
+
+def _stored_sha256(storage, key, info):
+    """Hex SHA-256 of a stored object, from the backend's checksum when it kept one"""
+    if info.sha256:
+        return info.sha256
+    # Backends without checksum support: hash the object a chunk at a time
+    digest = hashlib.sha256()
+    with storage.open(key) as stored:
+        for chunk in iter(lambda: stored.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def finalize_upload(user_id, token):
+    """
+    Check that the object promised by an upload intent arrived intact and
+    create its Book and FileMetadata rows. When the same content is
+    already stored for another book, the book shares that blob and the
+    new copy is deleted. Finalizing the same token again returns the book
+    created the first time.
+
+    Args:
+        user_id (int): User finalizing; must be the one who got the intent
+        token (str): upload_token from create_upload_intent
+
+    Returns:
+        tuple: (Book, whether it was created by this call)
+
+    Raises:
+        UploadError: If the token is invalid or the object does not match
+    """
+    config = current_app.config
+    try:
+        # Allow for an upload that starts just before the URL expires
+        intent = _serializer().loads(token, max_age=2 * config.get('DIRECT_UPLOAD_EXPIRES', 900))
+    except SignatureExpired:
+        raise UploadError('Upload token has expired', 410)
+    except BadSignature:
+        raise UploadError('Invalid upload token')
+    if intent['user_id'] != user_id:
+        raise UploadError('This upload belongs to another user', 403)
+
+    existing = FileMetadata.query.filter_by(upload_id=intent['upload_id']).first()
+    if existing:
+        return existing.book, False
+
+    storage = get_storage()
+    key = intent['key']
+    content_type = CONTENT_TYPES[intent['file_type']]
+    info = storage.stat(key)
+    if info is None:
+        raise UploadError('File has not been uploaded yet', 409)
+
+    problems = []
+    if info.size != intent['size']:
+        problems.append('size')
+    if info.content_type is not None and info.content_type != content_type:
+        problems.append('content type')
+    if not problems and _stored_sha256(storage, key, info) != intent['sha256']:
+        problems.append('checksum')
+    if problems:
+        storage.delete(key)
+        raise UploadError(f"Uploaded file does not match the declared {', '.join(problems)}", 422)
+
+    blob, created = acquire_blob(intent['sha256'], intent['size'], content_type, key)
+
+    details = intent['book']
+    book = Book(
+        title=details['title'],
+        author=details['author'],
+        genre=details['genre'],
+        is_public=details['is_public'],
+        uploaded_by_id=user_id,
+        s3_url=storage.url(blob.key),
+        blob_id=blob.id,
+        file_size=intent['size'],
+        file_type=intent['file_type'],
+        is_ready=False
+    )
+    db.session.add(book)
+    db.session.flush()
+    db.session.add(FileMetadata(
+        file_name=intent['filename'],
+        file_type=intent['file_type'],
+        size=intent['size'],
+        sha256=intent['sha256'],
+        upload_id=intent['upload_id'],
+        book_id=book.id
+    ))
+    db.session.commit()
+    if not created:
+        discard_object(key)
+    return book, True
@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.models import Book, FeedEntry, Note, User
+from app.services.friend_graph import get_friend_graph
+from app.services.tasks import run_async
+
+# Longest note excerpt copied into a feed entry
+NOTE_EXCERPT_LENGTH = 200
+
+
+def _delivered(kind, book_id, note_id, owner_ids):
+    """Owners whose feeds already have this activity"""
+    if not owner_ids:
+        return set()
+    return {
+        owner_id for (owner_id,) in FeedEntry.query.with_entities(FeedEntry.owner_id).filter(
+            FeedEntry.book_id == book_id,
+            FeedEntry.kind == kind,
+            FeedEntry.note_id == note_id,
+            FeedEntry.owner_id.in_(owner_ids),
+        )
+    }
+
+
+def _fan_out(actor_id, kind, book_id, note_id, payload, created_at):
+    """
+    Copy one activity into the feeds of the actor's friends who may see it.
+    Feeds that already have it are skipped, so delivering an activity again
+    (see `flask feed backfill`) is harmless.
+    """
+    graph = get_friend_graph()
+    recipients = graph.friends(actor_id)
+    book = Book.query.with_entities(Book.is_public, Book.uploaded_by_id).filter(Book.id == book_id).first()
+    if book is None:
+        return 0
+    if not book.is_public:
+        # Only the uploader and their friends may see a private book
+        recipients &= graph.friends(book.uploaded_by_id) | {book.uploaded_by_id}
+    recipients = recipients - {actor_id}
+    recipients = sorted(recipients - _delivered(kind, book_id, note_id, recipients))
+    if not recipients:
+        return 0
+
+    actor = User.query.with_entities(User.username).filter(User.id == actor_id).first()
+    payload = {**payload, 'actor_username': actor.username if actor else None}
+    db.session.execute(sa.insert(FeedEntry), [
+        {
+            'owner_id': owner_id,
+            'actor_id': actor_id,
+            'kind': kind,
+            'book_id': book_id,
+            'note_id': note_id,
+            'payload': payload,
+            'created_at': created_at,
+        }
+        for owner_id in recipients
+    ])
+    trim_feeds(recipients)
+    db.session.commit()
+    return len(recipients)
+
+
+def trim_feeds(owner_ids, max_length=None):
+    """
+    Drop all but the newest max_length entries of each owner's feed with a
+    single statement
+    """
+    max_length = max_length or current_app.config.get('FEED_MAX_LENGTH', 500)
+    ranked = (
+        sa.select(
+            FeedEntry.id,
+            sa.func.row_number().over(partition_by=FeedEntry.owner_id, order_by=FeedEntry.id.desc()).label('position')
+        )
+        .where(FeedEntry.owner_id.in_(owner_ids))
+        .subquery()
+    )
+    db.session.execute(
+        sa.delete(FeedEntry)
+        .where(FeedEntry.id.in_(sa.select(ranked.c.id).where(ranked.c.position > max_length)))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _book_activity(book):
+    """_fan_out arguments, without created_at, announcing a book"""
+    return book.uploaded_by_id, 'book_uploaded', book.id, None, {
+        'title': book.title,
+        'author': book.author,
+        'genre': book.genre,
+    }
+
+
+def _note_activity(note, book):
+    """_fan_out arguments, without created_at, announcing a note"""
+    return note.user_id, 'note_created', book.id, note.id, {
+        'title': book.title,
+        'author': book.author,
+        'page_number': note.page_number,
+        'excerpt': note.content[:NOTE_EXCERPT_LENGTH],
+    }
+
+
+def publish_book(book):
+    """
+    Announce a newly uploaded book to the uploader's friends, in the
+    background. A fan-out lost to a crash or restart is delivered by
+    `flask feed backfill`.
+    """
+    if book.uploaded_by_id is None:
+        return
+    run_async(_fan_out, *_book_activity(book), datetime.utcnow())
+
+
+def publish_note(note, book):
+    """Announce a new note to its author's friends, in the background"""
+    run_async(_fan_out, *_note_activity(note, book), datetime.utcnow())
+
+
+def backfill_feeds(since):
+    """
+    Deliver again every book listed and note written since a given time,
+    to the feeds that do not have it yet. Books and notes are the source of
+    truth, so this recovers fan-outs that were lost with the process
+    running them.
+
+    Args:
+        since (datetime): Oldest activity to deliver
+
+    Returns:
+        int: Number of feed entries written
+    """
+    written = 0
+    books = Book.query.filter(
+        Book.created_at >= since, Book.is_ready == True, Book.uploaded_by_id.isnot(None)
+    ).order_by(Book.id).all()
+    for book in books:
+        written += _fan_out(*_book_activity(book), book.created_at)
+    notes = Note.query.filter(Note.created_at >= since).order_by(Note.id).all()
+    for note in notes:
+        written += _fan_out(*_note_activity(note, note.book), note.created_at)
+    return written
+
+
+def retract_book(book_id):
+    """Remove feed entries about a book; call before committing its deletion"""
+    FeedEntry.query.filter(FeedEntry.book_id == book_id).delete(synchronize_session=False)
+
+
+def retract_note(note_id):
+    """Remove feed entries about a note; call before committing its deletion"""
+    FeedEntry.query.filter(FeedEntry.note_id == note_id).delete(synchronize_session=False)
+
+
+def feed_page(user_id, before_id=None, limit=20):
+    """
+    A page of user_id's feed, newest first, read with one range scan of the
+    (owner_id, id) index.
+
+    Entries written while an actor was still a friend are skipped once the
+    friendship is gone, using the cached friend graph rather than a join.
+
+    Args:
+        user_id (int): Feed owner
+        before_id (int): Only return entries older than this id
+        limit (int): Maximum entries to scan
+
+    Returns:
+        tuple: (visible entries, id of the last entry scanned or None,
+        whether older entries remain)
+    """
+    user_id = int(user_id)
+    query = FeedEntry.query.filter(FeedEntry.owner_id == user_id)
+    if before_id is not None:
+        query = query.filter(FeedEntry.id < before_id)
+    # Fetch one extra row to learn whether another page follows
+    rows = query.order_by(FeedEntry.id.desc()).limit(limit + 1).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    friends = get_friend_graph().friends(user_id)
+    entries = [entry for entry in rows if entry.actor_id in friends]
+    return entries, rows[-1].id if rows else None, has_next
+
+
+feed_cli = AppGroup('feed', help='Friends activity feeds')
+
+
+@feed_cli.command('backfill')
+@click.option('--hours', type=int, default=24, show_default=True,
+              help='Deliver books and notes created this far back')
+def backfill_command(hours):
+    """Deliver book and note activity whose background fan-out was lost"""
+    written = backfill_feeds(datetime.utcnow() - timedelta(hours=hours))
+    click.echo(f'Wrote {written} feed entries')
@@ -0,0 +1,228 @@
+import posixpath
+import re
+import zipfile
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF text extraction is optional
+    PdfReader = None
+
+# Approximate characters per page for formats without real page breaks
+PAGE_SIZE_CHARS = 3000
+
+WHITESPACE_PATTERN = re.compile(r'[ \t\r\f\v]+')
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the visible text of an HTML/XHTML document"""
+
+    BLOCK_TAGS = {'p', 'div', 'br', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'tr', 'section'}
+    SKIP_TAGS = {'script', 'style', 'head'}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skipping:
+            self._skipping -= 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def html_to_text(markup):
+    parser = _TextExtractor()
+    parser.feed(markup)
+    parser.close()
+    return ''.join(parser.parts)
+
+
+def _normalize(text):
+    lines = (WHITESPACE_PATTERN.sub(' ', line).strip() for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def paginate_text(text, page_size=PAGE_SIZE_CHARS):
+    """
+    Split running text into pages of roughly page_size characters,
+    breaking on line boundaries where possible
+
+    Args:
+        text (str): Text to split
+        page_size (int): Target page length in characters
+
+    Returns:
+        list: Page strings
+    """
+    pages = []
+    current = []
+    length = 0
+    for line in _normalize(text).split('\n'):
+        while len(line) > page_size:
+            if current:
+                pages.append('\n'.join(current))
+                current, length = [], 0
+            cut = line.rfind(' ', 0, page_size)
+            cut = cut if cut > 0 else page_size
+            pages.append(line[:cut])
+            line = line[cut:].lstrip()
+        if length + len(line) > page_size and current:
+            pages.append('\n'.join(current))
+            current, length = [], 0
+        if line:
+            current.append(line)
+            length += len(line) + 1
+    if current:
+        pages.append('\n'.join(current))
+    return pages
+
+
+def _decode(data):
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def _extract_txt(file):
+    text = _decode(file.read())
+    # Honour explicit form feeds as page breaks when the file has them
+    if '\f' in text:
+        return [_normalize(chunk) for chunk in text.split('\f')]
+    return paginate_text(text)
+
+
+def _extract_html(file):
+    return paginate_text(html_to_text(_decode(file.read())))
+
+
+def _extract_pdf(file):
+    if PdfReader is None:
+        raise RuntimeError('pypdf is not installed; cannot extract PDF text')
+    reader = PdfReader(file)
+    return [_normalize(page.extract_text() or '') for page in reader.pages]
+
+
+def _extract_epub(file):
+    with zipfile.ZipFile(file) as archive:
+        container = ElementTree.fromstring(archive.read('META-INF/container.xml'))
+        rootfile = container.find('.//{*}rootfile').get('full-path')
+        package = ElementTree.fromstring(archive.read(rootfile))
+        base = posixpath.dirname(rootfile)
+
+        manifest = {item.get('id'): item.get('href') for item in package.find('{*}manifest')}
+        pages = []
+        # Read chapters in reading (spine) order
+        for itemref in package.find('{*}spine'):
+            href = manifest.get(itemref.get('idref'))
+            if not href:
+                continue
+            chapter = archive.read(posixpath.normpath(posixpath.join(base, href)))
+            pages.extend(paginate_text(html_to_text(_decode(chapter))))
+        return pages
+
+
+def _extract_docx(file):
+    with zipfile.ZipFile(file) as archive:
+        document = ElementTree.fromstring(archive.read('word/document.xml'))
+    paragraphs = [
+        ''.join(node.text or '' for node in paragraph.findall('.//{*}t'))
+        for paragraph in document.findall('.//{*}p')
+    ]
+    return paginate_text('\n'.join(paragraphs))
+
+
+EXTRACTORS = {
+    'txt': _extract_txt,
+    'html': _extract_html,
+    'pdf': _extract_pdf,
+    'epub': _extract_epub,
+    'docx': _extract_docx,
+}
+
+
+def extract_pages(file, file_type):
+    """
+    Extract the text of an uploaded book, one string per page
+
+    Args:
+        file: Seekable binary file-like object positioned at the start of
+            the book; PDF, EPUB and DOCX are read from it in place rather
+            than copied into memory
+        file_type (str): File extension, e.g. 'pdf' or 'epub'
+
+    Returns:
+        list: Page texts in reading order; page n is at index n - 1
+
+    Raises:
+        ValueError: If the file type has no extractor
+    """
+    extractor = EXTRACTORS.get(file_type.lower().lstrip('.'))
+    if extractor is None:
+        raise ValueError(f'Text extraction is not supported for {file_type} files')
+    return extractor(file)
+
+
+def _clean_metadata(values):
+    return {key: value.strip() for key, value in values.items() if isinstance(value, str) and value.strip()}
+
+
+def _metadata_pdf(file):
+    if PdfReader is None:
+        return {}
+    info = PdfReader(file).metadata or {}
+    return _clean_metadata({'title': info.get('/Title'), 'author': info.get('/Author')})
+
+
+def _metadata_epub(file):
+    with zipfile.ZipFile(file) as archive:
+        container = ElementTree.fromstring(archive.read('META-INF/container.xml'))
+        package = ElementTree.fromstring(archive.read(container.find('.//{*}rootfile').get('full-path')))
+    return _clean_metadata({
+        'title': package.findtext('.//{*}metadata/{*}title'),
+        'author': package.findtext('.//{*}metadata/{*}creator'),
+        'language': package.findtext('.//{*}metadata/{*}language'),
+    })
+
+
+def _metadata_docx(file):
+    with zipfile.ZipFile(file) as archive:
+        if 'docProps/core.xml' not in archive.namelist():
+            return {}
+        core = ElementTree.fromstring(archive.read('docProps/core.xml'))
+    return _clean_metadata({'title': core.findtext('{*}title'), 'author': core.findtext('{*}creator')})
+
+
+METADATA_EXTRACTORS = {
+    'pdf': _metadata_pdf,
+    'epub': _metadata_epub,
+    'docx': _metadata_docx,
+}
+
+
+def extract_metadata(file, file_type):
+    """
+    Read the title, author and similar fields embedded in a book file
+
+    Args:
+        file: Seekable binary file-like object positioned at the start
+        file_type (str): File extension, e.g. 'pdf' or 'epub'
+
+    Returns:
+        dict: The fields the file declares; empty for formats without any
+    """
+    extractor = METADATA_EXTRACTORS.get(file_type.lower().lstrip('.'))
+    return extractor(file) if extractor else {}
@@ -0,0 +1,152 @@
+from itertools import chain
+from types import MappingProxyType
+
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event, inspect, select, union_all
+
+from app import db
+from app.models import Friendship
+from app.services.cache import TTLCache
+from app.services.recommendations import schedule_refresh
+from app.services.search_cache import get_search_cache
+
+_EMPTY = MappingProxyType({})
+
+
+class FriendGraph:
+    """
+    In-process adjacency cache of the friendship graph.
+
+    Each user's neighbours are loaded lazily, with one query, into a
+    read-only mapping of friend_id -> status covering both directions of
+    every friendship. Lookups are then O(1) dictionary probes. Entries are
+    dropped whenever a Friendship row touching the user is committed (see
+    the session listeners below), and otherwise expire after a TTL so other
+    processes' writes are picked up eventually.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self._adjacency = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def neighbors(self, user_id):
+        """
+        Get everyone user_id has a friendship with
+
+        Args:
+            user_id (int): User to look up
+
+        Returns:
+            Mapping: friend_id -> status ('pending', 'accepted' or 'blocked')
+        """
+        return self.neighbors_many([user_id])[int(user_id)]
+
+    def neighbors_many(self, user_ids):
+        """Get the neighbours of several users, loading every cache miss with one query"""
+        user_ids = {int(user_id) for user_id in user_ids}
+        found = {}
+        for user_id in user_ids:
+            adjacency = self._adjacency.get(user_id)
+            if adjacency is not None:
+                found[user_id] = adjacency
+        missing = user_ids - found.keys()
+        if missing:
+            loaded = {user_id: {} for user_id in missing}
+            # One range scan per direction over the (user_id, status) and
+            # (friend_id, status) indexes
+            columns = (Friendship.user_id, Friendship.friend_id, Friendship.status)
+            rows = db.session.execute(union_all(
+                select(*columns).where(Friendship.user_id.in_(missing)),
+                select(*columns).where(Friendship.friend_id.in_(missing))
+            ))
+            seen = set()
+            for requester_id, addressee_id, status in rows:
+                # A friendship between two missing users comes back twice
+                if (requester_id, addressee_id) in seen:
+                    continue
+                seen.add((requester_id, addressee_id))
+                if requester_id in loaded:
+                    loaded[requester_id][addressee_id] = status
+                if addressee_id in loaded:
+                    loaded[addressee_id][requester_id] = status
+            for user_id, adjacency in loaded.items():
+                found[user_id] = MappingProxyType(adjacency) if adjacency else _EMPTY
+                self._adjacency.set(user_id, found[user_id])
+        return found
+
+    def status(self, user_id, other_id):
+        """Friendship status between two users in either direction, or None"""
+        return self.neighbors(user_id).get(int(other_id))
+
+    def are_friends(self, user_id, other_id):
+        return self.status(user_id, other_id) == 'accepted'
+
+    def friends(self, user_id):
+        """Ids of user_id's accepted friends"""
+        return frozenset(
+            friend_id for friend_id, status in self.neighbors(user_id).items() if status == 'accepted'
+        )
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            self._adjacency.pop(int(user_id))
+
+
+def get_friend_graph():
+    """Get the friend graph cache for the current app"""
+    graph = current_app.extensions.get('friend_graph')
+    if graph is None:
+        graph = current_app.extensions.setdefault('friend_graph', FriendGraph(
+            maxsize=current_app.config.get('FRIEND_GRAPH_CACHE_SIZE', 10000),
+            ttl=current_app.config.get('FRIEND_GRAPH_CACHE_TTL', 300),
+        ))
+    return graph
+
+
+def friendships_changed(*user_ids):
+    """
+    Invalidate everything derived from the friendships of user_ids: the
+    friend graph, the request's memoized visibility and cached searches,
+    and (in the background) friend recommendations.
+
+    Committed ORM changes to Friendship call this automatically; call it
+    directly after bulk UPDATE/DELETE statements, which bypass the session.
+    """
+    user_ids = {int(user_id) for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    get_friend_graph().invalidate(*user_ids)
+    get_search_cache().bump_scopes(*user_ids)
+    if has_request_context():
+        memo = g.get('visible_uploaders', {})
+        for user_id in user_ids:
+            memo.pop(user_id, None)
+    schedule_refresh(*user_ids)
+
+
+_PENDING_KEY = 'friend_graph_changes'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_friendship_changes(session, flush_context):
+    """Remember which users' friendships a flush touched until the commit"""
+    changed = session.info.setdefault(_PENDING_KEY, set())
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(instance, Friendship):
+            continue
+        changed.update((instance.user_id, instance.friend_id))
+        # A re-pointed friendship also affects its previous members
+        state = inspect(instance)
+        for attribute in ('user_id', 'friend_id'):
+            changed.update(state.attrs[attribute].history.deleted or ())
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_committed_friendships(session):
+    changed = session.info.pop(_PENDING_KEY, None)
+    if changed and has_app_context():
+        friendships_changed(*changed)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_friendship_changes(session):
+    session.info.pop(_PENDING_KEY, None)
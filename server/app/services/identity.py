@@ -0,0 +1,80 @@
+from flask import current_app, g
+
+from app import db
+from app.models import User
+from app.services.cache import TTLCache
+
+
+class Identity:
+    """
+    Lightweight record of an authenticated user: the columns most requests
+    need, without an ORM instance or its session.
+    """
+    __slots__ = ('id', 'username', 'email', 'token_revision')
+
+    def __init__(self, id, username, email, token_revision=0):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.token_revision = token_revision
+
+    def __repr__(self):
+        return f'<Identity {self.id}: {self.username}>'
+
+
+def get_identity_cache():
+    """Get the authenticated-identity cache for the current app"""
+    cache = current_app.extensions.get('identity_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('identity_cache', TTLCache(
+            maxsize=current_app.config.get('AUTH_IDENTITY_CACHE_SIZE', 4096),
+            ttl=current_app.config.get('AUTH_IDENTITY_CACHE_TTL', 30),
+        ))
+    return cache
+
+
+def load_identity(user_id):
+    """
+    Get the identity of user_id, from the cache or with one projected query
+
+    Args:
+        user_id (int): User to look up
+
+    Returns:
+        Identity: The identity, or None if the user does not exist
+    """
+    user_id = int(user_id)
+    cache = get_identity_cache()
+    identity = cache.get(user_id)
+    if identity is None:
+        row = (
+            User.query.with_entities(User.id, User.username, User.email, User.token_revision)
+            .filter(User.id == user_id)
+            .first()
+        )
+        if row is None:
+            return None
+        identity = Identity(row.id, row.username, row.email, row.token_revision or 0)
+        cache.set(user_id, identity)
+    return identity
+
+
+def forget_identity(*user_ids):
+    """Drop cached identities after a profile update or account deletion"""
+    cache = get_identity_cache()
+    for user_id in user_ids:
+        cache.pop(int(user_id))
+
+
+def load_current_user():
+    """
+    Load the full User of the authenticated request, at most once per
+    request. Use g.user (an Identity) when only id, username or email is
+    needed.
+
+    Returns:
+        User: The ORM user, or None if it has been deleted meanwhile
+    """
+    if 'current_user' not in g:
+        g.current_user = db.session.get(User, g.user.id)
+    return g.current_user
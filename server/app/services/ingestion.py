@@ -0,0 +1,305 @@
+import hashlib
+import io
+import json
+import mimetypes
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.models import Book, IngestionJob
+from app.models.blob import derived_key
+from app.services.content_search import index_book_content
+from app.services.feed import publish_book
+from app.services.file_processor import EXTRACTORS, extract_metadata, extract_pages
+from app.services.search_backends import get_search_backend
+from app.services.search_cache import catalog_changed
+from app.services.storage import ObjectNotFound, StorageError, get_storage
+from app.services.tasks import run_async
+
+try:
+    from celery import Celery, Task
+except ImportError:  # Only needed for INGESTION_QUEUE = 'celery'
+    Celery = None
+
+INGEST_TASK = 'ingestion.run_ingestion'
+
+# Leading bytes every valid file of these types starts with
+SIGNATURES = {
+    'pdf': b'%PDF-',
+    'docx': b'PK\x03\x04',
+    'epub': b'PK\x03\x04',
+}
+
+# Read size when validating a stored file
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class IngestionError(Exception):
+    """The stored file cannot be ingested; the job fails with this message"""
+    pass
+
+
+def book_file_type(book):
+    """Extension-style type of a book's file ('pdf', 'txt', ...)"""
+    file_type = (book.file_metadata.file_type if book.file_metadata else None) or book.file_type or ''
+    if '/' in file_type:
+        # Books uploaded by older versions recorded the MIME type
+        file_type = (mimetypes.guess_extension(file_type) or '').lstrip('.')
+    return file_type.lower()
+
+
+def _advance(job, stage, progress):
+    job.stage = stage
+    job.progress = progress
+    db.session.commit()
+
+
+def _validate(file, file_type, expected_size, expected_sha256):
+    """Check a stored file's size, checksum and signature in one pass"""
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), b''):
+        if not size:
+            head = chunk[:16]
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    if not size:
+        raise IngestionError('Stored file is empty')
+    if expected_size is not None and size != int(expected_size):
+        raise IngestionError(f'Stored file is {size} bytes, expected {int(expected_size)}')
+    if expected_sha256 and digest.hexdigest() != expected_sha256:
+        raise IngestionError('Stored file does not match its checksum')
+    signature = SIGNATURES.get(file_type)
+    if signature and not head.startswith(signature):
+        raise IngestionError(f'Stored file is not a valid {file_type} file')
+
+
+def _extract(file, file_type):
+    """Document metadata and page texts; formats without an extractor have neither"""
+    if file_type not in EXTRACTORS:
+        return {}, []
+    try:
+        metadata = extract_metadata(file, file_type)
+        file.seek(0)
+        return metadata, extract_pages(file, file_type)
+    except Exception as e:
+        raise IngestionError(f'Could not read {file_type} file: {str(e)}') from e
+
+
+def _ingest(job):
+    book = db.session.get(Book, job.book_id) if job.book_id else None
+    if book is None:
+        raise IngestionError('Book no longer exists')
+    storage = get_storage()
+    key = storage.key_for_url(book.s3_url)
+    if not key:
+        raise IngestionError('Book has no stored file')
+    file_type = book_file_type(book)
+    sha256 = book.file_metadata.sha256 if book.file_metadata else None
+    expected_size = book.file_metadata.size if book.file_metadata else book.file_size
+    result = {'file_type': file_type}
+
+    # Content ingested before for another book (see app.services.blobs) was
+    # validated then; reuse its extraction instead of fetching and parsing
+    # the original again
+    extracted_key = derived_key(sha256) if sha256 else None
+    extracted = None
+    if extracted_key:
+        try:
+            with storage.open(extracted_key) as derived:
+                extracted = json.load(derived)
+        except ObjectNotFound:
+            pass
+
+    if extracted is not None:
+        metadata, pages = extracted['metadata'], extracted['pages']
+        result['reused_extraction'] = True
+    else:
+        _advance(job, 'validating', 10)
+        try:
+            original = storage.open(key)
+        except ObjectNotFound:
+            raise IngestionError('Stored file is missing')
+        with original:
+            _validate(original, file_type, expected_size, sha256)
+            _advance(job, 'extracting', 35)
+            metadata, pages = _extract(original, file_type)
+
+    result['metadata'] = metadata
+    result['page_count'] = len(pages)
+    result['word_count'] = sum(len(page.split()) for page in pages)
+
+    _advance(job, 'indexing', 65)
+    if pages:
+        index_book_content(book.id, pages)
+
+    if extracted_key and extracted is None and pages:
+        _advance(job, 'artifacts', 90)
+        body = json.dumps({'metadata': metadata, 'pages': pages}).encode('utf-8')
+        try:
+            storage.save(io.BytesIO(body), extracted_key, 'application/json')
+            result['extraction_key'] = extracted_key
+        except StorageError as e:
+            # Only a later duplicate upload loses out; this book is indexed
+            current_app.logger.warning(f"Could not store extraction {extracted_key}: {str(e)}")
+    return result
+
+
+def _update_listing(job, book):
+    """
+    Show a book in search and feeds once its file is valid, or take it out
+    again if a new file is not. Friends hear about a book only the first
+    time one of its files is ingested.
+    """
+    try:
+        if job.status == 'succeeded':
+            get_search_backend().index_book(book)
+            announced = IngestionJob.query.filter(
+                IngestionJob.book_id == book.id,
+                IngestionJob.status == 'succeeded',
+                IngestionJob.id != job.id,
+            ).first()
+            if announced is None:
+                publish_book(book)
+        else:
+            get_search_backend().remove_book(book.id)
+        catalog_changed()
+    except Exception as e:
+        current_app.logger.error(f"Could not update listing of book {book.id}: {str(e)}", exc_info=True)
+
+
+def run_ingestion(job_id):
+    """
+    Worker entry point: validate a book's stored file, extract its metadata
+    and pages, index them for content search and store the extraction for
+    reuse by later uploads of the same content. Progress is committed after
+    every stage so /api/jobs/<id> can report it.
+
+    Books are created hidden (Book.is_ready false). A successful job lists
+    the book; a failed one hides it from everyone but its uploader.
+
+    A job that already succeeded is skipped, so redelivering it is
+    harmless. Failures are recorded on the job rather than raised.
+
+    Args:
+        job_id (int): IngestionJob to run
+    """
+    job = db.session.get(IngestionJob, job_id)
+    if job is None or job.status == 'succeeded':
+        return
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    job.error = None
+    db.session.commit()
+
+    try:
+        job.result = _ingest(job)
+        job.status = 'succeeded'
+        job.progress = 100
+    except IngestionError as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Ingestion job {job_id} failed: {str(e)}", exc_info=True)
+        job.status = 'failed'
+        job.error = 'Processing failed'
+    job.finished_at = datetime.utcnow()
+    book = db.session.get(Book, job.book_id) if job.book_id else None
+    if book is not None:
+        book.is_ready = job.status == 'succeeded'
+    db.session.commit()
+    if book is not None:
+        _update_listing(job, book)
+
+
+def _dispatch(job_id):
+    celery = current_app.extensions.get('celery')
+    if celery is not None:
+        celery.tasks[INGEST_TASK].delay(job_id)
+    else:
+        run_async(run_ingestion, job_id)
+
+
+def enqueue_ingestion(book):
+    """
+    Record an ingestion job for a book's newly stored file and hand it to
+    the workers. The request only pays for an insert; with TASKS_EAGER the
+    job has already run when this returns.
+
+    If the queue cannot be reached the job stays queued, for
+    `flask ingestion requeue` to dispatch later.
+
+    Args:
+        book (Book): Committed book whose file should be ingested
+
+    Returns:
+        IngestionJob: The new job
+    """
+    job = IngestionJob(book_id=book.id, user_id=book.uploaded_by_id, status='queued', progress=0, result={})
+    db.session.add(job)
+    db.session.commit()
+    try:
+        _dispatch(job.id)
+    except Exception as e:
+        current_app.logger.error(f"Could not enqueue ingestion job {job.id}: {str(e)}")
+    db.session.refresh(job)
+    return job
+
+
+def latest_job(book_id):
+    """Most recent ingestion job of a book, or None"""
+    return IngestionJob.query.filter_by(book_id=book_id).order_by(IngestionJob.id.desc()).first()
+
+
+def init_celery(app):
+    """
+    Create the Celery app that carries ingestion jobs to celery_worker.py
+    and register it on app; from then on jobs are sent to the broker
+    instead of the in-process thread pool.
+    """
+    if Celery is None:
+        raise RuntimeError("INGESTION_QUEUE = 'celery' requires the celery package")
+
+    class AppContextTask(Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery = Celery(app.import_name, task_cls=AppContextTask)
+    celery.conf.update(
+        broker_url=app.config.get('CELERY_BROKER_URL') or app.config['REDIS_URL'],
+        task_ignore_result=True,  # progress lives in ingestion_jobs
+        task_acks_late=True,  # a job whose worker dies is redelivered
+        worker_prefetch_multiplier=1,  # jobs are long; don't hoard them
+        task_always_eager=app.config.get('TASKS_EAGER', False),
+    )
+    celery.task(name=INGEST_TASK)(run_ingestion)
+    app.extensions['celery'] = celery
+    return celery
+
+
+ingestion_cli = AppGroup('ingestion', help='Background book ingestion')
+
+
+@ingestion_cli.command('requeue')
+@click.option('--stale-minutes', type=int, default=30, show_default=True,
+              help='Also requeue jobs that have been running longer than this')
+def requeue_command(stale_minutes):
+    """Dispatch jobs left queued (e.g. by a broker outage) or stuck running"""
+    cutoff = datetime.utcnow() - timedelta(minutes=stale_minutes)
+    job_ids = [
+        job_id for (job_id,) in IngestionJob.query.filter(
+            (IngestionJob.status == 'queued')
+            | ((IngestionJob.status == 'running') & (IngestionJob.started_at < cutoff))
+        ).with_entities(IngestionJob.id)
+    ]
+    for job_id in job_ids:
+        _dispatch(job_id)
+    click.echo(f'Requeued {len(job_ids)} ingestion jobs')
@@ -0,0 +1,110 @@
+from flask import g
+from sqlalchemy.orm import selectinload
+
+from app.models import Book, Friendship, User
+
+
+class BatchLoader:
+    """
+    Request-scoped batching loader in the style of DataLoader.
+
+    Keys queued with prime() (or requested with load_many()) are resolved
+    together by a single call to batch_fn the first time any of them is
+    needed, and every result is memoized for the rest of the request. A
+    route that primes the keys of all its rows before formatting them runs
+    one query per loader however many rows it returns.
+    """
+
+    def __init__(self, batch_fn):
+        """
+        Args:
+            batch_fn: Callable taking a list of keys and returning a dict of
+                key -> value; keys missing from the dict load as None
+        """
+        self.batch_fn = batch_fn
+        self._cache = {}
+        self._pending = set()
+
+    def prime(self, keys):
+        """Queue keys for the next batch without loading them yet"""
+        self._pending.update(key for key in keys if key not in self._cache)
+        return self
+
+    def dispatch(self):
+        """Resolve every queued key with one call to batch_fn"""
+        if not self._pending:
+            return
+        keys = list(self._pending)
+        self._pending.clear()
+        values = self.batch_fn(keys)
+        for key in keys:
+            self._cache[key] = values.get(key)
+
+    def load(self, key):
+        """Get the value for key, dispatching the queued batch if needed"""
+        if key not in self._cache:
+            self._pending.add(key)
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        """Get the values for keys, in order, with at most one batch"""
+        keys = list(keys)
+        self.prime(keys).dispatch()
+        return [self._cache[key] for key in keys]
+
+    def clear(self, key=None):
+        """Forget a memoized key, or every key, e.g. after a write"""
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+
+def _load_by_id(model, ids):
+    return {row.id: row for row in model.query.filter(model.id.in_(ids))}
+
+
+# Everything User.to_dict() walks: the four friendship collections and,
+# through the friends property, the users at the other end of each
+_PROFILE_OPTIONS = [
+    selectinload(relationship).selectinload(Friendship.user)
+    for relationship in (User.sent_friendships, User.received_friendships)
+] + [
+    selectinload(relationship).selectinload(Friendship.friend)
+    for relationship in (User.sent_friendships, User.received_friendships)
+] + [
+    selectinload(User.sent_friend_requests),
+    selectinload(User.received_friend_requests),
+]
+
+
+def _load_profiles(ids):
+    """Load users with everything to_dict() needs, in a fixed number of queries"""
+    return {user.id: user for user in User.query.options(*_PROFILE_OPTIONS).filter(User.id.in_(ids))}
+
+
+LOADERS = {
+    'users': lambda ids: _load_by_id(User, ids),
+    'books': lambda ids: _load_by_id(Book, ids),
+    'profiles': _load_profiles,
+}
+
+
+def get_loader(name):
+    """
+    Get the named loader for the current request, creating it on first use.
+    Memoized values live on flask.g and are dropped when the request ends.
+
+    Args:
+        name (str): One of LOADERS, e.g. 'users', or 'profiles' for users
+            that will be serialized with to_dict()
+
+    Returns:
+        BatchLoader: The request's loader
+    """
+    loaders = g.setdefault('loaders', {})
+    if name not in loaders:
+        loaders[name] = BatchLoader(LOADERS[name])
+    return loaders[name]
+
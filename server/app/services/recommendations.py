@@ -0,0 +1,192 @@
+from collections import defaultdict
+from datetime import datetime
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.models import Book, Friendship, FriendRecommendation, User
+from app.services.tasks import run_async
+
+# Users whose recommendations are recomputed per statement batch
+REFRESH_BATCH_SIZE = 500
+
+
+def _accepted_adjacency():
+    """Accepted friendships in both directions, as a (me, friend) subquery"""
+    accepted = Friendship.status == 'accepted'
+    return sa.union_all(
+        sa.select(Friendship.user_id.label('me'), Friendship.friend_id.label('friend')).where(accepted),
+        sa.select(Friendship.friend_id.label('me'), Friendship.user_id.label('friend')).where(accepted),
+    ).subquery()
+
+
+def _mutual_friend_counts(user_ids):
+    """(user, candidate) -> number of accepted friends they share, two hops in one query"""
+    mine, theirs = _accepted_adjacency(), _accepted_adjacency()
+    statement = (
+        sa.select(mine.c.me, theirs.c.friend, sa.func.count())
+        .join(theirs, theirs.c.me == mine.c.friend)
+        .where(mine.c.me.in_(user_ids), theirs.c.friend != mine.c.me)
+        .group_by(mine.c.me, theirs.c.friend)
+    )
+    return {(user_id, candidate_id): count for user_id, candidate_id, count in db.session.execute(statement)}
+
+
+def _shared_upload_counts(user_ids):
+    """
+    (user, candidate) -> number of authors both have uploaded books by.
+    Only the candidate's public books count, so private shelves never
+    surface as a recommendation reason.
+    """
+    mine, theirs = Book.__table__.alias('mine'), Book.__table__.alias('theirs')
+    author = sa.func.lower(mine.c.author)
+    statement = (
+        sa.select(mine.c.uploaded_by_id, theirs.c.uploaded_by_id, sa.func.count(sa.distinct(author)))
+        .select_from(mine.join(theirs, sa.and_(
+            sa.func.lower(theirs.c.author) == author,
+            theirs.c.uploaded_by_id != mine.c.uploaded_by_id,
+        )))
+        .where(mine.c.uploaded_by_id.in_(user_ids), theirs.c.is_public == True)
+        .group_by(mine.c.uploaded_by_id, theirs.c.uploaded_by_id)
+    )
+    return {(user_id, candidate_id): count for user_id, candidate_id, count in db.session.execute(statement)}
+
+
+def _existing_relations(user_ids):
+    """user -> ids they already have any friendship with (pending, accepted or blocked)"""
+    related = defaultdict(set)
+    rows = db.session.execute(sa.union_all(
+        sa.select(Friendship.user_id, Friendship.friend_id).where(Friendship.user_id.in_(user_ids)),
+        sa.select(Friendship.friend_id, Friendship.user_id).where(Friendship.friend_id.in_(user_ids)),
+    ))
+    for user_id, other_id in rows:
+        related[user_id].add(other_id)
+    return related
+
+
+def compute_recommendations(user_ids, limit=None):
+    """
+    Rank friend candidates for a batch of users with a fixed number of
+    queries: friends of friends by mutual-friend count, then by shared
+    uploads, excluding anyone the user already has a friendship with.
+
+    Args:
+        user_ids (list): Users to compute for
+        limit (int): Candidates kept per user
+
+    Returns:
+        dict: user_id -> ranked list of candidate dicts
+    """
+    limit = limit or current_app.config.get('FRIEND_RECOMMENDATION_LIMIT', 20)
+    user_ids = list(user_ids)
+    mutual = _mutual_friend_counts(user_ids)
+    shared = _shared_upload_counts(user_ids)
+    related = _existing_relations(user_ids)
+
+    signals = defaultdict(dict)
+    for (user_id, candidate_id) in mutual.keys() | shared.keys():
+        if candidate_id is None or candidate_id in related[user_id]:
+            continue
+        signals[user_id][candidate_id] = (mutual.get((user_id, candidate_id), 0), shared.get((user_id, candidate_id), 0))
+
+    ranked = {
+        user_id: sorted(signals[user_id].items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))[:limit]
+        for user_id in user_ids
+    }
+    candidate_ids = {candidate_id for candidates in ranked.values() for candidate_id, _ in candidates}
+    usernames = dict(
+        User.query.with_entities(User.id, User.username).filter(User.id.in_(candidate_ids))
+    ) if candidate_ids else {}
+
+    return {
+        user_id: [
+            {
+                'id': candidate_id,
+                'username': usernames[candidate_id],
+                'mutual_friends': mutual_count,
+                'shared_uploads': shared_count,
+            }
+            for candidate_id, (mutual_count, shared_count) in candidates
+            if candidate_id in usernames
+        ]
+        for user_id, candidates in ranked.items()
+    }
+
+
+def refresh_recommendations(user_ids):
+    """
+    Recompute and store the recommendation rows of user_ids, a batch at a
+    time, committing after each batch
+
+    Returns:
+        int: Number of users refreshed
+    """
+    user_ids = sorted({int(user_id) for user_id in user_ids})
+    # Users deleted since the refresh was scheduled are skipped
+    existing = {user_id for (user_id,) in User.query.with_entities(User.id).filter(User.id.in_(user_ids))} if user_ids else set()
+    user_ids = [user_id for user_id in user_ids if user_id in existing]
+    for start in range(0, len(user_ids), REFRESH_BATCH_SIZE):
+        batch = user_ids[start:start + REFRESH_BATCH_SIZE]
+        recommendations = compute_recommendations(batch)
+        now = datetime.utcnow()
+        FriendRecommendation.query.filter(FriendRecommendation.user_id.in_(batch)).delete(synchronize_session=False)
+        db.session.execute(sa.insert(FriendRecommendation), [
+            {'user_id': user_id, 'candidates': recommendations[user_id], 'computed_at': now}
+            for user_id in batch
+        ])
+        db.session.commit()
+    return len(user_ids)
+
+
+def refresh_all_recommendations():
+    """Recompute every user's recommendations"""
+    return refresh_recommendations(user_id for (user_id,) in User.query.with_entities(User.id))
+
+
+def _refresh_affected(user_ids):
+    # A friendship change alters the user's own exclusions and the
+    # mutual-friend counts seen by each of their accepted friends
+    accepted = Friendship.status == 'accepted'
+    friends = db.session.execute(sa.union_all(
+        sa.select(Friendship.friend_id).where(Friendship.user_id.in_(user_ids), accepted),
+        sa.select(Friendship.user_id).where(Friendship.friend_id.in_(user_ids), accepted),
+    )).scalars()
+    return refresh_recommendations(set(user_ids) | set(friends))
+
+
+def schedule_refresh(*user_ids):
+    """
+    Refresh, in the background, the recommendations affected by changes to
+    the friendships of user_ids
+    """
+    user_ids = {int(user_id) for user_id in user_ids if user_id is not None}
+    if user_ids:
+        run_async(_refresh_affected, user_ids)
+
+
+def get_recommendations(user_id):
+    """
+    Get a user's stored recommendations with one primary-key read, scheduling
+    a refresh if none have been computed yet
+
+    Returns:
+        FriendRecommendation: The stored row, or None until it is computed
+    """
+    row = db.session.get(FriendRecommendation, int(user_id))
+    if row is None:
+        run_async(refresh_recommendations, [int(user_id)])
+    return row
+
+
+recommendations_cli = AppGroup('recommendations', help='Manage precomputed friend recommendations')
+
+
+@recommendations_cli.command('refresh')
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='Only refresh these users (repeatable)')
+def refresh_command(user_ids):
+    """Recompute friend recommendations, for every user by default"""
+    count = refresh_recommendations(user_ids) if user_ids else refresh_all_recommendations()
+    click.echo(f'Refreshed friend recommendations for {count} users')
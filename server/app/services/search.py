@@ -0,0 +1,610 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from flask import current_app
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# Relative weight of a match in each indexed book field
+BOOK_FIELD_WEIGHTS = {'title': 3.0, 'author': 2.0, 'genre': 1.0}
+
+# Bonus applied when a query term matches a token exactly rather than by prefix
+EXACT_MATCH_BONUS = 1.5
+
+# Minimum share of a query's trigrams a username must contain to match
+TRIGRAM_THRESHOLD = 0.3
+
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        list: Tokens in the order they appear
+    """
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def trigrams(text):
+    """
+    Trigrams of each word in text, padded like PostgreSQL's pg_trgm
+    (two spaces before a word, one after) so word starts weigh more
+    """
+    grams = set()
+    for word in tokenize(text):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class InvertedIndex:
+    """
+    Thread-safe in-memory inverted index with prefix lookup.
+
+    Each document is a dict of field name -> text. Postings map a token to
+    the documents containing it along with an accumulated field weight, and a
+    sorted vocabulary lets prefix queries expand with a binary search instead
+    of a scan over every token.
+    """
+
+    def __init__(self, field_weights):
+        self.field_weights = field_weights
+        self._postings = defaultdict(dict)
+        self._doc_tokens = {}
+        self._vocabulary = []
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_tokens
+
+    def add(self, doc_id, fields):
+        """Index a document, replacing any previous version of it"""
+        weights = defaultdict(float)
+        for field, text in fields.items():
+            field_weight = self.field_weights.get(field, 1.0)
+            for token in tokenize(text):
+                weights[token] += field_weight
+
+        with self._lock:
+            self._remove_locked(doc_id)
+            for token, weight in weights.items():
+                postings = self._postings[token]
+                if not postings:
+                    insort(self._vocabulary, token)
+                postings[doc_id] = weight
+            self._doc_tokens[doc_id] = tuple(weights)
+
+    def remove(self, doc_id):
+        """Drop a document from the index; unknown ids are ignored"""
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def rebuild(self, documents):
+        """
+        Replace the index contents
+
+        Args:
+            documents: Iterable of (doc_id, fields) pairs. It is consumed
+                while the index lock is held, so a lazy database query passed
+                here cannot interleave with concurrent add/remove calls.
+        """
+        with self._lock:
+            self._postings.clear()
+            self._doc_tokens.clear()
+            self._vocabulary = []
+            for doc_id, fields in documents:
+                self.add(doc_id, fields)
+
+    def _remove_locked(self, doc_id):
+        tokens = self._doc_tokens.pop(doc_id, None)
+        if not tokens:
+            return
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                position = bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+
+    def _expand(self, term):
+        """Return every indexed token that starts with term"""
+        vocabulary = self._vocabulary
+        position = bisect_left(vocabulary, term)
+        matches = []
+        while position < len(vocabulary) and vocabulary[position].startswith(term):
+            matches.append(vocabulary[position])
+            position += 1
+        return matches
+
+    def search(self, query, prefix=True):
+        """
+        Find documents matching every term in the query
+
+        Args:
+            query (str): Free-text query
+            prefix (bool): Whether terms match tokens they are a prefix of
+
+        Returns:
+            list: (doc_id, score) tuples, best match first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            scores = None
+            for term in terms:
+                tokens = self._expand(term) if prefix else ([term] if term in self._postings else [])
+                term_scores = defaultdict(float)
+                for token in tokens:
+                    bonus = EXACT_MATCH_BONUS if token == term else 1.0
+                    for doc_id, weight in self._postings[token].items():
+                        term_scores[doc_id] += weight * bonus
+
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {doc_id: score + term_scores[doc_id]
+                              for doc_id, score in scores.items() if doc_id in term_scores}
+                if not scores:
+                    return []
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class TrigramIndex:
+    """
+    Thread-safe in-memory trigram index for fuzzy matching of short strings
+    such as usernames. Tolerates typos and matches partial input.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._doc_grams = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_grams)
+
+    def add(self, doc_id, text):
+        """Index a string, replacing any previous value for doc_id"""
+        grams = trigrams(text)
+        with self._lock:
+            self._remove_locked(doc_id)
+            for gram in grams:
+                self._postings[gram].add(doc_id)
+            self._doc_grams[doc_id] = grams
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def rebuild(self, documents):
+        """Replace the index contents with (doc_id, text) pairs, consumed under the lock"""
+        with self._lock:
+            self._postings.clear()
+            self._doc_grams.clear()
+            for doc_id, text in documents:
+                self.add(doc_id, text)
+
+    def _remove_locked(self, doc_id):
+        for gram in self._doc_grams.pop(doc_id, ()):
+            postings = self._postings[gram]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[gram]
+
+    def search(self, query, limit=10, threshold=TRIGRAM_THRESHOLD):
+        """
+        Find the strings most similar to query
+
+        Args:
+            query (str): Possibly partial or misspelled input
+            limit (int): Maximum number of matches (top-k)
+            threshold (float): Minimum share of the query's trigrams a match must contain
+
+        Returns:
+            list: (doc_id, score) tuples, best match first. Scores are in
+                (0, 1]; an exact match scores 1.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        with self._lock:
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self._postings.get(gram, ()))
+
+            candidates = []
+            for doc_id, count in shared.items():
+                # How much of the query the string contains, as pg_trgm's
+                # word_similarity, blended with whole-string similarity so
+                # closer-length strings win ties
+                containment = count / len(query_grams)
+                if containment < threshold:
+                    continue
+                similarity = count / (len(query_grams) + len(self._doc_grams[doc_id]) - count)
+                candidates.append((doc_id, round(0.7 * containment + 0.3 * similarity, 6)))
+
+        return heapq.nlargest(limit, candidates, key=lambda item: (item[1], -item[0]))
+
+
+class CompactTrie:
+    """
+    Thread-safe radix trie for autocomplete.
+
+    Edges are labelled with whole substrings rather than single characters,
+    and every node caches the top-k suggestions found beneath it, so a
+    lookup walks at most len(prefix) characters and never visits the
+    subtree. Each suggestion is inserted once per word it contains, which
+    lets a prefix match the start of any word ("gats" finds "The Great
+    Gatsby"). Suggestions carry a weight; higher weights rank first.
+    """
+
+    __slots__ = ('top_k', '_root', '_weights', '_keys', '_lock')
+
+    class _Node:
+        __slots__ = ('children', 'terminals', 'top')
+
+        def __init__(self):
+            self.children = {}  # first character -> (edge label, child node)
+            self.terminals = set()  # suggestions whose key ends here
+            self.top = []  # best (rank key, suggestion) pairs in this subtree
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        self._root = self._Node()
+        self._weights = {}
+        self._keys = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._weights)
+
+    @staticmethod
+    def _word_keys(text):
+        tokens = tokenize(text)
+        return {' '.join(tokens[i:]) for i in range(len(tokens))}
+
+    def _rank(self, suggestion):
+        # Heavier first, then shorter, then alphabetical
+        _, text = suggestion
+        return (-self._weights[suggestion], len(text), text.casefold(), suggestion)
+
+    def set(self, suggestion, text, weight):
+        """
+        Add or re-weight a suggestion; a weight of 0 or less removes it
+
+        Args:
+            suggestion (tuple): Hashable (kind, display text) value returned by search()
+            text (str): Text the suggestion is matched on
+            weight (float): Ranking weight
+        """
+        with self._lock:
+            for key in self._keys.pop(suggestion, ()):
+                self._remove_key(key, suggestion)
+            self._weights.pop(suggestion, None)
+            if weight <= 0:
+                return
+            self._weights[suggestion] = weight
+            keys = self._word_keys(text)
+            self._keys[suggestion] = keys
+            for key in keys:
+                self._insert_key(key, suggestion)
+
+    def clear(self):
+        with self._lock:
+            self._root = self._Node()
+            self._weights.clear()
+            self._keys.clear()
+
+    def rebuild(self, entries):
+        """
+        Replace the contents with (suggestion, text, weight) entries. Cached
+        top-k lists are computed once, bottom-up, after every key is in place.
+        """
+        with self._lock:
+            self.clear()
+            for suggestion, text, weight in entries:
+                if weight <= 0:
+                    continue
+                self._weights[suggestion] = weight
+                keys = self._word_keys(text)
+                self._keys[suggestion] = keys
+                for key in keys:
+                    self._insert_key(key, suggestion, refresh=False)
+            self._refresh_subtree(self._root)
+
+    def _refresh_subtree(self, root):
+        # Iterative post-order so deep tries cannot hit the recursion limit
+        stack, order = [root], []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(child for _, child in node.children.values())
+        self._refresh(order)
+
+    def _insert_key(self, key, suggestion, refresh=True):
+        path = [self._root]
+        node = self._root
+        while key:
+            edge = node.children.get(key[0])
+            if edge is None:
+                child = self._Node()
+                node.children[key[0]] = (key, child)
+                node, key = child, ''
+            else:
+                label, child = edge
+                common = 0
+                while common < min(len(label), len(key)) and label[common] == key[common]:
+                    common += 1
+                if common < len(label):
+                    # Split the edge at the end of the shared part
+                    middle = self._Node()
+                    middle.children[label[common]] = (label[common:], child)
+                    middle.top = list(child.top)
+                    node.children[key[0]] = (label[:common], middle)
+                    child = middle
+                node, key = child, key[common:]
+            path.append(node)
+        node.terminals.add(suggestion)
+        if refresh:
+            self._refresh(path)
+
+    def _remove_key(self, key, suggestion):
+        path = [self._root]
+        node = self._root
+        while key:
+            edge = node.children.get(key[0])
+            if edge is None or not key.startswith(edge[0]):
+                return
+            node, key = edge[1], key[len(edge[0]):]
+            path.append(node)
+        node.terminals.discard(suggestion)
+        self._refresh(path)
+        # Prune the emptied branch, then merge pass-through nodes back into
+        # a single edge so the trie stays compact
+        for parent, child in zip(reversed(path[:-1]), reversed(path[1:])):
+            first, label = self._edge_to(parent, child)
+            if first is None:
+                continue
+            if not child.terminals and not child.children:
+                del parent.children[first]
+            elif not child.terminals and len(child.children) == 1:
+                (child_label, grandchild), = child.children.values()
+                parent.children[first] = (label + child_label, grandchild)
+
+    @staticmethod
+    def _edge_to(parent, child):
+        for first, (label, candidate) in parent.children.items():
+            if candidate is child:
+                return first, label
+        return None, None
+
+    def _refresh(self, path):
+        """Recompute the cached top-k of every node on path, deepest first"""
+        for node in reversed(path):
+            best = {suggestion: self._rank(suggestion) for suggestion in node.terminals}
+            for _, child in node.children.values():
+                for rank, suggestion in child.top:
+                    best[suggestion] = rank
+            node.top = heapq.nsmallest(self.top_k, ((rank, suggestion) for suggestion, rank in best.items()))
+
+    def search(self, prefix, limit=None):
+        """
+        Suggestions with a word starting with prefix
+
+        Args:
+            prefix (str): Partially typed query
+            limit (int): Maximum number of suggestions, at most top_k
+
+        Returns:
+            list: (kind, text) suggestions, best first
+        """
+        key = ' '.join(tokenize(prefix))
+        if not key:
+            return []
+        with self._lock:
+            node = self._root
+            while key:
+                edge = node.children.get(key[0])
+                if edge is None:
+                    return []
+                label, child = edge
+                if key.startswith(label):
+                    key = key[len(label):]
+                elif label.startswith(key):
+                    key = ''
+                else:
+                    return []
+                node = child
+            top = node.top
+        return [suggestion for _, suggestion in top[:limit or self.top_k]]
+
+
+class SuggestionIndex:
+    """
+    Autocomplete over titles, authors and usernames, backed by a CompactTrie.
+
+    Sources (a book, a user) contribute (kind, text) suggestions; a
+    suggestion's weight is the number of sources contributing it, so an
+    author with many books ranks above one with a single book.
+    """
+
+    def __init__(self, top_k=10):
+        self.trie = CompactTrie(top_k)
+        self._sources = {}
+        self._counts = Counter()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.trie)
+
+    def add(self, source, suggestions):
+        """Set the suggestions contributed by source, replacing earlier ones"""
+        suggestions = tuple(dict.fromkeys(suggestion for suggestion in suggestions if suggestion[1]))
+        with self._lock:
+            previous = self._sources.pop(source, ())
+            if suggestions:
+                self._sources[source] = suggestions
+            self._counts.subtract(previous)
+            self._counts.update(suggestions)
+            for suggestion in set(previous) ^ set(suggestions):
+                self._reweigh(suggestion)
+
+    def remove(self, source):
+        self.add(source, ())
+
+    def _reweigh(self, suggestion):
+        count = self._counts[suggestion]
+        if count <= 0:
+            del self._counts[suggestion]
+        self.trie.set(suggestion, suggestion[1], count)
+
+    def rebuild(self, documents):
+        """Replace the contents with (source, suggestions) pairs, consumed under the lock"""
+        with self._lock:
+            self.trie.clear()
+            self._sources.clear()
+            self._counts.clear()
+            for source, suggestions in documents:
+                suggestions = tuple(dict.fromkeys(suggestion for suggestion in suggestions if suggestion[1]))
+                if suggestions:
+                    self._sources[source] = suggestions
+                    self._counts.update(suggestions)
+            self.trie.rebuild(
+                (suggestion, suggestion[1], count) for suggestion, count in self._counts.items()
+            )
+
+    def search(self, prefix, limit=None):
+        """Return (kind, text) suggestions for a partially typed query, best first"""
+        return self.trie.search(prefix, limit)
+
+
+def _lazy_index(name, factory, load):
+    """
+    Get a per-app index, populating it with load() on first use.
+    load returns an iterable of documents for the index's rebuild().
+    """
+    state = current_app.extensions.get(name)
+    if state is None:
+        state = current_app.extensions.setdefault(name, {
+            'index': factory(),
+            'lock': threading.Lock(),
+            'built': False,
+        })
+
+    if not state['built']:
+        with state['lock']:
+            if not state['built']:
+                state['index'].rebuild(load())
+                state['built'] = True
+
+    return state['index']
+
+
+def _book_fields(title, author, genre):
+    return {'title': title, 'author': author, 'genre': genre}
+
+
+def _load_books():
+    from app.models import Book
+    rows = Book.query.filter(Book.is_ready == True).with_entities(Book.id, Book.title, Book.author, Book.genre)
+    return ((book_id, _book_fields(title, author, genre)) for book_id, title, author, genre in rows)
+
+
+def _load_users():
+    from app.models import User
+    return User.query.with_entities(User.id, User.username)
+
+
+def _book_suggestions(title, author):
+    return [('title', title), ('author', author)]
+
+
+def _load_suggestions():
+    from app.models import Book, User
+    # Only public books are suggested, so private titles never leak to other
+    # users; books join the indexes once ingestion has validated their file
+    books = Book.query.filter(Book.is_public == True, Book.is_ready == True).with_entities(
+        Book.id, Book.title, Book.author
+    )
+    for book_id, title, author in books:
+        yield ('book', book_id), _book_suggestions(title, author)
+    for user_id, username in User.query.with_entities(User.id, User.username):
+        yield ('user', user_id), [('user', username)]
+
+
+def get_book_index():
+    """Get the book index for the current app, building it from the database on first use"""
+    return _lazy_index('book_search_index', lambda: InvertedIndex(BOOK_FIELD_WEIGHTS), _load_books)
+
+
+def get_user_index():
+    """Get the username trigram index for the current app, building it from the database on first use"""
+    return _lazy_index('user_trigram_index', TrigramIndex, _load_users)
+
+
+def get_suggestion_index():
+    """Get the autocomplete index for the current app, building it from the database on first use"""
+    return _lazy_index(
+        'search_suggestion_index',
+        lambda: SuggestionIndex(current_app.config.get('SUGGEST_MAX_RESULTS', 10)),
+        _load_suggestions
+    )
+
+
+def index_book(book):
+    """Add or refresh a book in the search index"""
+    get_book_index().add(book.id, _book_fields(book.title, book.author, book.genre))
+
+
+def unindex_book(book_id):
+    """Remove a book from the search index"""
+    get_book_index().remove(book_id)
+
+
+def index_user(user):
+    """Add or refresh a user's username in the trigram index"""
+    get_user_index().add(user.id, user.username)
+
+
+def unindex_user(user_id):
+    """Remove a user from the trigram index"""
+    get_user_index().remove(user_id)
+
+
+def index_book_suggestions(book):
+    """Add or refresh a book's title and author in autocomplete; private and unvalidated books are left out"""
+    if book.is_public and book.is_ready:
+        get_suggestion_index().add(('book', book.id), _book_suggestions(book.title, book.author))
+    else:
+        get_suggestion_index().remove(('book', book.id))
+
+
+def unindex_book_suggestions(book_id):
+    get_suggestion_index().remove(('book', book_id))
+
+
+def index_user_suggestions(user):
+    get_suggestion_index().add(('user', user.id), [('user', user.username)])
+
+
+def unindex_user_suggestions(user_id):
+    get_suggestion_index().remove(('user', user_id))
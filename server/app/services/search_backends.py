@@ -0,0 +1,302 @@
+from bisect import bisect_right
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app import db
+from app.models import Book, User
+from app.services.search import (
+    get_book_index, get_user_index, index_book, index_book_suggestions, index_user, index_user_suggestions,
+    tokenize, unindex_book, unindex_book_suggestions, unindex_user, unindex_user_suggestions
+)
+
+
+class SearchBackend:
+    """
+    Interface for full-text search over books and users.
+
+    Search methods take the raw query string plus optional SQLAlchemy
+    filter expressions (e.g. a visibility clause on Book) and return
+    (id, score) tuples ordered by descending relevance, then id.
+
+    Results can be paged with limit/offset, or by keyset with
+    after=(score, id) of the last row already seen, which costs the same
+    however deep the page is.
+    """
+
+    name = None
+
+    def search_books(self, query, filters=(), limit=None, offset=0, after=None):
+        raise NotImplementedError
+
+    def count_books(self, query, filters=()):
+        raise NotImplementedError
+
+    def estimate_books(self, query):
+        """Upper bound on matching books, ignoring filters"""
+        return self.count_books(query)
+
+    def search_users(self, query, filters=(), limit=None, offset=0, after=None):
+        raise NotImplementedError
+
+    def count_users(self, query, filters=()):
+        raise NotImplementedError
+
+    def estimate_users(self, query):
+        """Upper bound on matching users, ignoring filters"""
+        return self.count_users(query)
+
+    # Write hooks. The base versions keep the in-process autocomplete trie
+    # current; database backends rely on their schema for everything else.
+
+    def index_book(self, book):
+        """Called after a book is committed"""
+        index_book_suggestions(book)
+
+    def remove_book(self, book_id):
+        """Called after a book is deleted"""
+        unindex_book_suggestions(book_id)
+
+    def index_user(self, user):
+        """Called after a user is created or renamed"""
+        index_user_suggestions(user)
+
+    def remove_user(self, user_id):
+        """Called after a user is deleted"""
+        unindex_user_suggestions(user_id)
+
+
+def _slice_ranked(ranked, limit, offset, after):
+    """Page a ranked (id, score) list by offset or by keyset position"""
+    if after is not None:
+        after_score, after_id = after
+        keys = [(-score, row_id) for row_id, score in ranked]
+        offset += bisect_right(keys, (-after_score, after_id))
+    return ranked[offset:offset + limit] if limit is not None else ranked[offset:]
+
+
+def _filter_ranked(model, ranked, filters):
+    """Keep the (id, score) pairs whose rows also satisfy filters, in rank order"""
+    if not ranked or not filters:
+        return ranked
+    allowed = {
+        row_id for (row_id,) in
+        model.query.with_entities(model.id).filter(model.id.in_([row_id for row_id, _ in ranked]), *filters)
+    }
+    return [(row_id, score) for row_id, score in ranked if row_id in allowed]
+
+
+class TrigramUserSearch:
+    """
+    Fuzzy user search through the in-process username trigram index, capped
+    at the top USER_SEARCH_MAX_RESULTS matches
+    """
+
+    def _matching_users(self, query, filters):
+        ranked = get_user_index().search(query, limit=current_app.config['USER_SEARCH_MAX_RESULTS'])
+        return _filter_ranked(User, ranked, filters)
+
+    def search_users(self, query, filters=(), limit=None, offset=0, after=None):
+        return _slice_ranked(self._matching_users(query, filters), limit, offset, after)
+
+    def count_users(self, query, filters=()):
+        return len(self._matching_users(query, filters))
+
+    def index_user(self, user):
+        index_user(user)
+        super().index_user(user)
+
+    def remove_user(self, user_id):
+        unindex_user(user_id)
+        super().remove_user(user_id)
+
+
+class MemorySearchBackend(TrigramUserSearch, SearchBackend):
+    """Fallback backend using the in-process indexes from app.services.search"""
+
+    name = 'memory'
+
+    def _matching_books(self, query, filters):
+        return _filter_ranked(Book, get_book_index().search(query), filters)
+
+    def search_books(self, query, filters=(), limit=None, offset=0, after=None):
+        return _slice_ranked(self._matching_books(query, filters), limit, offset, after)
+
+    def count_books(self, query, filters=()):
+        return len(self._matching_books(query, filters))
+
+    def index_book(self, book):
+        index_book(book)
+        super().index_book(book)
+
+    def remove_book(self, book_id):
+        unindex_book(book_id)
+        super().remove_book(book_id)
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """
+    Base for backends whose index lives in the database and is maintained by
+    the schema (triggers or generated columns) created in migrations.
+    """
+
+    dialect = None
+
+    @classmethod
+    def is_installed(cls, engine):
+        raise NotImplementedError
+
+    def _match_books(self, terms):
+        """Return (from_clause, match_condition, score_expression) for books"""
+        raise NotImplementedError
+
+    def _match_users(self, terms):
+        """Return (from_clause, match_condition, score_expression) for users"""
+        raise NotImplementedError
+
+    def _ranked(self, model, match, query, filters, limit, offset, after):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        source, condition, score = match(terms)
+        statement = (
+            sa.select(model.id, score.label('score'))
+            .select_from(source)
+            .where(condition, *filters)
+            .order_by(sa.desc('score'), model.id)
+            .offset(offset)
+        )
+        if after is not None:
+            after_score, after_id = after
+            statement = statement.where(sa.or_(score < after_score, sa.and_(score == after_score, model.id > after_id)))
+        if limit is not None:
+            statement = statement.limit(limit)
+        return [(row.id, float(row.score)) for row in db.session.execute(statement)]
+
+    def _count(self, match, query, filters):
+        terms = tokenize(query)
+        if not terms:
+            return 0
+        source, condition, _ = match(terms)
+        statement = sa.select(sa.func.count()).select_from(source).where(condition, *filters)
+        return db.session.execute(statement).scalar()
+
+    def search_books(self, query, filters=(), limit=None, offset=0, after=None):
+        return self._ranked(Book, self._match_books, query, filters, limit, offset, after)
+
+    def count_books(self, query, filters=()):
+        return self._count(self._match_books, query, filters)
+
+    def search_users(self, query, filters=(), limit=None, offset=0, after=None):
+        return self._ranked(User, self._match_users, query, filters, limit, offset, after)
+
+    def count_users(self, query, filters=()):
+        return self._count(self._match_users, query, filters)
+
+
+class SQLiteFTS5Backend(TrigramUserSearch, DatabaseSearchBackend):
+    """
+    SQLite backend using the external-content FTS5 table books_fts, which
+    triggers keep in sync with books. Users are matched with the in-process
+    trigram index since SQLite has no similarity operator.
+    """
+
+    name = 'sqlite_fts5'
+    dialect = 'sqlite'
+
+    # bm25 column weights for title, author and genre
+    BOOK_RANK = 'bm25(books_fts, 10.0, 5.0, 1.0)'
+
+    books_fts = sa.table('books_fts', sa.column('rowid'))
+
+    @classmethod
+    def is_installed(cls, engine):
+        return sa.inspect(engine).has_table('books_fts')
+
+    @staticmethod
+    def _match_expression(terms):
+        # Every term must match, each as a prefix of an indexed token
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def _match_books(self, terms):
+        source = Book.__table__.join(self.books_fts, self.books_fts.c.rowid == Book.id)
+        condition = sa.text('books_fts MATCH :books_match').bindparams(books_match=self._match_expression(terms))
+        # bm25() is lower for better matches, so negate it into a score
+        return source, condition, sa.literal_column(f'-{self.BOOK_RANK}')
+
+
+class PostgresFullTextBackend(DatabaseSearchBackend):
+    """
+    PostgreSQL backend using the generated, GIN-indexed tsvector column
+    books.search_vector, and pg_trgm word similarity over a GIN trigram
+    index on users.username.
+    """
+
+    name = 'postgres_tsvector'
+    dialect = 'postgresql'
+
+    @classmethod
+    def is_installed(cls, engine):
+        inspector = sa.inspect(engine)
+        book_columns = {column['name'] for column in inspector.get_columns('books')}
+        user_indexes = {index['name'] for index in inspector.get_indexes('users')}
+        return 'search_vector' in book_columns and 'ix_users_username_trgm' in user_indexes
+
+    def _match_books(self, terms):
+        vector = sa.literal_column('books.search_vector')
+        ts_query = sa.func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        return Book.__table__, vector.op('@@')(ts_query), sa.func.ts_rank(vector, ts_query)
+
+    def _match_users(self, terms):
+        text = ' '.join(terms)
+        # <% is the index-assisted form of word_similarity(text, username) >= threshold
+        condition = sa.literal(text).op('<%')(User.username)
+        return User.__table__, condition, sa.func.word_similarity(text, User.username)
+
+    def search_users(self, query, filters=(), limit=None, offset=0, after=None):
+        # The top-k cutoff is applied to offset pages only; a keyset page
+        # cannot know its absolute position without counting
+        if after is None:
+            max_results = current_app.config['USER_SEARCH_MAX_RESULTS']
+            limit = max_results - offset if limit is None else min(limit, max_results - offset)
+            if limit <= 0:
+                return []
+        return super().search_users(query, filters, limit, offset, after)
+
+    def count_users(self, query, filters=()):
+        return min(super().count_users(query, filters), current_app.config['USER_SEARCH_MAX_RESULTS'])
+
+
+SEARCH_BACKENDS = {
+    backend.name: backend
+    for backend in (MemorySearchBackend, SQLiteFTS5Backend, PostgresFullTextBackend)
+}
+
+
+def _select_backend():
+    name = current_app.config.get('SEARCH_BACKEND', 'auto')
+    if name != 'auto':
+        if name not in SEARCH_BACKENDS:
+            raise ValueError(f'SEARCH_BACKEND must be one of {["auto", *SEARCH_BACKENDS]}')
+        return SEARCH_BACKENDS[name]()
+
+    engine = db.engine
+    for backend in (SQLiteFTS5Backend, PostgresFullTextBackend):
+        if backend.dialect == engine.dialect.name and backend.is_installed(engine):
+            return backend()
+
+    current_app.logger.info("No database full-text index installed; using in-memory search")
+    return MemorySearchBackend()
+
+
+def get_search_backend():
+    """
+    Get the search backend for the current app.
+
+    With SEARCH_BACKEND = 'auto' the database's own full-text index is used
+    when its migration has been applied, otherwise the in-memory index.
+    """
+    backend = current_app.extensions.get('search_backend')
+    if backend is None:
+        backend = current_app.extensions.setdefault('search_backend', _select_backend())
+    return backend
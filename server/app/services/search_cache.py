@@ -0,0 +1,56 @@
+import threading
+from collections import defaultdict
+
+from flask import current_app
+
+from app.services.cache import TTLCache
+
+
+class SearchCache:
+    """
+    Cache of search responses invalidated by version counters rather than by
+    scanning entries.
+
+    Every key embeds the catalog version, bumped whenever books or users are
+    added, renamed or removed, and the searching user's scope version,
+    bumped whenever one of their friendships changes. A write makes the
+    affected keys unreachable at once; the stale entries age out through LRU
+    eviction or their TTL. Versions are per process, so other workers may
+    serve a stale page for up to SEARCH_CACHE_TTL seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.catalog_version = 0
+        self._scope_versions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def key(self, user_id, *parts):
+        user_id = int(user_id)
+        return (self.catalog_version, user_id, self._scope_versions[user_id], *parts)
+
+    def bump_catalog(self):
+        with self._lock:
+            self.catalog_version += 1
+
+    def bump_scopes(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._scope_versions[int(user_id)] += 1
+
+
+def get_search_cache():
+    """Get the search result cache for the current app"""
+    cache = current_app.extensions.get('search_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('search_cache', SearchCache(
+            maxsize=current_app.config.get('SEARCH_CACHE_SIZE', 1024),
+            ttl=current_app.config.get('SEARCH_CACHE_TTL', 60),
+        ))
+    return cache
+
+
+def catalog_changed():
+    """Invalidate cached searches after a book or user is added, renamed or removed"""
+    get_search_cache().bump_catalog()
+
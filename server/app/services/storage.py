@@ -0,0 +1,433 @@
+import base64
+import hashlib
+import mimetypes
+import os
+import posixpath
+import tempfile
+import time
+
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError
+from flask import current_app, url_for
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+# S3 rejects multipart parts smaller than this, except the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Read size when copying between local files and streams
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class StorageError(Exception):
+    """A storage backend failed to read, write or sign something"""
+    pass
+
+
+class ObjectNotFound(StorageError):
+    """The requested key does not exist in storage"""
+    pass
+
+
+class ChecksumMismatch(StorageError):
+    """A body did not hash to the SHA-256 it was stored under"""
+    pass
+
+
+def base64_to_hex(value):
+    """Hex form of a base64 digest, as S3 checksums are base64 and ours are hex"""
+    return base64.b64decode(value).hex()
+
+
+class StoredFile:
+    """What a streamed upload wrote: where, how many bytes, and their SHA-256"""
+    __slots__ = ('key', 'size', 'sha256')
+
+    def __init__(self, key, size, sha256):
+        self.key = key
+        self.size = size
+        self.sha256 = sha256
+
+    def __repr__(self):
+        return f'<StoredFile {self.key}: {self.size} bytes>'
+
+
+class ObjectInfo:
+    """Metadata of a stored object; content_type and sha256 are None when the backend does not know them"""
+    __slots__ = ('size', 'content_type', 'sha256')
+
+    def __init__(self, size, content_type, sha256=None):
+        self.size = size
+        self.content_type = content_type
+        self.sha256 = sha256
+
+
+def _read_part(stream, part_size):
+    """Read up to part_size bytes, short only at the end of the stream"""
+    buffer = bytearray()
+    while len(buffer) < part_size:
+        data = stream.read(part_size - len(buffer))
+        if not data:
+            break
+        buffer += data
+    return bytes(buffer)
+
+
+def stream_upload(s3_client, stream, bucket, key, content_type=None, part_size=None):
+    """
+    Copy a binary stream to S3 in a single pass, counting its size and
+    hashing it on the way.
+
+    Only one part is held in memory at a time, so peak memory is bounded
+    by part_size whatever the file size. A stream that fits in one part is
+    sent with a single PutObject; anything larger becomes a multipart
+    upload, which is aborted if any part fails.
+
+    Args:
+        s3_client: boto3 S3 client
+        stream: Binary file-like object positioned at the start
+        bucket (str): Target bucket
+        key (str): Target object key
+        content_type (str): Content-Type to store with the object
+        part_size (int): Bytes per part (S3_UPLOAD_PART_SIZE by default)
+
+    Returns:
+        StoredFile: The key, byte count and SHA-256 hex digest
+    """
+    part_size = max(part_size or current_app.config.get('S3_UPLOAD_PART_SIZE', 8 * 1024 * 1024), MIN_PART_SIZE)
+    extra = {'ContentType': content_type} if content_type else {}
+    digest = hashlib.sha256()
+
+    part = _read_part(stream, part_size)
+    digest.update(part)
+    size = len(part)
+    if size < part_size:
+        s3_client.put_object(Bucket=bucket, Key=key, Body=part, **extra)
+        return StoredFile(key, size, digest.hexdigest())
+
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key, **extra)['UploadId']
+    try:
+        parts = []
+        while part:
+            number = len(parts) + 1
+            response = s3_client.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=part
+            )
+            parts.append({'ETag': response['ETag'], 'PartNumber': number})
+            part = _read_part(stream, part_size)
+            digest.update(part)
+            size += len(part)
+        s3_client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts}
+        )
+    except Exception:
+        s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    return StoredFile(key, size, digest.hexdigest())
+
+
+class StorageBackend:
+    """
+    Where book files live. Keys are relative, '/'-separated paths; url()
+    gives the stable reference stored in Book.s3_url and key_for_url()
+    reverses it.
+    """
+
+    def save(self, stream, key, content_type=None):
+        """Write a binary stream in one pass; returns a StoredFile"""
+        raise NotImplementedError
+
+    def open(self, key):
+        """Seekable binary file with the object's bytes; the caller closes it"""
+        raise NotImplementedError
+
+    def stat(self, key):
+        """ObjectInfo for key, or None if it does not exist"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove key; a missing key is not an error"""
+        raise NotImplementedError
+
+    def url(self, key):
+        raise NotImplementedError
+
+    def key_for_url(self, url):
+        """Key referenced by a url() value, or None if it is not this backend's"""
+        raise NotImplementedError
+
+    def download_url(self, key, filename=None, expires_in=3600):
+        """Time-limited URL a client can fetch the object from"""
+        raise NotImplementedError
+
+    def presign_upload(self, key, content_type, size, checksum, expires_in):
+        """
+        Time-limited URL a client can PUT exactly this object to
+
+        Args:
+            key (str): Target key
+            content_type (str): Required Content-Type
+            size (int): Required Content-Length
+            checksum (str): Base64 SHA-256 the body must match
+            expires_in (int): Seconds the URL stays valid
+
+        Returns:
+            dict: url, method and the headers the client must send
+        """
+        raise NotImplementedError
+
+
+class S3Backend(StorageBackend):
+    """
+    Objects in an S3 bucket (or an S3-compatible stand-in at endpoint_url).
+
+    The boto3 client is built once and shared by every request thread of
+    the worker: boto3 clients are thread-safe, and the underlying urllib3
+    pool keeps up to max_pool_connections TLS connections open.
+    """
+
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 max_pool_connections=10):
+        self.bucket = bucket
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region or 'us-east-1',
+            config=BotoConfig(max_pool_connections=max_pool_connections),
+        )
+
+    @staticmethod
+    def _not_found(error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def save(self, stream, key, content_type=None):
+        try:
+            return stream_upload(self.client, stream, self.bucket, key, content_type)
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(f'Could not store {key}: {e}') from e
+
+    def open(self, key):
+        spool = tempfile.SpooledTemporaryFile(max_size=current_app.config.get('S3_UPLOAD_PART_SIZE', 8 * 1024 * 1024))
+        try:
+            self.client.download_fileobj(self.bucket, key, spool)
+        except ClientError as e:
+            spool.close()
+            if self._not_found(e):
+                raise ObjectNotFound(key) from e
+            raise StorageError(f'Could not read {key}: {e}') from e
+        except BotoCoreError as e:
+            spool.close()
+            raise StorageError(f'Could not read {key}: {e}') from e
+        spool.seek(0)
+        return spool
+
+    def stat(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key, ChecksumMode='ENABLED')
+        except ClientError as e:
+            if self._not_found(e):
+                return None
+            raise StorageError(f'Could not inspect {key}: {e}') from e
+        except BotoCoreError as e:
+            raise StorageError(f'Could not inspect {key}: {e}') from e
+        checksum = head.get('ChecksumSHA256')
+        # Multipart objects carry a checksum of part checksums ("...-N"), not of the bytes
+        sha256 = None
+        if checksum and '-' not in checksum:
+            sha256 = base64_to_hex(checksum)
+        return ObjectInfo(head['ContentLength'], head.get('ContentType'), sha256)
+
+    def delete(self, key):
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(f'Could not delete {key}: {e}') from e
+
+    def url(self, key):
+        return f"https://{self.bucket}.s3.amazonaws.com/{key}"
+
+    def key_for_url(self, url):
+        if not url:
+            return None
+        # Virtual-hosted (with or without a region) and path-style URLs
+        for marker in (f"//{self.bucket}.s3.amazonaws.com/", f"/{self.bucket}/"):
+            if marker in url:
+                return url.split(marker, 1)[1]
+        host_prefix = f"//{self.bucket}.s3."
+        if host_prefix in url:
+            return url.split(host_prefix, 1)[1].split('/', 1)[-1]
+        return None
+
+    def download_url(self, key, filename=None, expires_in=3600):
+        params = {'Bucket': self.bucket, 'Key': key}
+        if filename:
+            params['ResponseContentDisposition'] = f'attachment; filename="{filename}"'
+        try:
+            return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires_in)
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(f'Could not sign a download of {key}: {e}') from e
+
+    def presign_upload(self, key, content_type, size, checksum, expires_in):
+        try:
+            url = self.client.generate_presigned_url('put_object', Params={
+                'Bucket': self.bucket,
+                'Key': key,
+                'ContentType': content_type,
+                'ContentLength': size,
+                'ChecksumSHA256': checksum,
+            }, ExpiresIn=expires_in)
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(f'Could not sign an upload of {key}: {e}') from e
+        return {
+            'url': url,
+            'method': 'PUT',
+            'headers': {
+                'Content-Type': content_type,
+                'Content-Length': str(size),
+                'x-amz-checksum-sha256': checksum,
+            },
+        }
+
+
+class LocalBackend(StorageBackend):
+    """
+    Objects as files under a root directory, for development and tests.
+
+    Download and upload URLs point at the /api/storage/files routes, which
+    serve or accept a single key for a signed, time-limited token. Content
+    types are derived from the key's extension, so extensionless keys
+    (such as content-addressed blobs) have none.
+    """
+
+    def __init__(self, root, secret_key):
+        self.root = os.path.abspath(root)
+        self._signer = URLSafeTimedSerializer(secret_key, salt='local-storage')
+
+    def _path(self, key):
+        normalized = posixpath.normpath(key or '')
+        if normalized.startswith(('/', '..')) or normalized in ('', '.'):
+            raise StorageError(f'Invalid storage key: {key}')
+        return os.path.join(self.root, *normalized.split('/'))
+
+    def save(self, stream, key, content_type=None, expected_sha256=None):
+        """
+        Write a binary stream in one pass. With expected_sha256, a body
+        with another digest raises ChecksumMismatch and leaves any existing
+        file untouched, as S3 does for a checksummed PUT.
+        """
+        path = self._path(key)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write beside the target and rename, so readers never see a partial file
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as partial:
+                try:
+                    while True:
+                        chunk = stream.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        size += len(chunk)
+                        partial.write(chunk)
+                except BaseException:
+                    os.unlink(partial.name)
+                    raise
+            if expected_sha256 is not None and digest.hexdigest() != expected_sha256:
+                os.unlink(partial.name)
+                raise ChecksumMismatch(f'Body of {key} does not match its checksum')
+            os.replace(partial.name, path)
+        except OSError as e:
+            raise StorageError(f'Could not store {key}: {e}') from e
+        return StoredFile(key, size, digest.hexdigest())
+
+    def open(self, key):
+        try:
+            return open(self._path(key), 'rb')
+        except FileNotFoundError as e:
+            raise ObjectNotFound(key) from e
+        except OSError as e:
+            raise StorageError(f'Could not read {key}: {e}') from e
+
+    def stat(self, key):
+        try:
+            size = os.path.getsize(self._path(key))
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            raise StorageError(f'Could not inspect {key}: {e}') from e
+        return ObjectInfo(size, mimetypes.guess_type(key)[0])
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise StorageError(f'Could not delete {key}: {e}') from e
+
+    def url(self, key):
+        return f"local://{key}"
+
+    def key_for_url(self, url):
+        if url and url.startswith('local://'):
+            return url[len('local://'):]
+        return None
+
+    def download_url(self, key, filename=None, expires_in=3600):
+        token = self._signer.dumps({'op': 'get', 'key': key, 'filename': filename, 'ttl': expires_in})
+        return url_for('api.storage.local_file', token=token, _external=True)
+
+    def presign_upload(self, key, content_type, size, checksum, expires_in):
+        token = self._signer.dumps({
+            'op': 'put', 'key': key, 'content_type': content_type,
+            'size': size, 'sha256': base64_to_hex(checksum), 'ttl': expires_in,
+        })
+        return {
+            'url': url_for('api.storage.local_file', token=token, _external=True),
+            'method': 'PUT',
+            'headers': {'Content-Type': content_type, 'Content-Length': str(size)},
+        }
+
+    def read_token(self, token, op):
+        """
+        Claims of a token from download_url or presign_upload
+
+        Raises:
+            StorageError: If the token is forged, expired or for another op
+        """
+        try:
+            claims, issued_at = self._signer.loads(token, return_timestamp=True)
+        except BadSignature as e:
+            raise StorageError('Invalid storage link') from e
+        if not isinstance(claims, dict) or claims.get('op') != op:
+            raise StorageError('Invalid storage link')
+        if time.time() - issued_at.timestamp() > claims.get('ttl', 3600):
+            raise StorageError('Storage link has expired')
+        return claims
+
+
+def _create_backend(config):
+    backend = config.get('STORAGE_BACKEND', 's3')
+    if backend == 's3':
+        return S3Backend(
+            config.get('S3_BUCKET_NAME'),
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('AWS_REGION'),
+            access_key=config.get('AWS_ACCESS_KEY_ID'),
+            secret_key=config.get('AWS_SECRET_ACCESS_KEY'),
+            max_pool_connections=config.get('S3_MAX_POOL_CONNECTIONS', 10),
+        )
+    if backend == 'local':
+        return LocalBackend(config.get('LOCAL_STORAGE_ROOT', 'instance/storage'), config['SECRET_KEY'])
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_storage():
+    """Get the storage backend for the current app, created once per worker"""
+    storage = current_app.extensions.get('storage')
+    if storage is None:
+        storage = current_app.extensions.setdefault('storage', _create_backend(current_app.config))
+    return storage
@@ -0,0 +1,45 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from flask import current_app
+
+
+def _get_executor():
+    executor = current_app.extensions.get('task_executor')
+    if executor is None:
+        executor = current_app.extensions.setdefault('task_executor', ThreadPoolExecutor(
+            max_workers=current_app.config.get('TASK_WORKERS', 2),
+            thread_name_prefix='storied-task'
+        ))
+    return executor
+
+
+def run_async(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) in the background, outside the current request.
+
+    The task gets its own app context, and with it its own database
+    session, so it never shares a transaction with the caller; it is safe
+    to call from session event hooks. With TASKS_EAGER set (the default
+    when testing) the task runs before this returns.
+
+    Returns:
+        Future: Resolves to fn's return value
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                app.logger.exception(f"Background task {getattr(fn, '__name__', fn)} failed")
+                raise
+
+    if app.config.get('TASKS_EAGER', app.config.get('TESTING', False)):
+        future = Future()
+        try:
+            future.set_result(run())
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _get_executor().submit(run)
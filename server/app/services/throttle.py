@@ -0,0 +1,228 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+try:
+    import redis
+except ImportError:  # Only needed for LOGIN_THROTTLE_BACKEND = 'redis'
+    redis = None
+
+
+class MemoryBuckets:
+    """
+    Token buckets kept in this process. Each key starts full with capacity
+    tokens and regains rate tokens per second; an attempt spends one.
+    Idle buckets are refilled anyway, so the least recently used ones are
+    simply dropped once maxsize keys are tracked.
+    """
+
+    def __init__(self, maxsize=100000, clock=time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume_all(self, limits, cost=1):
+        """
+        Spend cost tokens from every bucket, or from none of them if any
+        bucket is short
+
+        Args:
+            limits (list): (key, capacity, rate) of each bucket
+            cost (int): Tokens to spend; a negative cost gives tokens back
+
+        Returns:
+            tuple: (allowed, seconds until every bucket can pay)
+        """
+        now = self._clock()
+        with self._lock:
+            refilled = []
+            wait = 0.0
+            for key, capacity, rate in limits:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                refilled.append(tokens)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate)
+            allowed = wait == 0.0
+            for (key, capacity, _), tokens in zip(limits, refilled):
+                self._buckets[key] = (min(capacity, tokens - cost) if allowed else tokens, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, wait
+
+    def consume(self, key, capacity, rate):
+        """
+        Spend a token from key's bucket
+
+        Returns:
+            tuple: (allowed, seconds until a token is available)
+        """
+        return self.consume_all([(key, capacity, rate)])
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+# Refill every bucket, then spend from all of them or none, atomically on
+# the server and timed by the server's clock so every worker agrees.
+# KEYS are the buckets; ARGV is the cost then capacity, rate per bucket.
+# Returns {allowed, seconds to wait}.
+_CONSUME_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local refilled = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    refilled[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+end
+local allowed = 0
+if wait == 0 then
+    allowed = 1
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local tokens = refilled[i]
+    if allowed == 1 then
+        tokens = math.min(capacity, tokens - cost)
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisBuckets:
+    """
+    Token buckets shared by every worker through Redis, one hash per key
+    that expires once it would have refilled completely.
+    """
+
+    def __init__(self, url, prefix='throttle:'):
+        if redis is None:
+            raise RuntimeError("LOGIN_THROTTLE_BACKEND = 'redis' requires the redis package")
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._consume = self._client.register_script(_CONSUME_SCRIPT)
+
+    def consume_all(self, limits, cost=1):
+        args = [cost]
+        for _, capacity, rate in limits:
+            args.extend([capacity, rate])
+        allowed, wait = self._consume(keys=[self.prefix + key for key, _, _ in limits], args=args)
+        return bool(allowed), float(wait)
+
+    def consume(self, key, capacity, rate):
+        return self.consume_all([(key, capacity, rate)])
+
+    def reset(self, key):
+        self._client.delete(self.prefix + key)
+
+
+class LoginThrottle:
+    """
+    Limits login attempts per account identifier and per client address
+    before any user lookup or password check, so rejected attempts cost a
+    dictionary or Redis round trip rather than a bcrypt verification.
+
+    Each account identifier gets a bucket of `capacity` attempts refilled
+    at one attempt every `refill_seconds`. Client addresses get a larger
+    bucket that refills faster, since one address (a NAT or proxy) may
+    legitimately serve many users, and successful logins give their
+    address token back. An attempt is only charged when both buckets
+    can pay for it.
+    """
+
+    def __init__(self, buckets, capacity, address_capacity, refill_seconds, address_refill_seconds):
+        self.buckets = buckets
+        self.capacity = capacity
+        self.address_capacity = address_capacity
+        self.rate = 1.0 / refill_seconds
+        self.address_rate = 1.0 / address_refill_seconds
+
+    @staticmethod
+    def _identifier_key(identifier):
+        return f'login:id:{str(identifier).strip().lower()}'
+
+    def _address_limit(self, address):
+        return (f'login:addr:{address}', self.address_capacity, self.address_rate)
+
+    def check(self, identifier, address):
+        """
+        Spend an attempt for identifier and address
+
+        Args:
+            identifier (str): Username or email being logged into
+            address (str): Client address
+
+        Returns:
+            float: 0 if the attempt may proceed, else seconds to wait
+        """
+        limits = [(self._identifier_key(identifier), self.capacity, self.rate)]
+        if address:
+            limits.append(self._address_limit(address))
+        try:
+            allowed, retry_after = self.buckets.consume_all(limits)
+        except Exception as e:
+            # An unreachable shared store must not lock everyone out
+            current_app.logger.warning(f"Login throttle unavailable, allowing attempt: {str(e)}")
+            return 0.0
+        return 0.0 if allowed else retry_after
+
+    def succeeded(self, identifier, address=None):
+        """
+        Give a user who logged in successfully their full allowance back,
+        and return the attempt their address spent
+        """
+        try:
+            self.buckets.reset(self._identifier_key(identifier))
+            if address:
+                self.buckets.consume_all([self._address_limit(address)], cost=-1)
+        except Exception as e:
+            current_app.logger.warning(f"Login throttle unavailable: {str(e)}")
+
+
+def _create_buckets(config):
+    backend = config.get('LOGIN_THROTTLE_BACKEND', 'memory')
+    if backend == 'memory':
+        return MemoryBuckets()
+    if backend == 'redis':
+        return RedisBuckets(config['REDIS_URL'])
+    raise ValueError(f"Unknown LOGIN_THROTTLE_BACKEND: {backend}")
+
+
+def get_login_throttle():
+    """Get the login throttle for the current app"""
+    throttle = current_app.extensions.get('login_throttle')
+    if throttle is None:
+        config = current_app.config
+        throttle = current_app.extensions.setdefault('login_throttle', LoginThrottle(
+            _create_buckets(config),
+            capacity=config.get('LOGIN_THROTTLE_CAPACITY', 5),
+            address_capacity=config.get('LOGIN_THROTTLE_ADDRESS_CAPACITY', 50),
+            refill_seconds=config.get('LOGIN_THROTTLE_REFILL_SECONDS', 12),
+            address_refill_seconds=config.get('LOGIN_THROTTLE_ADDRESS_REFILL_SECONDS', 1),
+        ))
+    return throttle
+
+
+def retry_after_header(seconds):
+    """Retry-After value (whole seconds, at least 1) for a throttle wait"""
+    return str(max(1, math.ceil(seconds)))
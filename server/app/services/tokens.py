@@ -0,0 +1,82 @@
+from flask import current_app, session
+from flask_jwt_extended import create_access_token, create_refresh_token
+
+from app import db
+from app.models import User
+from app.services.identity import Identity
+
+
+def _claims(user):
+    # Everything auth_required needs, so an access token is verified from
+    # its signature alone; 'rev' ties the token to the user's revision
+    return {'rev': user.token_revision, 'username': user.username, 'email': user.email}
+
+
+def issue_tokens(user):
+    """
+    Sign a short-lived access token and a long-lived refresh token for user
+
+    Args:
+        user (User): Authenticated user
+
+    Returns:
+        dict: access_token, refresh_token, token_type and expires_in
+    """
+    identity = str(user.id)
+    expires = current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    return {
+        'access_token': create_access_token(identity=identity, additional_claims=_claims(user)),
+        'refresh_token': create_refresh_token(identity=identity, additional_claims={'rev': user.token_revision}),
+        'token_type': 'Bearer',
+        'expires_in': int(expires.total_seconds()) if hasattr(expires, 'total_seconds') else expires,
+    }
+
+
+def identity_from_claims(claims):
+    """Identity carried by a verified access token; no database read"""
+    return Identity(int(claims['sub']), claims.get('username'), claims.get('email'), claims.get('rev', 0))
+
+
+def start_session(user):
+    """
+    Sign user in on this browser. The session records the user's token
+    revision, so revoking tokens or changing the password ends it too.
+    """
+    session['user_id'] = user.id
+    session['token_revision'] = user.token_revision or 0
+
+
+def session_is_current(identity):
+    """Whether the session cookie was issued at the user's current revision"""
+    return session.get('token_revision', 0) == identity.token_revision
+
+
+def refresh_access_token(claims):
+    """
+    Exchange a verified refresh token for a new access token, unless the
+    user is gone or has revoked their tokens since it was issued
+
+    Args:
+        claims (dict): The refresh token's claims
+
+    Returns:
+        str: A new access token, or None if the refresh token is revoked
+    """
+    user = db.session.get(User, int(claims['sub']))
+    if user is None or claims.get('rev') != user.token_revision:
+        return None
+    return create_access_token(identity=str(user.id), additional_claims=_claims(user))
+
+
+def revoke_tokens(user):
+    """
+    Invalidate every refresh token and session cookie of user by bumping
+    their revision. Outstanding access tokens stay valid until they expire
+    (JWT_ACCESS_TOKEN_EXPIRES), and other workers may accept old sessions
+    until their cached identity expires (AUTH_IDENTITY_CACHE_TTL).
+
+    The caller commits and then calls forget_identity(user.id). Forgetting
+    before the commit would let a concurrent request cache the old
+    revision again.
+    """
+    user.token_revision = (user.token_revision or 0) + 1
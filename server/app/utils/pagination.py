@@ -0,0 +1,69 @@
+import hashlib
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+_CURSOR_SALT = 'pagination-cursor'
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that was not issued for its query"""
+
+
+def query_fingerprint(*parts):
+    """Short stable hash tying a cursor to the query that produced it"""
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:12]
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=_CURSOR_SALT)
+
+
+def encode_cursor(state, fingerprint=None):
+    """
+    Encode keyset pagination state as an opaque, URL-safe string signed
+    with SECRET_KEY, so clients cannot forge or edit it
+
+    Args:
+        state (dict): JSON-serializable position of the last row returned
+        fingerprint (str): Optional query fingerprint checked on decode
+
+    Returns:
+        str: Cursor for the next page
+    """
+    payload = {'s': state}
+    if fingerprint:
+        payload['f'] = fingerprint
+    return _serializer().dumps(payload)
+
+
+def is_row_id(state):
+    """Cursor state check for pages keyed on a row id"""
+    return isinstance(state, int) and not isinstance(state, bool) and state >= 0
+
+
+def decode_cursor(cursor, fingerprint=None, valid=is_row_id):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Args:
+        cursor (str): Cursor from a previous response
+        fingerprint (str): Query fingerprint the cursor must carry
+        valid: Predicate the decoded state must satisfy, checked even
+            though the signature already rules out edited cursors
+
+    Raises:
+        InvalidCursor: If the cursor is forged, malformed or belongs to
+            another query
+    """
+    try:
+        payload = _serializer().loads(cursor)
+    except BadSignature:
+        raise InvalidCursor('Invalid pagination cursor')
+    if not isinstance(payload, dict) or 's' not in payload:
+        raise InvalidCursor('Malformed pagination cursor')
+    if fingerprint and payload.get('f') != fingerprint:
+        raise InvalidCursor('Pagination cursor does not match this query')
+    if valid is not None and not valid(payload['s']):
+        raise InvalidCursor('Malformed pagination cursor')
+    return payload['s']
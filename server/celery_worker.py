@@ -0,0 +1,12 @@
+"""
+Celery worker for background book ingestion (app.services.ingestion).
+
+Run the web app with INGESTION_QUEUE=celery so jobs go to the broker, and
+start workers with:
+
+    celery -A celery_worker.celery worker --loglevel=info
+"""
+from app import app
+from app.services.ingestion import init_celery
+
+celery = app.extensions.get('celery') or init_celery(app)
@@ -0,0 +1,44 @@
+"""Add feed_entries timeline table
+
+Revision ID: 0b6e4d2f9a71
+Revises: f47b2e9d0c13
+Create Date: 2026-10-18 17:05:43.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6e4d2f9a71'
+down_revision = 'f47b2e9d0c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('feed_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=32), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=True),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['actor_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['note_id'], ['notes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_feed_entries_owner_id_id', 'feed_entries', ['owner_id', 'id'], unique=False)
+    op.create_index(op.f('ix_feed_entries_book_id'), 'feed_entries', ['book_id'], unique=False)
+    op.create_index(op.f('ix_feed_entries_note_id'), 'feed_entries', ['note_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_feed_entries_note_id'), table_name='feed_entries')
+    op.drop_index(op.f('ix_feed_entries_book_id'), table_name='feed_entries')
+    op.drop_index('ix_feed_entries_owner_id_id', table_name='feed_entries')
+    op.drop_table('feed_entries')
@@ -0,0 +1,43 @@
+"""Add ingestion_jobs for background book processing
+
+Revision ID: 2a7f4c9e6b13
+Revises: e5b8c1d4a7f2
+Create Date: 2026-10-18 20:12:09.551870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a7f4c9e6b13'
+down_revision = 'e5b8c1d4a7f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingestion_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('stage', sa.String(length=32), nullable=True),
+    sa.Column('progress', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ingestion_jobs_book_id'), 'ingestion_jobs', ['book_id'], unique=False)
+    op.create_index(op.f('ix_ingestion_jobs_user_id'), 'ingestion_jobs', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ingestion_jobs_user_id'), table_name='ingestion_jobs')
+    op.drop_index(op.f('ix_ingestion_jobs_book_id'), table_name='ingestion_jobs')
+    op.drop_table('ingestion_jobs')
@@ -0,0 +1,59 @@
+"""Add SQLite FTS5 search index for books
+
+Revision ID: 3f1c2b7d9e04
+Revises: 8a9483fe4729
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2b7d9e04'
+down_revision = '8a9483fe4729'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 virtual tables only exist on SQLite; other engines use their own index
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE books_fts USING fts5(
+            title, author, genre,
+            content='books', content_rowid='id', tokenize='unicode61'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, author, genre)
+            VALUES (new.id, new.title, new.author, new.genre);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, genre)
+            VALUES ('delete', old.id, old.title, old.author, old.genre);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER books_fts_au AFTER UPDATE OF title, author, genre ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, genre)
+            VALUES ('delete', old.id, old.title, old.author, old.genre);
+            INSERT INTO books_fts(rowid, title, author, genre)
+            VALUES (new.id, new.title, new.author, new.genre);
+        END
+    """)
+    op.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for trigger in ('books_fts_au', 'books_fts_ad', 'books_fts_ai'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS books_fts")
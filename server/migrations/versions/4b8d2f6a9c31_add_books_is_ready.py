@@ -0,0 +1,26 @@
+"""Hide books from others until ingestion has validated their file
+
+Revision ID: 4b8d2f6a9c31
+Revises: 2a7f4c9e6b13
+Create Date: 2026-10-18 22:05:33.918402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8d2f6a9c31'
+down_revision = '2a7f4c9e6b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing books stay listed. A plain ADD COLUMN, since batch mode would
+    # rebuild books on SQLite and drop the books_fts triggers
+    op.add_column('books', sa.Column('is_ready', sa.Boolean(), server_default=sa.true(), nullable=False))
+
+
+def downgrade():
+    op.drop_column('books', 'is_ready')
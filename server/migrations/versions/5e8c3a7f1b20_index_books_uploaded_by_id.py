@@ -0,0 +1,26 @@
+"""Index books.uploaded_by_id for visibility checks
+
+Revision ID: 5e8c3a7f1b20
+Revises: d92f6a1b3c57
+Create Date: 2026-10-18 15:42:08.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8c3a7f1b20'
+down_revision = 'd92f6a1b3c57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A plain CREATE INDEX; batch mode would rebuild books on SQLite and
+    # drop the books_fts triggers
+    op.create_index('ix_books_uploaded_by_id', 'books', ['uploaded_by_id'])
+
+
+def downgrade():
+    op.drop_index('ix_books_uploaded_by_id', table_name='books')
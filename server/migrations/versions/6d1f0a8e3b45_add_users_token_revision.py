@@ -0,0 +1,26 @@
+"""Add users.token_revision for refresh token revocation
+
+Revision ID: 6d1f0a8e3b45
+Revises: 0b6e4d2f9a71
+Create Date: 2026-10-18 17:48:20.551039
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d1f0a8e3b45'
+down_revision = '0b6e4d2f9a71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_revision', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_revision')
@@ -0,0 +1,26 @@
+"""Add file_metadata.sha256
+
+Revision ID: 9c2a5e7d1f38
+Revises: 6d1f0a8e3b45
+Create Date: 2026-10-18 18:20:07.632914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2a5e7d1f38'
+down_revision = '6d1f0a8e3b45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file_metadata', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('file_metadata', schema=None) as batch_op:
+        batch_op.drop_column('sha256')
@@ -0,0 +1,59 @@
+"""Store friendships in canonical (low_id, high_id) order
+
+Revision ID: a3d81f6c5e92
+Revises: 5e8c3a7f1b20
+Create Date: 2026-10-18 16:05:37.510846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d81f6c5e92'
+down_revision = '5e8c3a7f1b20'
+branch_labels = None
+depends_on = None
+
+# When a pair has rows in both directions the one kept is the most
+# restrictive status (blocked, then accepted, then pending), then the oldest
+STATUS_PRIORITY = "CASE {0}.status WHEN 'blocked' THEN 0 WHEN 'accepted' THEN 1 ELSE 2 END"
+
+
+def upgrade():
+    op.add_column('friendships', sa.Column('low_id', sa.Integer(), nullable=True))
+    op.add_column('friendships', sa.Column('high_id', sa.Integer(), nullable=True))
+
+    op.execute(f"""
+        DELETE FROM friendships WHERE id IN (
+            SELECT f.id FROM friendships f
+            JOIN friendships o ON o.user_id = f.friend_id AND o.friend_id = f.user_id
+            WHERE {STATUS_PRIORITY.format('o')} < {STATUS_PRIORITY.format('f')}
+               OR ({STATUS_PRIORITY.format('o')} = {STATUS_PRIORITY.format('f')} AND o.id < f.id)
+        )
+    """)
+    op.execute("""
+        UPDATE friendships SET
+            low_id = CASE WHEN user_id < friend_id THEN user_id ELSE friend_id END,
+            high_id = CASE WHEN user_id < friend_id THEN friend_id ELSE user_id END
+    """)
+
+    with op.batch_alter_table('friendships', schema=None) as batch_op:
+        batch_op.alter_column('low_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('high_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_constraint('_unique_friendship', type_='unique')
+        batch_op.create_unique_constraint('_unique_friendship_pair', ['low_id', 'high_id'])
+        batch_op.create_check_constraint('_canonical_friendship_pair', 'low_id < high_id')
+        batch_op.create_index('ix_friendships_user_id_status', ['user_id', 'status'])
+        batch_op.create_index('ix_friendships_friend_id_status', ['friend_id', 'status'])
+
+
+def downgrade():
+    with op.batch_alter_table('friendships', schema=None) as batch_op:
+        batch_op.drop_index('ix_friendships_friend_id_status')
+        batch_op.drop_index('ix_friendships_user_id_status')
+        batch_op.drop_constraint('_canonical_friendship_pair', type_='check')
+        batch_op.drop_constraint('_unique_friendship_pair', type_='unique')
+        batch_op.create_unique_constraint('_unique_friendship', ['user_id', 'friend_id'])
+        batch_op.drop_column('high_id')
+        batch_op.drop_column('low_id')
@@ -0,0 +1,39 @@
+"""Add PostgreSQL tsvector search index for books
+
+Revision ID: b7e5a0c4d218
+Revises: 3f1c2b7d9e04
+Create Date: 2026-10-18 09:31:05.472913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e5a0c4d218'
+down_revision = '3f1c2b7d9e04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Generated tsvector columns need PostgreSQL 12+; SQLite uses FTS5 instead
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("""
+        ALTER TABLE books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(author, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(genre, '')), 'C')
+        ) STORED
+    """)
+    op.create_index('ix_books_search_vector', 'books', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_books_search_vector', table_name='books')
+    op.execute("ALTER TABLE books DROP COLUMN search_vector")
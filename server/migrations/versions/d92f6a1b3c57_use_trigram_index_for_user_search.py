@@ -0,0 +1,32 @@
+"""Add a trigram index for user search
+
+Revision ID: d92f6a1b3c57
+Revises: c41d8e2a6f93
+Create Date: 2026-10-18 13:47:21.905384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd92f6a1b3c57'
+down_revision = 'c41d8e2a6f93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite matches usernames with the application's in-process trigram index
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE INDEX ix_users_username_trgm ON users USING gin (username gin_trgm_ops)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_users_username_trgm', table_name='users')
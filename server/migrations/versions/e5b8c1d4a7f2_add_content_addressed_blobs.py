@@ -0,0 +1,54 @@
+"""Add content-addressed blobs referenced by books
+
+Revision ID: e5b8c1d4a7f2
+Revises: 9c2a5e7d1f38
+Create Date: 2026-10-18 19:05:41.208336
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b8c1d4a7f2'
+down_revision = '9c2a5e7d1f38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('content_type', sa.String(length=255), nullable=True),
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key'),
+    sa.UniqueConstraint('sha256')
+    )
+
+    # A plain ADD COLUMN; batch mode would rebuild books on SQLite and drop
+    # the books_fts triggers, and SQLite cannot add the foreign key later
+    op.add_column('books', sa.Column('blob_id', sa.Integer(), nullable=True))
+    if op.get_bind().dialect.name != 'sqlite':
+        op.create_foreign_key('fk_books_blob_id_blobs', 'books', 'blobs', ['blob_id'], ['id'])
+    op.create_index(op.f('ix_books_blob_id'), 'books', ['blob_id'], unique=False)
+
+    with op.batch_alter_table('file_metadata', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('upload_id', sa.String(length=32), nullable=True))
+        batch_op.create_unique_constraint('uq_file_metadata_upload_id', ['upload_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('file_metadata', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_file_metadata_upload_id', type_='unique')
+        batch_op.drop_column('upload_id')
+
+    op.drop_index(op.f('ix_books_blob_id'), table_name='books')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('fk_books_blob_id_blobs', 'books', type_='foreignkey')
+    op.drop_column('books', 'blob_id')
+    op.drop_table('blobs')
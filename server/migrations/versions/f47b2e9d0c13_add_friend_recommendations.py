@@ -0,0 +1,35 @@
+"""Add precomputed friend recommendations
+
+Revision ID: f47b2e9d0c13
+Revises: a3d81f6c5e92
+Create Date: 2026-10-18 16:31:12.904725
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f47b2e9d0c13'
+down_revision = 'a3d81f6c5e92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('friend_recommendations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('candidates', sa.JSON(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Shared-upload counts join books on lower(author). A plain CREATE
+    # INDEX; batch mode would rebuild books on SQLite and drop the
+    # books_fts triggers
+    op.create_index('ix_books_lower_author', 'books', [sa.text('lower(author)')])
+
+
+def downgrade():
+    op.drop_index('ix_books_lower_author', table_name='books')
+    op.drop_table('friend_recommendations')
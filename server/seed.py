@@ -6,7 +6,7 @@ from app.models.book import Book
 from app.models.note import Note
 from app.models.file_metadata import FileMetadata
 from app.models.friendship import Friendship
-from app import bcrypt
+from app.services.auth_service import hash_password
 from ipdb import set_trace
 
 def seed_data():
@@ -23,17 +23,17 @@ def seed_data():
         User(
             username='liam', 
             email='liam@example.com', 
-            password_hash=bcrypt.generate_password_hash('password123').decode('utf-8')
+            password_hash=hash_password('password123')
         ),
         User(
             username='alice', 
             email='alice@example.com', 
-            password_hash=bcrypt.generate_password_hash('alicepass').decode('utf-8')
+            password_hash=hash_password('alicepass')
         ),
         User(
             username='bob', 
             email='bob@example.com', 
-            password_hash=bcrypt.generate_password_hash('bobpass').decode('utf-8')
+            password_hash=hash_password('bobpass')
         )
     ]
     
@@ -8,13 +8,30 @@ root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 # Add the project root directory to the Python path
 sys.path.insert(0, root_dir)
 
+from flask import g, has_app_context
+from flask.testing import FlaskClient
+
 from app import create_app, db  # Import app factory
 from app.models import User, Friendship
 
+
+class IsolatedClient(FlaskClient):
+    """
+    Test client whose requests start with an empty g, as they would on a
+    server, even when they run inside the test's app context
+    """
+
+    def open(self, *args, **kwargs):
+        if has_app_context():
+            g.__dict__.clear()
+        return super().open(*args, **kwargs)
+
+
 @pytest.fixture(scope="module")
 def app():
     """Set up the Flask application for testing."""
     flask_app = create_app(testing=True)  # Ensure testing mode
+    flask_app.test_client_class = IsolatedClient
     flask_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
     flask_app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
@@ -69,4 +86,20 @@ def set_session(test_client, create_user):
             sess['user_id'] = user.id
             return sess
 
-    return _set_session
\ No newline at end of file
+    return _set_session
+
+@pytest.fixture
+def app_context(app):
+    """
+    Push an app context over freshly created, empty tables. Services the
+    test created lazily (caches, indexes, storage) are dropped afterwards
+    so the next test does not see rows that no longer exist.
+    """
+    extensions = set(app.extensions)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    for name in set(app.extensions) - extensions:
+        app.extensions.pop(name)
@@ -0,0 +1,96 @@
+import pytest
+
+from app import db
+from app.models import Book, Friendship, User
+from app.services.access_control import can_view, filter_visible, visibility_clause, visible_uploader_ids
+from app.services.friend_graph import get_friend_graph
+
+
+@pytest.fixture
+def users(app_context):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x')
+             for name in ('liam', 'alice', 'bob')]
+    db.session.add_all(users)
+    db.session.commit()
+    db.session.add(Friendship(user_id=users[1].id, friend_id=users[0].id, status='accepted'))
+    db.session.commit()
+    return users
+
+
+def add_book(owner, title, is_public=False, is_ready=True):
+    book = Book(title=title, author='Ursula K. Le Guin', is_public=is_public, is_ready=is_ready,
+                uploaded_by_id=owner.id, s3_url='local://books/x', file_size=1, file_type='txt')
+    db.session.add(book)
+    db.session.commit()
+    return book
+
+
+def visible_titles(user):
+    return sorted(title for (title,) in Book.query.with_entities(Book.title).filter(visibility_clause(user.id)))
+
+
+def test_owner_friend_stranger_and_public(users):
+    liam, alice, bob = users
+    private = add_book(alice, 'The Dispossessed')
+    public = add_book(bob, 'The Lathe of Heaven', is_public=True)
+
+    assert can_view(alice.id, private)
+    assert can_view(liam.id, private)
+    assert not can_view(bob.id, private)
+    assert all(can_view(user.id, public) for user in users)
+
+    assert visible_titles(alice) == ['The Dispossessed', 'The Lathe of Heaven']
+    assert visible_titles(liam) == ['The Dispossessed', 'The Lathe of Heaven']
+    assert visible_titles(bob) == ['The Lathe of Heaven']
+
+
+def test_pending_and_blocked_friendships_grant_nothing(users):
+    liam, alice, bob = users
+    db.session.add(Friendship(user_id=bob.id, friend_id=liam.id, status='pending'))
+    db.session.commit()
+    private = add_book(bob, 'Always Coming Home')
+
+    assert not can_view(liam.id, private)
+    Friendship.between(liam.id, bob.id).one().status = 'blocked'
+    db.session.commit()
+    assert not can_view(liam.id, private)
+
+
+def test_books_awaiting_ingestion_are_only_visible_to_the_uploader(users):
+    liam, alice, _ = users
+    book = add_book(alice, 'The Word for World Is Forest', is_public=True, is_ready=False)
+
+    assert can_view(alice.id, book)
+    assert not can_view(liam.id, book)
+    assert visible_titles(alice) == ['The Word for World Is Forest']
+    assert visible_titles(liam) == []
+
+
+def test_filter_visible_keeps_order_and_drops_unknown_ids(users):
+    liam, alice, bob = users
+    strangers = add_book(bob, 'Tehanu').id
+    friends = add_book(alice, 'Tales from Earthsea').id
+    public = add_book(bob, 'The Farthest Shore', is_public=True).id
+
+    assert filter_visible(liam.id, [public, strangers, 999, friends]) == [public, friends]
+    assert filter_visible(bob.id, [friends, strangers, public]) == [strangers, public]
+    assert filter_visible(liam.id, []) == []
+
+
+def test_visible_uploaders_are_computed_once_per_request(users, app_context, monkeypatch):
+    liam, alice, bob = users
+    graph = get_friend_graph()
+    calls = []
+    friends = graph.friends
+    monkeypatch.setattr(graph, 'friends', lambda user_id: calls.append(user_id) or friends(user_id))
+
+    with app_context.test_request_context():
+        assert visible_uploader_ids(liam.id) == {liam.id, alice.id}
+        assert visible_uploader_ids(str(liam.id)) == {liam.id, alice.id}
+        assert calls == [liam.id]
+
+        # A committed friendship drops the memo within the same request
+        db.session.add(Friendship(user_id=liam.id, friend_id=bob.id, status='accepted'))
+        db.session.commit()
+        assert visible_uploader_ids(liam.id) == {liam.id, alice.id, bob.id}
+        assert calls == [liam.id, liam.id]
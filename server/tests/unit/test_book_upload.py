@@ -0,0 +1,82 @@
+import io
+
+import pytest
+
+from app import db
+from app.models import Blob, Book, FileMetadata, User
+
+CONTENT = b'It was a pleasure to burn.\n'
+
+
+@pytest.fixture
+def storage_root(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'STORAGE_BACKEND', 'local')
+    monkeypatch.setitem(app.config, 'LOCAL_STORAGE_ROOT', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def book(app_context, storage_root):
+    liam = User(username='liam', email='liam@example.com', password_hash='x')
+    db.session.add(liam)
+    db.session.commit()
+    book = Book(title='Fahrenheit 451', author='Ray Bradbury', uploaded_by_id=liam.id,
+                s3_url='local://books/x', file_size=1, file_type='txt')
+    db.session.add(book)
+    db.session.commit()
+    return book
+
+
+def upload(client, book, filename='fahrenheit.txt'):
+    return client.post(f'/api/books/{book.id}/upload', data={
+        'file': (io.BytesIO(CONTENT), filename, 'text/plain'),
+    }, content_type='multipart/form-data')
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+
+def stored_files(root):
+    blobs = root / 'blobs'
+    return sorted(path.name for path in blobs.iterdir()) if blobs.exists() else []
+
+
+def test_replacing_a_file_requires_the_owner(book, test_client, storage_root):
+    assert upload(test_client, book).status_code == 401
+
+    stranger = User(username='alice', email='alice@example.com', password_hash='x')
+    db.session.add(stranger)
+    db.session.commit()
+    login(test_client, stranger.id)
+    assert upload(test_client, book).status_code == 403
+    assert stored_files(storage_root) == []
+
+
+def test_unsupported_types_are_not_stored(book, test_client, storage_root):
+    login(test_client, book.uploaded_by_id)
+    response = upload(test_client, book, 'fahrenheit.epub')
+    assert response.status_code == 400
+    assert stored_files(storage_root) == []
+
+
+def test_replacement_is_stored_and_recorded(book, test_client, storage_root):
+    login(test_client, book.uploaded_by_id)
+    response = upload(test_client, book)
+    assert response.status_code == 201
+    assert response.get_json()['file_type'] == 'txt'
+    blob = Blob.query.one()
+    assert db.session.get(Book, book.id).blob_id == blob.id
+    assert FileMetadata.query.one().sha256 == blob.sha256
+    assert stored_files(storage_root) == [blob.key.rsplit('/', 1)[1]]
+
+
+def test_failed_commit_leaves_no_stored_object(book, test_client, storage_root, monkeypatch):
+    login(test_client, book.uploaded_by_id)
+    monkeypatch.setattr('app.routes.books.release_blobs', lambda _: 1 / 0)
+
+    response = upload(test_client, book)
+    assert response.status_code == 500
+    assert Blob.query.count() == 0
+    assert stored_files(storage_root) == []
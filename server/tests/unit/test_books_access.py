@@ -0,0 +1,45 @@
+import pytest
+
+from app import db
+from app.models import Book, Friendship, User
+
+
+@pytest.fixture
+def users(app_context):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x')
+             for name in ('liam', 'alice', 'bob')]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def add_book(owner, title, is_public=True, is_ready=True):
+    book = Book(title=title, author='Frank Herbert', is_public=is_public, is_ready=is_ready,
+                uploaded_by_id=owner.id, s3_url='local://books/x', file_size=1, file_type='txt')
+    db.session.add(book)
+    db.session.commit()
+    return book.id
+
+
+def test_access_check_follows_visibility_rules(users, test_client):
+    liam, alice, bob = users
+    db.session.add(Friendship(user_id=liam.id, friend_id=alice.id, status='accepted'))
+    db.session.commit()
+    public = add_book(bob, 'Dune')
+    friends_private = add_book(alice, 'Children of Dune', is_public=False)
+    strangers_private = add_book(bob, 'Heretics of Dune', is_public=False)
+    not_ready = add_book(bob, 'Chapterhouse', is_ready=False)
+    own_not_ready = add_book(liam, 'Dune Messiah', is_ready=False)
+    with test_client.session_transaction() as session:
+        session['user_id'] = liam.id
+
+    ids = [public, friends_private, strangers_private, not_ready, own_not_ready, 999]
+    response = test_client.post('/api/books/access', json={'book_ids': ids})
+    assert response.status_code == 200
+    books = response.get_json()['books']
+    assert [(book['id'], book['accessible']) for book in books] == [
+        (public, True), (friends_private, True), (strangers_private, False),
+        (not_ready, False), (own_not_ready, True), (999, False),
+    ]
+    assert books[1]['uploader'] == {'id': alice.id, 'username': 'alice'}
+    assert set(books[2]) == {'id', 'accessible'}
@@ -0,0 +1,47 @@
+from app import db
+from app.models import Book, BookPage, PagePosting
+from app.services.content_search import index_book_content, search_pages
+
+
+def add_book(title, pages, is_public=True):
+    book = Book(title=title, author='Frank Herbert', is_public=is_public,
+                s3_url='local://books/x', file_size=1, file_type='txt')
+    db.session.add(book)
+    db.session.commit()
+    index_book_content(book.id, pages)
+    db.session.commit()
+    return book.id
+
+
+def test_index_book_content_replaces_only_that_books_pages(app_context):
+    dune = add_book('Dune', ['The spice must flow', '', 'Spice spice'])
+    other = add_book('Other', ['spice trade'])
+    assert [(page.page_number, page.token_count) for page in BookPage.query.filter_by(book_id=dune)] == [(1, 4), (3, 2)]
+    assert db.session.get(PagePosting, ('spice', dune, 3)).term_frequency == 2
+
+    assert index_book_content(dune, ['Arrakis']) == 1
+    db.session.commit()
+    assert [posting.term for posting in PagePosting.query.filter_by(book_id=dune)] == ['arrakis']
+    assert PagePosting.query.filter_by(book_id=other).count() == 2
+
+
+def test_search_pages_requires_every_term_and_ranks_by_frequency(app_context):
+    dune = add_book('Dune', ['spice melange spice spice', 'spice only', 'melange only'])
+    hits, total = search_pages('spice mel')
+    assert total == 1 and [(hit['book_id'], hit['page_number']) for hit in hits] == [(dune, 1)]
+    assert 'melange' in hits[0]['snippet']
+
+    hits, total = search_pages('spice')
+    assert total == 2
+    assert [hit['page_number'] for hit in hits] == [1, 2]
+    assert hits[0]['score'] > hits[1]['score']
+    assert search_pages('spice', limit=1, offset=1)[0][0]['page_number'] == 2
+    assert search_pages('spice arrakis') == ([], 0)
+
+
+def test_search_pages_applies_book_filters(app_context):
+    add_book('Public', ['sandworm'])
+    hidden = add_book('Hidden', ['sandworm sandworm'], is_public=False)
+    hits, total = search_pages('sandworm', filters=(Book.is_public == True,))
+    assert total == 1 and hidden not in [hit['book_id'] for hit in hits]
+    assert search_pages('sandworm')[1] == 2
@@ -0,0 +1,58 @@
+import pytest
+
+from app import db
+from app.models import Book, BookPage, PagePosting, User
+from app.services.content_search import index_book_content
+from app.services.search import get_book_index, get_suggestion_index
+
+
+@pytest.fixture
+def users(app_context):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x') for name in ('liam', 'alice')]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def add_book(owner, title, pages):
+    book = Book(title=title, author='Frank Herbert', uploaded_by_id=owner.id,
+                s3_url='local://books/x', file_size=1, file_type='txt')
+    db.session.add(book)
+    db.session.commit()
+    index_book_content(book.id, pages)
+    db.session.commit()
+    return book.id
+
+
+def indexed_books(query):
+    return {book_id for book_id, _ in get_book_index().search(query)}
+
+
+def test_deleting_an_account_removes_its_books_content(users, test_client):
+    liam, alice = users
+    add_book(liam, 'Dune', ['The spice must flow', 'Arrakis'])
+    kept = add_book(alice, 'Children of Dune', ['Spice again'])
+    with test_client.session_transaction() as session:
+        session['user_id'] = liam.id
+
+    assert test_client.delete('/api/users/delete').status_code == 200
+    assert [page.book_id for page in BookPage.query] == [kept]
+    assert {posting.book_id for posting in PagePosting.query} == {kept}
+
+
+def test_deleting_an_account_unindexes_its_books(users, test_client, monkeypatch):
+    monkeypatch.setitem(test_client.application.config, 'SEARCH_BACKEND', 'memory')
+    liam, alice = users
+    gone = add_book(liam, 'Dune', [])
+    kept = add_book(alice, 'Dune Messiah', [])
+    with test_client.session_transaction() as session:
+        session['user_id'] = alice.id
+    # Builds the indexes while both books exist
+    assert len(test_client.get('/api/search/suggest?q=dune').get_json()['suggestions']) == 2
+    assert indexed_books('dune') == {gone, kept}
+
+    with test_client.session_transaction() as session:
+        session['user_id'] = liam.id
+    assert test_client.delete('/api/users/delete').status_code == 200
+    assert indexed_books('dune') == {kept}
+    assert get_suggestion_index().search('dune', limit=10) == [('title', 'Dune Messiah')]
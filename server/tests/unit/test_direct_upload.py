@@ -0,0 +1,154 @@
+import hashlib
+import io
+
+import pytest
+
+from app import db
+from app.models import Blob, Book, User
+from app.services.storage import ObjectInfo, get_storage
+
+CONTENT = b'It was a pleasure to burn.\n'
+
+
+@pytest.fixture
+def storage_root(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'STORAGE_BACKEND', 'local')
+    monkeypatch.setitem(app.config, 'LOCAL_STORAGE_ROOT', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def users(app_context, storage_root):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x') for name in ('liam', 'alice')]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def client_for(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+    return client
+
+
+def start_upload(client, content=CONTENT, **overrides):
+    response = client.post('/api/books/uploads', json={
+        'filename': 'fahrenheit.txt', 'size': len(content), 'sha256': hashlib.sha256(content).hexdigest(),
+        'title': 'Fahrenheit 451', 'author': 'Ray Bradbury', **overrides,
+    })
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def put(client, intent, content=CONTENT):
+    return client.put(intent['url'], data=content, headers=intent['headers'])
+
+
+def complete(client, intent):
+    return client.post('/api/books/uploads/complete', json={'upload_token': intent['upload_token']})
+
+
+def stored_files(root):
+    return sorted(path.name for path in (root / 'blobs').iterdir())
+
+
+def test_known_content_must_still_be_uploaded_and_is_shared(app_context, users, storage_root):
+    liam, alice = users
+    first = client_for(app_context, liam)
+    intent = start_upload(first)
+    assert put(first, intent).status_code == 200
+    book = complete(first, intent).get_json()
+    sha256 = hashlib.sha256(CONTENT).hexdigest()
+    assert sha256 not in book['s3_url']
+
+    # Knowing the hash is not enough to claim the content
+    second = client_for(app_context, alice)
+    claim = start_upload(second)
+    assert 'url' in claim
+    response = complete(second, claim)
+    assert response.status_code == 409
+
+    assert put(second, claim).status_code == 200
+    response = complete(second, claim)
+    assert response.status_code == 201
+    assert response.get_json()['s3_url'] == book['s3_url']
+    assert Blob.query.one().ref_count == 2
+    # The second copy is dropped once the book shares the first
+    assert stored_files(storage_root) == [book['s3_url'].rsplit('/', 1)[1]]
+
+
+def test_direct_upload_creates_the_book_once(app_context, users, storage_root):
+    liam, _ = users
+    client = client_for(app_context, liam)
+    intent = start_upload(client, is_public=False)
+    assert intent['method'] == 'PUT'
+    # The signed checksum is enforced on the PUT itself
+    assert put(client, intent, CONTENT.upper()).status_code == 400
+    assert put(client, intent).status_code == 200
+
+    response = complete(client, intent)
+    assert response.status_code == 201
+    book = response.get_json()
+    assert (book['title'], book['is_public'], book['file_type']) == ('Fahrenheit 451', False, 'txt')
+    job = client.get(f"/api/jobs/{book['ingestion_job']['id']}").get_json()
+    assert (job['book_id'], job['status']) == (book['id'], 'succeeded')
+
+    retry = complete(client, intent)
+    assert retry.status_code == 200
+    assert retry.get_json()['id'] == book['id']
+    assert retry.get_json()['ingestion_job']['id'] == book['ingestion_job']['id']
+    assert Blob.query.one().ref_count == 1
+
+
+def uploaded_key(intent):
+    return get_storage().read_token(intent['url'].rsplit('/', 1)[1], 'put')['key']
+
+
+@pytest.mark.parametrize('stored, problem', [
+    (CONTENT[:-1], 'size'),
+    (CONTENT.upper(), 'checksum'),
+])
+def test_mismatched_objects_are_deleted(app_context, users, storage_root, stored, problem):
+    liam, _ = users
+    client = client_for(app_context, liam)
+    intent = start_upload(client)
+    # As stored by a backend that did not enforce the signed headers
+    key = uploaded_key(intent)
+    get_storage().save(io.BytesIO(stored), key)
+
+    response = complete(client, intent)
+    assert response.status_code == 422
+    assert problem in response.get_json()['error']
+    assert get_storage().stat(key) is None
+    assert Book.query.count() == 0 and Blob.query.count() == 0
+
+
+def test_wrong_content_type_is_rejected(app_context, users, storage_root, monkeypatch):
+    liam, _ = users
+    client = client_for(app_context, liam)
+    intent = start_upload(client)
+    assert put(client, intent).status_code == 200
+    key = uploaded_key(intent)
+    # The local backend cannot tell; S3 reports what the PUT stored
+    monkeypatch.setattr(get_storage(), 'stat', lambda _: ObjectInfo(len(CONTENT), 'application/pdf'))
+
+    response = complete(client, intent)
+    assert response.status_code == 422
+    assert 'content type' in response.get_json()['error']
+    assert not (storage_root / key).exists()
+
+
+def test_upload_token_belongs_to_its_user(app_context, users, storage_root):
+    liam, alice = users
+    client = client_for(app_context, liam)
+    intent = start_upload(client)
+    assert put(client, intent).status_code == 200
+
+    response = complete(client_for(app_context, alice), intent)
+    assert response.status_code == 403
+    assert Book.query.count() == 0
+    assert get_storage().stat(uploaded_key(intent)) is not None
+
+    response = client.post('/api/books/uploads/complete', json={'upload_token': 'forged'})
+    assert response.status_code == 400
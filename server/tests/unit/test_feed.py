@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Book, FeedEntry, Friendship, Note, User
+from app.services.feed import backfill_feeds, publish_book, publish_note, trim_feeds
+
+
+@pytest.fixture
+def users(app_context):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x')
+             for name in ('liam', 'alice', 'bob', 'carol')]
+    db.session.add_all(users)
+    db.session.commit()
+    liam, alice, bob, carol = users
+    db.session.add_all([
+        Friendship(user_id=liam.id, friend_id=alice.id, status='accepted'),
+        Friendship(user_id=bob.id, friend_id=liam.id, status='accepted'),
+        Friendship(user_id=alice.id, friend_id=carol.id, status='accepted'),
+    ])
+    db.session.commit()
+    return users
+
+
+def add_book(owner, title, is_public=True):
+    book = Book(title=title, author='N. K. Jemisin', is_public=is_public, uploaded_by_id=owner.id,
+                s3_url='local://books/x', file_size=1, file_type='txt')
+    db.session.add(book)
+    db.session.commit()
+    publish_book(book)
+    return book
+
+
+def add_note(author, book, content='Stone eaters'):
+    note = Note(content=content, page_number=3, book_id=book.id, user_id=author.id)
+    db.session.add(note)
+    db.session.commit()
+    publish_note(note, book)
+    return note
+
+
+def feed_of(user):
+    return sorted((entry.kind, entry.actor_id, entry.book_id) for entry in FeedEntry.query.filter_by(owner_id=user.id))
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+
+
+def test_activity_reaches_friends_only(users, test_client):
+    liam, alice, bob, carol = users
+    book = add_book(liam, 'The Fifth Season')
+
+    assert feed_of(alice) == feed_of(bob) == [('book_uploaded', liam.id, book.id)]
+    assert feed_of(liam) == feed_of(carol) == []
+
+    login(test_client, alice)
+    body = test_client.get('/api/feed').get_json()
+    assert [(entry['title'], entry['actor_username']) for entry in body['entries']] == [('The Fifth Season', 'liam')]
+
+
+def test_notes_on_private_books_skip_friends_who_cannot_see_the_book(users):
+    liam, alice, bob, carol = users
+    book = add_book(liam, 'The Obelisk Gate', is_public=False)
+    add_note(alice, book)
+
+    # carol is alice's friend but not liam's
+    assert feed_of(liam) == [('note_created', alice.id, book.id)]
+    assert feed_of(carol) == []
+
+    public = add_book(liam, 'The Stone Sky')
+    add_note(alice, public)
+    assert feed_of(carol) == [('note_created', alice.id, public.id)]
+
+
+def test_trim_keeps_the_newest_entries(users, app, monkeypatch):
+    liam, alice, bob, _ = users
+    monkeypatch.setitem(app.config, 'FEED_MAX_LENGTH', 2)
+    books = [add_book(liam, title) for title in ('The City We Became', 'The World We Make', 'Dreamblood')]
+
+    assert feed_of(alice) == [('book_uploaded', liam.id, book.id) for book in books[1:]]
+    trim_feeds([alice.id], max_length=1)
+    assert feed_of(alice) == [('book_uploaded', liam.id, books[2].id)]
+    assert len(feed_of(bob)) == 2
+
+
+def test_deleting_a_book_or_note_retracts_its_entries(users, test_client):
+    liam, alice, bob, carol = users
+    book = add_book(liam, 'The Killing Moon')
+    note = add_note(alice, book)
+    kept = add_note(alice, book, 'Dreaming')
+    assert feed_of(carol) == [('note_created', alice.id, book.id)] * 2
+
+    login(test_client, alice)
+    assert test_client.delete(f'/api/notes/{note.id}').status_code == 200
+    assert [entry.note_id for entry in FeedEntry.query.filter_by(owner_id=carol.id)] == [kept.id]
+
+    login(test_client, liam)
+    assert test_client.delete(f'/api/books/{book.id}').status_code == 204
+    assert FeedEntry.query.count() == 0
+
+
+def test_backfill_delivers_lost_fan_outs_once(users, app):
+    liam, alice, bob, carol = users
+    book = add_book(liam, 'The Broken Kingdoms')
+    add_note(alice, book)
+    old = add_book(liam, 'The Hundred Thousand Kingdoms')
+    old.created_at = datetime.utcnow() - timedelta(days=3)
+    db.session.commit()
+    delivered = {user.id: feed_of(user) for user in users}
+
+    # As if the process running the fan-outs had died
+    FeedEntry.query.delete()
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['feed', 'backfill', '--hours', '24'])
+    assert result.exit_code == 0, result.output
+    assert 'Wrote 4 feed entries' in result.output
+    delivered[alice.id].remove(('book_uploaded', liam.id, old.id))
+    delivered[bob.id].remove(('book_uploaded', liam.id, old.id))
+    assert {user.id: feed_of(user) for user in users} == delivered
+
+    # Feeds that already have an activity are skipped
+    assert backfill_feeds(datetime.utcnow() - timedelta(days=7)) == 2
+    assert len(feed_of(alice)) == 2
@@ -0,0 +1,54 @@
+import io
+import zipfile
+
+from app.services.file_processor import extract_pages, paginate_text
+
+DOCX_XML = (
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+    '<w:p><w:r><w:t>Chapter </w:t></w:r><w:r><w:t>One</w:t></w:r></w:p>'
+    '<w:tbl><w:tr><w:tc><w:p><w:r><w:t>Arrakis</w:t></w:r></w:p></w:tc></w:tr></w:tbl>'
+    '</w:body></w:document>'
+)
+
+CONTAINER_XML = (
+    '<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+    '<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+    '</rootfiles></container>'
+)
+
+PACKAGE_XML = (
+    '<package xmlns="http://www.idpf.org/2007/opf">'
+    '<manifest><item id="c1" href="one.xhtml"/><item id="c2" href="text/two.xhtml"/></manifest>'
+    '<spine><itemref idref="c2"/><itemref idref="c1"/></spine></package>'
+)
+
+
+def zipped(files):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as z:
+        for name, content in files.items():
+            z.writestr(name, content)
+    archive.seek(0)
+    return archive
+
+
+def test_docx_paragraphs_are_extracted_including_tables():
+    pages = extract_pages(zipped({'word/document.xml': DOCX_XML}), 'docx')
+    assert pages == ['Chapter One\nArrakis']
+
+
+def test_epub_chapters_follow_the_spine():
+    epub = zipped({
+        'META-INF/container.xml': CONTAINER_XML,
+        'OEBPS/content.opf': PACKAGE_XML,
+        'OEBPS/one.xhtml': '<html><head><title>x</title></head><body><p>First written</p></body></html>',
+        'OEBPS/text/two.xhtml': '<html><body><p>Read first</p><script>ignored()</script></body></html>',
+    })
+    assert extract_pages(epub, 'epub') == ['Read first', 'First written']
+
+
+def test_txt_honours_form_feeds_and_paginates_long_text():
+    assert extract_pages(io.BytesIO(b'page one\fpage  two'), '.TXT') == ['page one', 'page two']
+    pages = paginate_text('word ' * 100, page_size=60)
+    assert all(len(page) <= 60 for page in pages)
+    assert ' '.join(pages).split() == ['word'] * 100
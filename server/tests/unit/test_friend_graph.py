@@ -0,0 +1,95 @@
+import pytest
+
+from app import db
+from app.models import Book, Friendship, User
+from app.services.friend_graph import get_friend_graph
+
+
+@pytest.fixture
+def users(app, app_context, monkeypatch):
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'memory')
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x')
+             for name in ('liam', 'alice', 'bob')]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+
+
+def searched_titles(client):
+    response = client.get('/api/search?q=earthsea&type=books')
+    assert response.status_code == 200
+    return [book['title'] for book in response.get_json()['books']]
+
+
+def test_neighbors_cover_both_directions(users):
+    liam, alice, bob = users
+    db.session.add_all([
+        Friendship(user_id=liam.id, friend_id=alice.id, status='accepted'),
+        Friendship(user_id=bob.id, friend_id=liam.id, status='pending'),
+    ])
+    db.session.commit()
+    graph = get_friend_graph()
+
+    assert dict(graph.neighbors(liam.id)) == {alice.id: 'accepted', bob.id: 'pending'}
+    assert dict(graph.neighbors(bob.id)) == {liam.id: 'pending'}
+    assert graph.friends(alice.id) == {liam.id}
+    assert graph.status(bob.id, alice.id) is None
+    many = graph.neighbors_many([liam.id, alice.id, str(bob.id)])
+    assert set(many) == {liam.id, alice.id, bob.id}
+    assert dict(many[alice.id]) == {liam.id: 'accepted'}
+
+
+def test_committed_changes_invalidate_both_users(users):
+    liam, alice, _ = users
+    graph = get_friend_graph()
+    assert not graph.are_friends(liam.id, alice.id)
+
+    friendship = Friendship(user_id=liam.id, friend_id=alice.id, status='pending')
+    db.session.add(friendship)
+    db.session.flush()
+    # The cached entry stays until the commit
+    assert graph.status(liam.id, alice.id) is None
+    db.session.commit()
+    assert graph.status(liam.id, alice.id) == graph.status(alice.id, liam.id) == 'pending'
+
+    friendship.status = 'accepted'
+    db.session.flush()
+    db.session.rollback()
+    assert graph.status(liam.id, alice.id) == 'pending'
+
+    db.session.delete(db.session.get(Friendship, friendship.id))
+    db.session.commit()
+    assert graph.neighbors(liam.id) == {} and graph.neighbors(alice.id) == {}
+
+
+def test_accepting_and_removing_a_friend_updates_lookups_and_search(users, test_client):
+    liam, alice, _ = users
+    db.session.add(Book(title='Tales from Earthsea', author='Ursula K. Le Guin', is_public=False,
+                        uploaded_by_id=alice.id, s3_url='local://books/x', file_size=1, file_type='txt'))
+    request = Friendship(user_id=liam.id, friend_id=alice.id, status='pending')
+    db.session.add(request)
+    db.session.commit()
+    graph = get_friend_graph()
+
+    login(test_client, liam)
+    assert searched_titles(test_client) == []
+    assert graph.status(liam.id, alice.id) == 'pending'
+
+    login(test_client, alice)
+    response = test_client.post(f'/api/friends/requests/{request.id}/accept')
+    assert response.status_code == 200
+    assert graph.are_friends(liam.id, alice.id) and graph.are_friends(alice.id, liam.id)
+
+    # The cached empty result is not served once the friendship is accepted
+    login(test_client, liam)
+    assert searched_titles(test_client) == ['Tales from Earthsea']
+
+    response = test_client.delete(f'/api/friends/{request.id}')
+    assert response.status_code == 200
+    assert graph.neighbors(liam.id) == {} and graph.neighbors(alice.id) == {}
+    assert searched_titles(test_client) == []
@@ -0,0 +1,52 @@
+import pytest
+
+from app import db
+from app.models import Friendship, User
+
+
+@pytest.fixture
+def users(app_context):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x')
+             for name in ('liam', 'alice', 'bob', 'carol')]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def request_between(sender, recipient, status='pending'):
+    friendship = Friendship(user_id=sender.id, friend_id=recipient.id, status=status)
+    db.session.add(friendship)
+    db.session.commit()
+    return friendship.id
+
+
+def test_batch_reports_only_the_requests_it_processed(users, test_client):
+    liam, alice, bob, carol = users
+    from_alice = request_between(alice, liam)
+    from_bob = request_between(bob, liam)
+    accepted = request_between(carol, liam, status='accepted')
+    to_bob = request_between(alice, bob)
+    with test_client.session_transaction() as session:
+        session['user_id'] = liam.id
+
+    response = test_client.post('/api/friends/requests/batch', json={
+        'action': 'accept', 'request_ids': [from_alice, to_bob, accepted, 999, from_bob, from_alice]
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['processed_ids'] == [from_alice, from_bob]
+    assert [result['status'] for result in body['results']] == [
+        'accepted', 'forbidden', 'already_processed', 'not_found', 'accepted'
+    ]
+    assert Friendship.are_friends(liam.id, alice.id)
+    assert db.session.get(Friendship, to_bob).status == 'pending'
+
+    response = test_client.post('/api/friends/requests/batch', json={
+        'action': 'reject', 'request_ids': [from_alice, from_bob]
+    })
+    assert response.status_code == 409
+    assert response.get_json()['processed_ids'] == []
+
+    response = test_client.post('/api/friends/requests/batch', json={'action': 'reject', 'request_ids': [999, to_bob]})
+    assert response.status_code == 404
+    assert db.session.get(Friendship, to_bob) is not None
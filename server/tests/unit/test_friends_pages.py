@@ -0,0 +1,76 @@
+import pytest
+
+from app import db
+from app.models import Friendship, User
+
+
+@pytest.fixture
+def users(app_context):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x')
+             for name in ('liam', 'alice', 'bob', 'carol', 'dave', 'erin', 'frank')]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def befriend(sender, recipient, status='accepted'):
+    db.session.add(Friendship(user_id=sender.id, friend_id=recipient.id, status=status))
+    db.session.commit()
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+
+
+def friends_page(client, limit, cursor=None):
+    params = {'limit': limit, 'cursor': cursor} if cursor else {'limit': limit}
+    response = client.get('/api/friends', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_pages_interleave_sent_and_received_friendships(users, test_client):
+    liam, alice, bob, carol, dave, erin, frank = users
+    befriend(liam, alice)
+    befriend(bob, liam)
+    befriend(liam, carol, status='pending')
+    befriend(dave, liam)
+    befriend(erin, frank)
+    befriend(liam, erin)
+    befriend(frank, liam)
+    login(test_client, liam)
+
+    seen = []
+    body = friends_page(test_client, 2)
+    seen.append([friend['username'] for friend in body['friends']])
+    while body['pagination']['has_next']:
+        body = friends_page(test_client, 2, body['pagination']['next_cursor'])
+        seen.append([friend['username'] for friend in body['friends']])
+
+    assert seen == [['alice', 'bob'], ['dave', 'erin'], ['frank']]
+    assert body['pagination']['next_cursor'] is None
+
+    friendship_ids = [friend['friendship_id'] for friend in friends_page(test_client, 50)['friends']]
+    assert friendship_ids == sorted(friendship_ids)
+    assert len(friendship_ids) == 5
+
+
+def test_tampered_or_foreign_cursors_are_rejected(users, test_client):
+    liam, alice, bob, *_ = users
+    befriend(liam, alice)
+    befriend(bob, liam)
+    befriend(alice, bob)
+    login(test_client, liam)
+    cursor = friends_page(test_client, 1)['pagination']['next_cursor']
+
+    payload, signature = cursor.rsplit('.', 1)
+    tampered = f"{payload}.{'A' if signature[0] != 'A' else 'B'}{signature[1:]}"
+    response = test_client.get('/api/friends', query_string={'cursor': tampered})
+    assert response.status_code == 400
+
+    # Another user's cursor belongs to another query
+    login(test_client, alice)
+    response = test_client.get('/api/friends', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert 'does not match' in response.get_json()['error']
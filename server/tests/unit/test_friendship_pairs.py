@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Friendship, User
+
+
+@pytest.fixture
+def users(app_context):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x')
+             for name in ('liam', 'alice', 'bob')]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def test_pair_is_stored_in_canonical_order(users):
+    liam, alice, bob = users
+    friendship = Friendship(user_id=bob.id, friend_id=liam.id)
+    db.session.add(friendship)
+    db.session.commit()
+    assert (friendship.low_id, friendship.high_id) == (liam.id, bob.id)
+    # The sender is still recorded
+    assert (friendship.user_id, friendship.friend_id) == (bob.id, liam.id)
+
+    # Re-pointing a row keeps the pair in step
+    friendship.friend_id = alice.id
+    db.session.commit()
+    assert (friendship.low_id, friendship.high_id) == (alice.id, bob.id)
+
+
+def test_between_finds_the_row_from_both_sides(users):
+    liam, alice, bob = users
+    friendship = Friendship(user_id=alice.id, friend_id=liam.id, status='accepted')
+    db.session.add(friendship)
+    db.session.commit()
+
+    assert Friendship.between(liam.id, alice.id).one().id == friendship.id
+    assert Friendship.between(alice.id, str(liam.id)).one().id == friendship.id
+    assert Friendship.between(liam.id, bob.id).first() is None
+
+
+def test_reverse_duplicate_is_rejected(users):
+    liam, alice, _ = users
+    db.session.add(Friendship(user_id=liam.id, friend_id=alice.id))
+    db.session.commit()
+
+    db.session.add(Friendship(user_id=alice.id, friend_id=liam.id))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+    assert Friendship.query.count() == 1
+
+
+def test_reverse_request_accepts_the_existing_one(users, test_client):
+    liam, alice, _ = users
+    db.session.add(Friendship(user_id=liam.id, friend_id=alice.id))
+    db.session.commit()
+    with test_client.session_transaction() as session:
+        session['user_id'] = alice.id
+
+    response = test_client.post(f'/api/friends/add/{liam.id}')
+    assert response.status_code == 200
+    friendship = Friendship.query.one()
+    db.session.refresh(friendship)
+    assert (friendship.user_id, friendship.status) == (liam.id, 'accepted')
@@ -0,0 +1,84 @@
+import pytest
+from flask import g
+
+from app import db
+from app.models import User
+from app.services.identity import forget_identity, get_identity_cache, load_current_user, load_identity
+
+
+@pytest.fixture
+def liam(app_context):
+    user = User(username='liam', email='liam@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+        session['token_revision'] = user.token_revision or 0
+    return client
+
+
+def test_identity_is_cached_until_forgotten(liam):
+    identity = load_identity(liam.id)
+    assert (identity.id, identity.username, identity.email, identity.token_revision) == (
+        liam.id, 'liam', 'liam@example.com', 0
+    )
+    assert load_identity(str(liam.id)) is identity
+
+    # Writes that skip the routes are not seen until the entry is dropped
+    liam.username = 'liam2'
+    db.session.commit()
+    assert load_identity(liam.id).username == 'liam'
+    forget_identity(liam.id)
+    assert load_identity(liam.id).username == 'liam2'
+
+
+def test_missing_users_are_not_cached(liam):
+    assert load_identity(999) is None
+    assert get_identity_cache().get(999) is None
+    forget_identity(999)
+
+
+def test_rename_is_seen_by_the_next_request(app_context, liam):
+    first, second = login(app_context, liam), login(app_context, liam)
+    assert first.get('/api/users/me').get_json()['username'] == 'liam'
+
+    response = second.patch('/api/users/profile', json={'username': 'liam_m'})
+    assert response.status_code == 200
+    assert load_identity(liam.id).username == 'liam_m'
+    assert first.get('/api/users/me').get_json()['username'] == 'liam_m'
+
+
+def test_revoke_is_seen_by_the_next_request(app_context, liam):
+    first, second = login(app_context, liam), login(app_context, liam)
+    assert first.get('/api/users/me').status_code == 200
+    assert load_identity(liam.id).token_revision == 0
+
+    assert second.post('/api/users/token/revoke').status_code == 200
+    assert load_identity(liam.id).token_revision == 1
+    response = first.get('/api/users/me')
+    assert response.status_code == 401
+    assert 'revoked' in response.get_json()['error']
+
+
+def test_current_user_is_loaded_once_per_request(app_context, liam, monkeypatch):
+    loads = []
+    get = db.session.get
+    monkeypatch.setattr(db.session, 'get', lambda *args: loads.append(args) or get(*args))
+
+    with app_context.test_request_context():
+        g.user = load_identity(liam.id)
+        user = load_current_user()
+        assert isinstance(user, User) and user.id == liam.id
+        assert load_current_user() is user
+        assert len(loads) == 1
+
+        # A user deleted meanwhile loads as None
+        g.pop('current_user')
+        db.session.delete(user)
+        db.session.commit()
+        assert load_current_user() is None
@@ -0,0 +1,104 @@
+import hashlib
+import io
+import zipfile
+
+import pytest
+
+from app import db
+from app.models import Book, BookPage, User
+from app.services.access_control import can_view
+from app.services.file_processor import extract_metadata
+from app.services.ingestion import IngestionError, _validate
+
+CORE_XML = (
+    '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties"'
+    ' xmlns:dc="http://purl.org/dc/elements/1.1/">'
+    '<dc:title>Dune</dc:title><dc:creator> Frank Herbert </dc:creator></cp:coreProperties>'
+)
+
+
+def test_validate_checks_size_checksum_and_signature():
+    data = b'%PDF-1.4 body'
+    sha256 = hashlib.sha256(data).hexdigest()
+    stream = io.BytesIO(data)
+    _validate(stream, 'pdf', len(data), sha256)
+    assert stream.tell() == 0
+    for args, message in [
+        ((b'%PDF-1.4 body', 'pdf', 99, sha256), 'bytes'),
+        ((b'%PDF-1.4 bodY', 'pdf', len(data), sha256), 'checksum'),
+        ((b'plain text', 'pdf', None, None), 'not a valid pdf'),
+        ((b'', 'txt', None, None), 'empty'),
+    ]:
+        with pytest.raises(IngestionError, match=message):
+            _validate(io.BytesIO(args[0]), *args[1:])
+
+
+def test_extract_metadata_reads_docx_core_properties():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as docx:
+        docx.writestr('docProps/core.xml', CORE_XML)
+    archive.seek(0)
+    assert extract_metadata(archive, 'docx') == {'title': 'Dune', 'author': 'Frank Herbert'}
+    assert extract_metadata(io.BytesIO(b'text'), 'txt') == {}
+
+
+@pytest.fixture
+def users(app_context, tmp_path, monkeypatch):
+    monkeypatch.setitem(app_context.config, 'STORAGE_BACKEND', 'local')
+    monkeypatch.setitem(app_context.config, 'LOCAL_STORAGE_ROOT', str(tmp_path))
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x') for name in ('liam', 'alice')]
+    db.session.add_all(users)
+    db.session.commit()
+    clients = []
+    for user in users:
+        client = app_context.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user.id
+        clients.append(client)
+    return clients
+
+
+def create_book(client, content, filename='dune.txt', content_type='text/plain'):
+    response = client.post('/api/books', data={
+        'title': 'Dune', 'author': 'Frank Herbert', 'is_public': 'true',
+        'file': (io.BytesIO(content), filename, content_type),
+    })
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def listed_ids(client):
+    return [book['id'] for book in client.get('/api/books').get_json()]
+
+
+def test_created_books_are_ingested_then_listed(users):
+    liam, alice = users
+    book = create_book(liam, b'The spice must flow')
+
+    response = liam.get(f"/api/jobs/{book['ingestion_job']['id']}")
+    assert response.status_code == 200
+    job = response.get_json()
+    assert (job['book_id'], job['status'], job['progress']) == (book['id'], 'succeeded', 100)
+    assert job['result']['page_count'] == 1 and 'reused_extraction' not in job['result']
+    assert alice.get(f"/api/jobs/{book['ingestion_job']['id']}").status_code == 404
+    assert book['id'] in listed_ids(alice)
+    assert BookPage.query.filter_by(book_id=book['id']).count() == 1
+
+    # The same content uploaded again is not fetched and parsed a second time
+    copy = create_book(alice, b'The spice must flow')
+    job = alice.get(f"/api/jobs/{copy['ingestion_job']['id']}").get_json()
+    assert job['status'] == 'succeeded' and job['result']['reused_extraction'] is True
+    assert BookPage.query.filter_by(book_id=copy['id']).count() == 1
+
+
+def test_books_whose_ingestion_fails_stay_hidden(users):
+    liam, alice = users
+    book = create_book(liam, b'not a pdf', filename='dune.pdf', content_type='application/pdf')
+
+    job = liam.get(f"/api/jobs/{book['ingestion_job']['id']}").get_json()
+    assert job['status'] == 'failed' and 'not a valid pdf' in job['error']
+    assert book['id'] not in listed_ids(alice)
+    hidden = db.session.get(Book, book['id'])
+    assert not hidden.is_ready and can_view(hidden.uploaded_by_id, hidden)
+    assert not can_view(User.query.filter_by(username='alice').one().id, hidden)
+    assert alice.get('/api/search?q=dune&type=books').get_json()['books'] == []
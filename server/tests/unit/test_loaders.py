@@ -0,0 +1,23 @@
+from app.services.loaders import BatchLoader
+
+
+def make_loader(calls):
+    def batch(keys):
+        calls.append(sorted(keys))
+        return {key: key * 10 for key in keys if key > 0}
+    return BatchLoader(batch)
+
+
+def test_primed_keys_resolve_in_one_batch():
+    calls = []
+    loader = make_loader(calls).prime([1, 2, 3])
+    assert [loader.load(key) for key in (3, 1, 2)] == [30, 10, 20]
+    assert calls == [[1, 2, 3]]
+
+
+def test_results_are_memoized_including_misses():
+    calls = []
+    loader = make_loader(calls)
+    assert loader.load_many([1, -1, 1]) == [10, None, 10]
+    assert loader.load_many([1, -1, 2]) == [10, None, 20]
+    assert calls == [[-1, 1], [2]]
@@ -0,0 +1,62 @@
+import base64
+import json
+
+import pytest
+
+from app import db
+from app.models import User
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, query_fingerprint
+
+
+def raw_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_cursor_round_trip_checks_the_query(app_context):
+    fingerprint = query_fingerprint('friends', 7)
+    cursor = encode_cursor(42, fingerprint)
+    assert decode_cursor(cursor, fingerprint) == 42
+    with pytest.raises(InvalidCursor, match='does not match'):
+        decode_cursor(cursor, query_fingerprint('friends', 8))
+
+
+def test_unsigned_and_edited_cursors_are_rejected(app_context):
+    fingerprint = query_fingerprint('feed', 1)
+    signature = encode_cursor(42, fingerprint).rsplit('.', 1)[1]
+    edited = raw_cursor({'s': 1, 'f': fingerprint})
+    for forged in ('not a cursor', edited, f'{edited}.{signature}'):
+        with pytest.raises(InvalidCursor, match='Invalid'):
+            decode_cursor(forged, fingerprint)
+
+
+def test_malformed_cursors_are_rejected(app_context):
+    fingerprint = query_fingerprint('feed', 1)
+    for state in ('42', -1, True, [1, 2]):
+        with pytest.raises(InvalidCursor, match='Malformed'):
+            decode_cursor(encode_cursor(state, fingerprint), fingerprint)
+
+
+@pytest.fixture
+def client(app_context, test_client):
+    user = User(username='liam', email='liam@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    with test_client.session_transaction() as session:
+        session['user_id'] = user.id
+    return test_client
+
+
+def test_search_rejects_cursors_for_another_query_or_of_the_wrong_shape(client):
+    first = client.get('/api/search?q=dune&paginate=cursor')
+    assert first.status_code == 200
+
+    fingerprint = query_fingerprint('all', 'dune')
+    other_query = encode_cursor({'books': [1.0, 1]}, query_fingerprint('all', 'foundation'))
+    assert client.get(f'/api/search?q=dune&cursor={other_query}').status_code == 400
+    for state in ([1.0, 1], 5, {'books': 5}, {'books': [1.0]}, {'books': ['x', 1]}, {'shelves': False}):
+        response = client.get(f'/api/search?q=dune&cursor={encode_cursor(state, fingerprint)}')
+        assert response.status_code == 400, state
+        assert 'Malformed' in response.get_json()['error']
+
+    valid = encode_cursor({'books': [1.5, 3], 'users': False}, fingerprint)
+    assert client.get(f'/api/search?q=dune&cursor={valid}').status_code == 200
@@ -0,0 +1,24 @@
+from werkzeug.security import generate_password_hash
+
+from app.services.auth_service import PasswordHasher, bcrypt_rounds
+
+
+def make_hasher(rounds=4):
+    return PasswordHasher(rounds=rounds, workers=0, max_pending=1, timeout=10)
+
+
+def test_hash_verifies_and_records_cost():
+    hasher = make_hasher()
+    password_hash = hasher.hash('correct horse')
+    assert bcrypt_rounds(password_hash) == 4
+    assert hasher.verify('correct horse', password_hash)
+    assert not hasher.verify('wrong horse', password_hash)
+    assert not hasher.needs_rehash(password_hash)
+
+
+def test_stale_and_werkzeug_hashes_need_rehash():
+    hasher = make_hasher(rounds=5)
+    legacy = generate_password_hash('correct horse')
+    assert hasher.verify('correct horse', legacy)
+    assert hasher.needs_rehash(legacy)
+    assert hasher.needs_rehash(make_hasher(rounds=4).hash('correct horse'))
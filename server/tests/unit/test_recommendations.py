@@ -0,0 +1,106 @@
+import pytest
+
+from app import db
+from app.models import Book, FriendRecommendation, Friendship, User
+from app.services.recommendations import compute_recommendations, refresh_recommendations
+
+
+@pytest.fixture
+def users(app_context):
+    users = {name: User(username=name, email=f'{name}@example.com', password_hash='x')
+             for name in ('liam', 'alice', 'bob', 'carol', 'dave', 'erin', 'frank')}
+    db.session.add_all(users.values())
+    db.session.commit()
+    return users
+
+
+def befriend(sender, recipient, status='accepted'):
+    friendship = Friendship(user_id=sender.id, friend_id=recipient.id, status=status)
+    db.session.add(friendship)
+    db.session.commit()
+    return friendship
+
+
+def add_book(owner, author, is_public=True):
+    db.session.add(Book(title='A book', author=author, is_public=is_public, uploaded_by_id=owner.id,
+                        s3_url='local://books/x', file_size=1, file_type='txt'))
+    db.session.commit()
+
+
+def ranked(user):
+    return [(candidate['username'], candidate['mutual_friends'], candidate['shared_uploads'])
+            for candidate in compute_recommendations([user.id])[user.id]]
+
+
+def stored(user):
+    db.session.expire_all()
+    row = db.session.get(FriendRecommendation, user.id)
+    return [candidate['username'] for candidate in row.candidates] if row else None
+
+
+@pytest.fixture
+def network(users):
+    liam, alice, bob, carol, dave, erin, frank = users.values()
+    befriend(liam, alice)
+    befriend(bob, liam)
+    # carol shares two friends with liam, dave one
+    befriend(carol, alice)
+    befriend(bob, carol)
+    befriend(alice, dave)
+    # frank would share one too, but liam already asked him
+    befriend(frank, bob)
+    befriend(liam, frank, status='pending')
+    # erin only shares an author, in a different case
+    add_book(liam, 'Octavia E. Butler')
+    add_book(erin, 'OCTAVIA E. BUTLER')
+    add_book(dave, 'Octavia E. Butler', is_public=False)
+    return users
+
+
+def test_candidates_rank_by_mutual_friends_then_shared_uploads(network):
+    liam = network['liam']
+    assert ranked(liam) == [('carol', 2, 0), ('dave', 1, 0), ('erin', 0, 1)]
+
+    refresh_recommendations([liam.id])
+    assert stored(liam) == ['carol', 'dave', 'erin']
+
+
+def test_friendship_changes_refresh_the_affected_rows(network):
+    liam, alice, bob, carol, dave, erin, frank = network.values()
+    refresh_recommendations(user.id for user in network.values())
+    assert stored(liam) == ['carol', 'dave', 'erin']
+    assert 'carol' in stored(dave)
+
+    # Committing runs the refresh (eagerly when testing) for both users
+    # and their accepted friends
+    befriend(carol, liam)
+    assert stored(liam) == ['dave', 'erin']
+    assert 'liam' not in stored(carol)
+
+    friendship = Friendship.between(alice.id, dave.id).one()
+    db.session.delete(friendship)
+    db.session.commit()
+    assert stored(liam) == ['erin']
+    assert 'carol' not in stored(dave)
+
+
+def test_endpoint_serves_the_stored_row(network, test_client):
+    liam = network['liam']
+    # Building the network already refreshed liam's row
+    FriendRecommendation.query.delete()
+    db.session.commit()
+    with test_client.session_transaction() as session:
+        session['user_id'] = liam.id
+
+    first = test_client.get('/api/friends/recommendations').get_json()
+    assert (first['computed'], first['recommendations']) == (False, [])
+
+    # The first request scheduled the computation
+    second = test_client.get('/api/friends/recommendations').get_json()
+    assert second['computed'] is True
+    assert [candidate['id'] for candidate in second['recommendations']] == [
+        network['carol'].id, network['dave'].id, network['erin'].id
+    ]
+    assert second['recommendations'][0] == {
+        'id': network['carol'].id, 'username': 'carol', 'mutual_friends': 2, 'shared_uploads': 0
+    }
@@ -0,0 +1,68 @@
+import importlib.util
+import os
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from app import db
+from app.models import Book
+from app.services.search_backends import SQLiteFTS5Backend
+
+MIGRATION = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'migrations', 'versions', '3f1c2b7d9e04_add_sqlite_fts5_search_index.py'
+)
+
+
+def run_migration(direction):
+    spec = importlib.util.spec_from_file_location('fts5_migration', MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with db.engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            getattr(migration, direction)()
+
+
+@pytest.fixture
+def fts5(app_context):
+    run_migration('upgrade')
+    yield SQLiteFTS5Backend()
+    db.session.remove()
+    run_migration('downgrade')
+
+
+def add_book(title, author, genre='Unknown', is_public=True):
+    book = Book(title=title, author=author, genre=genre, is_public=is_public,
+                s3_url='local://books/x', file_size=1, file_type='txt')
+    db.session.add(book)
+    db.session.commit()
+    return book.id
+
+
+def test_fts5_backend_ranks_title_matches_first(fts5):
+    assert SQLiteFTS5Backend.is_installed(db.engine)
+    in_author = add_book('Sands', 'Dune Society')
+    in_title = add_book('Dune', 'Frank Herbert')
+    add_book('Foundation', 'Isaac Asimov')
+    assert [book_id for book_id, _ in fts5.search_books('dun')] == [in_title, in_author]
+    assert fts5.count_books('dune') == 2
+    assert fts5.search_books('dune asimov') == []
+
+
+def test_fts5_backend_pages_by_keyset_and_applies_filters(fts5):
+    ids = [add_book(f'Dune {n}', 'Frank Herbert', is_public=n != 2) for n in range(5)]
+    ranked = fts5.search_books('dune')
+    assert sorted(book_id for book_id, _ in ranked) == ids
+
+    first_page = fts5.search_books('dune', limit=2)
+    last_id, last_score = first_page[-1]
+    rest = fts5.search_books('dune', after=(last_score, last_id))
+    assert first_page + rest == ranked
+
+    public = [Book.is_public == True]
+    assert fts5.count_books('dune', public) == 4
+    assert ids[2] not in [book_id for book_id, _ in fts5.search_books('dune', public)]
+
+    db.session.delete(db.session.get(Book, ids[0]))
+    db.session.commit()
+    assert fts5.count_books('dune') == 4
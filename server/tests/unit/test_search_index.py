@@ -0,0 +1,96 @@
+from app.services.search import (
+    InvertedIndex, SuggestionIndex, TrigramIndex, BOOK_FIELD_WEIGHTS, tokenize, trigrams
+)
+
+
+def make_index():
+    index = InvertedIndex(BOOK_FIELD_WEIGHTS)
+    index.add(1, {'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald', 'genre': 'Fiction'})
+    index.add(2, {'title': '1984', 'author': 'George Orwell', 'genre': 'Sci-Fi'})
+    index.add(3, {'title': 'Brave New World', 'author': 'Aldous Huxley', 'genre': 'Sci-Fi'})
+    return index
+
+
+def test_tokenize_lowercases_and_splits_punctuation():
+    assert tokenize('Sci-Fi: The GREAT_Gatsby') == ['sci', 'fi', 'the', 'great', 'gatsby']
+
+
+def test_prefix_search_matches_partial_terms():
+    index = make_index()
+    assert [doc_id for doc_id, _ in index.search('gats')] == [1]
+    assert [doc_id for doc_id, _ in index.search('sci')] == [2, 3]
+
+
+def test_all_terms_must_match():
+    index = make_index()
+    assert [doc_id for doc_id, _ in index.search('sci huxley')] == [3]
+    assert index.search('sci gatsby') == []
+
+
+def test_title_matches_rank_above_genre_matches():
+    index = make_index()
+    index.add(4, {'title': 'Fiction Writing', 'author': 'Someone', 'genre': 'Academic'})
+    assert [doc_id for doc_id, _ in index.search('fiction')] == [4, 1]
+
+
+def test_remove_and_replace_documents():
+    index = make_index()
+    index.remove(1)
+    assert index.search('gatsby') == []
+    assert 1 not in index
+
+    index.add(2, {'title': 'Animal Farm', 'author': 'George Orwell', 'genre': 'Fiction'})
+    assert index.search('1984') == []
+    assert [doc_id for doc_id, _ in index.search('animal')] == [2]
+
+
+def make_user_index():
+    index = TrigramIndex()
+    for user_id, username in enumerate(['john', 'johnny_b', 'alice', 'frank_herbert'], start=1):
+        index.add(user_id, username)
+    return index
+
+
+def test_trigrams_are_padded_per_word():
+    assert trigrams('ab_c') == {'  a', ' ab', 'ab ', '  c', ' c '}
+
+
+def test_trigram_search_ranks_exact_match_first():
+    index = make_user_index()
+    assert index.search('john')[0] == (1, 1.0)
+
+
+def test_trigram_search_tolerates_typos_and_partial_input():
+    index = make_user_index()
+    assert [user_id for user_id, _ in index.search('alcie')] == [3]
+    assert [user_id for user_id, _ in index.search('herb')] == [4]
+
+
+def test_trigram_search_applies_top_k_and_removal():
+    index = make_user_index()
+    assert len(index.search('john', limit=1)) == 1
+    index.remove(1)
+    assert [user_id for user_id, _ in index.search('john')] == [2]
+
+
+def make_suggestion_index():
+    index = SuggestionIndex(top_k=5)
+    index.add(('book', 1), [('title', 'The Great Gatsby'), ('author', 'F. Scott Fitzgerald')])
+    index.add(('book', 2), [('title', 'Tender Is the Night'), ('author', 'F. Scott Fitzgerald')])
+    index.add(('user', 1), [('user', 'frankie')])
+    return index
+
+
+def test_suggestions_match_the_start_of_any_word():
+    index = make_suggestion_index()
+    assert index.search('gats') == [('title', 'The Great Gatsby')]
+    assert index.search('the') == [('title', 'The Great Gatsby'), ('title', 'Tender Is the Night')]
+
+
+def test_suggestions_rank_by_number_of_sources_and_follow_removals():
+    index = make_suggestion_index()
+    assert index.search('f') == [('author', 'F. Scott Fitzgerald'), ('user', 'frankie')]
+    index.remove(('book', 2))
+    index.remove(('user', 1))
+    assert index.search('f') == [('author', 'F. Scott Fitzgerald')]
+    assert index.search('tender') == []
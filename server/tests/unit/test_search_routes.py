@@ -0,0 +1,33 @@
+import pytest
+
+from app import db
+from app.models import Book, User
+from app.services.search_backends import get_search_backend
+
+
+@pytest.fixture
+def client(app_context, test_client):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x') for name in ('liam', 'liama')]
+    db.session.add_all(users)
+    db.session.commit()
+    with test_client.session_transaction() as session:
+        session['user_id'] = users[0].id
+    return test_client
+
+
+def test_search_skips_rows_deleted_since_ranking(client, monkeypatch):
+    book = Book(title='Dune', author='Frank Herbert', s3_url='local://books/x', file_size=1, file_type='txt')
+    db.session.add(book)
+    db.session.commit()
+    liama = User.query.filter_by(username='liama').one()
+    # As ranked by a stale index or cache: 999 has since been deleted
+    backend = get_search_backend()
+    monkeypatch.setattr(backend, 'search_books', lambda *args, **kwargs: [(999, 2.0), (book.id, 1.0)])
+    monkeypatch.setattr(backend, 'search_users', lambda *args, **kwargs: [(999, 2.0), (liama.id, 1.0)])
+
+    response = client.get('/api/search?q=dune&paginate=cursor')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [found['id'] for found in body['books']] == [book.id]
+    assert body['books'][0]['uploader'] is None
+    assert [found['id'] for found in body['users']] == [liama.id]
@@ -0,0 +1,114 @@
+import hashlib
+import io
+
+import pytest
+
+from app.services.storage import (
+    MIN_PART_SIZE, ChecksumMismatch, LocalBackend, ObjectNotFound, S3Backend, StorageError, stream_upload
+)
+
+
+def test_local_backend_round_trip(tmp_path):
+    storage = LocalBackend(str(tmp_path), 'secret')
+    data = b'chapter one' * 1000
+    stored = storage.save(io.BytesIO(data), 'books/dune.txt', 'text/plain')
+    assert stored.size == len(data)
+    assert stored.sha256 == hashlib.sha256(data).hexdigest()
+    assert storage.key_for_url(storage.url('books/dune.txt')) == 'books/dune.txt'
+    info = storage.stat('books/dune.txt')
+    assert (info.size, info.content_type) == (len(data), 'text/plain')
+    with storage.open('books/dune.txt') as f:
+        assert f.read() == data
+    storage.delete('books/dune.txt')
+    storage.delete('books/dune.txt')
+    assert storage.stat('books/dune.txt') is None
+    with pytest.raises(ObjectNotFound):
+        storage.open('books/dune.txt')
+
+
+def test_local_backend_checksummed_save_keeps_existing_file(tmp_path):
+    storage = LocalBackend(str(tmp_path), 'secret')
+    data = b'the real content'
+    sha256 = hashlib.sha256(data).hexdigest()
+    storage.save(io.BytesIO(data), f'blobs/{sha256}', expected_sha256=sha256)
+    with pytest.raises(ChecksumMismatch):
+        storage.save(io.BytesIO(b'something else'), f'blobs/{sha256}', expected_sha256=sha256)
+    with storage.open(f'blobs/{sha256}') as f:
+        assert f.read() == data
+    assert [p.name for p in (tmp_path / 'blobs').iterdir()] == [sha256]
+
+
+def test_local_backend_rejects_keys_outside_root(tmp_path):
+    storage = LocalBackend(str(tmp_path), 'secret')
+    for key in ('../escape.txt', '/etc/passwd', ''):
+        with pytest.raises(StorageError):
+            storage.save(io.BytesIO(b'x'), key)
+
+
+def test_s3_backend_reads_keys_from_any_url_style():
+    storage = S3Backend('books-bucket', max_pool_connections=20)
+    assert storage.client.meta.config.max_pool_connections == 20
+    assert storage.key_for_url(storage.url('books/a.pdf')) == 'books/a.pdf'
+    assert storage.key_for_url('https://books-bucket.s3.eu-west-1.amazonaws.com/books/b.pdf') == 'books/b.pdf'
+    assert storage.key_for_url('https://s3.amazonaws.com/books-bucket/books/c.pdf') == 'books/c.pdf'
+    assert storage.key_for_url('local://books/d.pdf') is None
+
+
+class FakeS3:
+    """Records the calls stream_upload makes; fail_part makes that part's upload raise"""
+
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.calls = []
+        self.parts = []
+
+    def put_object(self, Bucket, Key, Body, **extra):
+        self.calls.append(('put_object', len(Body)))
+
+    def create_multipart_upload(self, Bucket, Key, **extra):
+        self.calls.append(('create_multipart_upload', extra.get('ContentType')))
+        return {'UploadId': 'upload-1'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_part:
+            raise IOError('connection reset')
+        self.calls.append(('upload_part', len(Body)))
+        self.parts.append(Body)
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append(('complete_multipart_upload', [part['PartNumber'] for part in MultipartUpload['Parts']]))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append(('abort_multipart_upload', UploadId))
+
+
+def test_stream_upload_sends_small_files_in_one_put():
+    client = FakeS3()
+    data = b'x' * 1000
+    stored = stream_upload(client, io.BytesIO(data), 'bucket', 'books/a.txt', 'text/plain', part_size=MIN_PART_SIZE)
+    assert client.calls == [('put_object', 1000)]
+    assert (stored.size, stored.sha256) == (1000, hashlib.sha256(data).hexdigest())
+
+
+def test_stream_upload_splits_large_files_into_parts():
+    client = FakeS3()
+    data = bytes(range(256)) * (2 * MIN_PART_SIZE // 256 + 10)
+    stored = stream_upload(client, io.BytesIO(data), 'bucket', 'books/a.pdf', 'application/pdf', part_size=1)
+    assert client.calls == [
+        ('create_multipart_upload', 'application/pdf'),
+        ('upload_part', MIN_PART_SIZE),
+        ('upload_part', MIN_PART_SIZE),
+        ('upload_part', len(data) - 2 * MIN_PART_SIZE),
+        ('complete_multipart_upload', [1, 2, 3]),
+    ]
+    assert b''.join(client.parts) == data
+    assert (stored.size, stored.sha256) == (len(data), hashlib.sha256(data).hexdigest())
+
+
+def test_stream_upload_aborts_the_multipart_upload_when_a_part_fails():
+    client = FakeS3(fail_part=2)
+    with pytest.raises(IOError):
+        stream_upload(client, io.BytesIO(b'y' * (3 * MIN_PART_SIZE)), 'bucket', 'books/a.pdf', part_size=MIN_PART_SIZE)
+    assert client.calls[-1] == ('abort_multipart_upload', 'upload-1')
+    assert not any(call[0] == 'complete_multipart_upload' for call in client.calls)
@@ -0,0 +1,61 @@
+from app.services.throttle import LoginThrottle, MemoryBuckets
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    buckets = MemoryBuckets(clock=clock)
+    assert [buckets.consume('liam', 3, 0.5)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = buckets.consume('liam', 3, 0.5)
+    assert not allowed and retry_after == 2.0
+    clock.now = 2.0
+    assert buckets.consume('liam', 3, 0.5)[0]
+    assert buckets.consume('alice', 3, 0.5)[0]
+
+
+def test_reset_restores_full_bucket():
+    buckets = MemoryBuckets(clock=FakeClock())
+    for _ in range(2):
+        buckets.consume('liam', 2, 1)
+    buckets.reset('liam')
+    assert buckets.consume('liam', 2, 1)[0]
+
+
+def make_throttle(clock):
+    return LoginThrottle(MemoryBuckets(clock=clock), capacity=2, address_capacity=3,
+                         refill_seconds=12, address_refill_seconds=1)
+
+
+def test_login_throttle_charges_neither_bucket_when_one_refuses():
+    clock = FakeClock()
+    throttle = make_throttle(clock)
+    assert [throttle.check(name, '10.0.0.1') for name in ('liam', 'alice', 'bob')] == [0.0, 0.0, 0.0]
+    # The address is out of attempts: carol's own bucket must stay full
+    assert throttle.check('carol', '10.0.0.1') == 1.0
+    assert throttle.check('carol', '10.0.0.2') == 0.0
+    assert throttle.check('carol', '10.0.0.3') == 0.0
+    assert throttle.check('carol', '10.0.0.4') == 12.0
+
+
+def test_address_refills_faster_and_successful_logins_return_their_token():
+    clock = FakeClock()
+    throttle = make_throttle(clock)
+    for name in ('liam', 'alice', 'bob'):
+        throttle.check(name, '10.0.0.1')
+    clock.now = 1.0
+    assert throttle.check('carol', '10.0.0.1') == 0.0
+    assert throttle.check('dave', '10.0.0.1') == 1.0
+
+    throttle.succeeded('carol', '10.0.0.1')
+    assert throttle.check('dave', '10.0.0.1') == 0.0
+    # The account bucket is reset too
+    throttle.check('carol', '10.0.0.9')
+    throttle.succeeded('carol')
+    assert [throttle.check('carol', '10.0.0.8') for _ in range(3)] == [0.0, 0.0, 12.0]
@@ -0,0 +1,57 @@
+import pytest
+
+PASSWORD = 'correct horse'
+
+
+@pytest.fixture
+def devices(app_context):
+    app_context.config['PASSWORD_HASH_ROUNDS'] = 4
+    first, second = app_context.test_client(), app_context.test_client()
+    response = first.post('/api/users/register', json={
+        'username': 'liam', 'email': 'liam@example.com', 'password': PASSWORD
+    })
+    assert response.status_code == 201
+    assert second.post('/api/users/login', json={'username': 'liam', 'password': PASSWORD}).status_code == 200
+    return first, second, response.get_json()['tokens']
+
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_access_tokens_authenticate_and_refresh_tokens_do_not(app_context, devices):
+    _, _, tokens = devices
+    anonymous = app_context.test_client()
+    response = anonymous.get('/api/users/me', headers=bearer(tokens['access_token']))
+    assert response.status_code == 200 and response.get_json()['username'] == 'liam'
+    assert anonymous.get('/api/users/me', headers=bearer(tokens['refresh_token'])).status_code == 401
+    assert anonymous.get('/api/users/me', headers=bearer('not.a.token')).status_code == 401
+
+    response = anonymous.post('/api/users/token/refresh', headers=bearer(tokens['refresh_token']))
+    assert response.status_code == 200
+    assert anonymous.get('/api/users/me', headers=bearer(response.get_json()['access_token'])).status_code == 200
+    assert anonymous.post('/api/users/token/refresh', headers=bearer(tokens['access_token'])).status_code == 401
+
+
+def test_revoke_ends_refresh_tokens_and_every_session(app_context, devices):
+    first, second, tokens = devices
+    assert second.post('/api/users/token/revoke').status_code == 200
+
+    anonymous = app_context.test_client()
+    assert anonymous.post('/api/users/token/refresh', headers=bearer(tokens['refresh_token'])).status_code == 401
+    assert second.get('/api/users/me').status_code == 401
+    response = first.get('/api/users/me')
+    assert response.status_code == 401 and 'revoked' in response.get_json()['error']
+
+    response = first.post('/api/users/login', json={'username': 'liam', 'password': PASSWORD})
+    assert response.status_code == 200
+    assert first.get('/api/users/me').status_code == 200
+    new_refresh = response.get_json()['tokens']['refresh_token']
+    assert anonymous.post('/api/users/token/refresh', headers=bearer(new_refresh)).status_code == 200
+
+
+def test_password_change_keeps_only_the_changing_session(devices):
+    first, second, _ = devices
+    assert first.patch('/api/users/profile', json={'password': 'a new passphrase'}).status_code == 200
+    assert first.get('/api/users/me').status_code == 200
+    assert second.get('/api/users/me').status_code == 401
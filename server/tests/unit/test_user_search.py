@@ -0,0 +1,24 @@
+import pytest
+
+from app import db
+from app.models import User
+from app.services.search_backends import get_search_backend
+
+
+@pytest.fixture
+def client(app_context, test_client):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x') for name in ('liam', 'liama')]
+    db.session.add_all(users)
+    db.session.commit()
+    with test_client.session_transaction() as session:
+        session['user_id'] = users[0].id
+    return test_client
+
+
+def test_user_search_skips_users_deleted_since_indexing(client, monkeypatch):
+    liama = User.query.filter_by(username='liama').one()
+    monkeypatch.setattr(get_search_backend(), 'search_users', lambda *args, **kwargs: [(liama.id, 2.0), (999, 1.0)])
+
+    response = client.get('/api/users/search?q=liam')
+    assert response.status_code == 200
+    assert [found['id'] for found in response.get_json()] == [liama.id]